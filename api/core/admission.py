@@ -0,0 +1,201 @@
+import os, math, time, asyncio, logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional
+
+log = logging.getLogger("api.admission")
+
+# Admission control per route and worker: at most `limit` requests run, up to `queue` more wait in
+# FIFO order, nobody waits longer than ADMIT_MAX_WAIT_MS. A request is refused at once (Overloaded ->
+# 503 + Retry-After) when the queue is full or its expected wait (position in queue x recent service
+# time / limit) is already over the max wait, so overload fails fast instead of as an 8s 504.
+#
+# An admitted request is marked degraded when its latency budget is at risk: it queued for at least
+# ADMIT_DEGRADE_WAIT_MS, or queue wait + the recent full-mode service time exceeds ADMIT_BUDGET_MS.
+# Degraded /query skips reranking and the LLM (extractive answer from the top source).
+# FAQ hits never reach the controller: they are answered before admission.
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "1") == "1"
+ADMIT_LIMITS = os.getenv("ADMIT_LIMITS", "query=16:32,retrieve=32:64,batch=4:8")     # route=concurrency:queue
+ADMIT_MAX_WAIT_MS = float(os.getenv("ADMIT_MAX_WAIT_MS", "1000"))
+ADMIT_DEGRADE_WAIT_MS = float(os.getenv("ADMIT_DEGRADE_WAIT_MS", "100"))
+ADMIT_BUDGET_MS = float(os.getenv("ADMIT_BUDGET_MS", str(int(os.getenv("QUERY_TIMEOUT_SEC", "8")) * 750)))
+DEFAULT_LIMIT = (16, 32)
+EWMA_ALPHA = 0.2
+
+def _parse_limits(spec: str) -> Dict[str, tuple]:
+    out = {}
+    for part in (spec or "").split(","):
+        route, _, lim = part.strip().partition("=")
+        if not route or not lim:
+            continue
+        conc, _, queue = lim.partition(":")
+        try:
+            out[route] = (int(conc), int(queue or conc))
+        except ValueError:
+            log.warning("bad ADMIT_LIMITS entry %r", part)
+    return out
+
+def _metric(name: str):
+    try:
+        from api.routers import metrics
+        return getattr(metrics, name)
+    except Exception:
+        return None
+
+class Overloaded(Exception):
+    def __init__(self, route: str, reason: str, retry_after: int):
+        super().__init__(f"{route} overloaded: {reason}")
+        self.route, self.reason, self.retry_after = route, reason, retry_after
+
+class _Expired(Exception):
+    pass
+
+class Slot:
+    __slots__ = ("ctrl", "waited_ms", "degraded", "t0", "_released")
+
+    def __init__(self, ctrl: "AdmissionController", waited_ms: float, degraded: bool):
+        self.ctrl, self.waited_ms, self.degraded = ctrl, waited_ms, degraded
+        self.t0 = time.perf_counter()
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.ctrl._release(time.perf_counter() - self.t0, self.degraded)
+
+class AdmissionController:
+    def __init__(self, route: str, limit: int, queue: int, max_wait_s: float = ADMIT_MAX_WAIT_MS / 1000,
+                 degrade_wait_s: float = ADMIT_DEGRADE_WAIT_MS / 1000, budget_s: float = ADMIT_BUDGET_MS / 1000):
+        self.route, self.limit, self.queue = route, max(1, limit), max(0, queue)
+        self.max_wait_s, self.degrade_wait_s, self.budget_s = max_wait_s, degrade_wait_s, budget_s
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.service_s: Optional[float] = None         # EWMA, every admitted request
+        self.full_service_s: Optional[float] = None    # EWMA, non-degraded requests only
+
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def expected_wait(self, position: int) -> float:
+        # `position` requests must start before us; `limit` finish every service_s on average
+        return position * (self.service_s or 0.0) / self.limit
+
+    async def acquire(self) -> Slot:
+        t0 = time.perf_counter()
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+        else:
+            est = self.expected_wait(len(self._waiters) + 1)
+            if len(self._waiters) >= self.queue:
+                self._reject("queue_full", est)
+            if est > self.max_wait_s:
+                self._reject("expected_wait", est)
+            await self._wait()
+        waited = time.perf_counter() - t0
+        full = self.full_service_s or 0.0
+        degraded = waited >= self.degrade_wait_s or waited + full > self.budget_s
+        self._count("degraded" if degraded else "admitted")
+        h = _metric("ADMIT_WAIT")
+        if h:
+            h.labels(route=self.route).observe(waited * 1000)
+        self._gauge()
+        return Slot(self, waited * 1000, degraded)
+
+    async def _wait(self):
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._waiters.append(fut)
+        self._gauge()
+        timer = loop.call_later(self.max_wait_s, lambda: fut.done() or fut.set_exception(_Expired()))
+        try:
+            await fut           # _release hands its slot over by resolving this
+        except _Expired:
+            self._drop(fut)
+            self._reject("wait_timeout", self.max_wait_s)
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled() and fut.exception() is None:
+                self._release(None, False)      # handed a slot just as we were cancelled: pass it on
+            else:
+                self._drop(fut)
+            raise
+        finally:
+            timer.cancel()
+
+    def _drop(self, fut: asyncio.Future):
+        try:
+            self._waiters.remove(fut)
+        except ValueError:
+            pass
+        self._gauge()
+
+    def _reject(self, reason: str, est_s: float):
+        self._count("rejected")
+        log.warning("admission_rejected route=%s reason=%s active=%d waiting=%d", self.route, reason,
+                    self.active, len(self._waiters))
+        raise Overloaded(self.route, reason, max(1, math.ceil(max(est_s, self.max_wait_s))))
+
+    def _release(self, duration_s: Optional[float], degraded: bool):
+        if duration_s is not None:
+            self.service_s = duration_s if self.service_s is None else \
+                (1 - EWMA_ALPHA) * self.service_s + EWMA_ALPHA * duration_s
+            if not degraded:
+                self.full_service_s = duration_s if self.full_service_s is None else \
+                    (1 - EWMA_ALPHA) * self.full_service_s + EWMA_ALPHA * duration_s
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)    # the slot moves to the next waiter; active is unchanged
+                self._gauge()
+                return
+        self.active -= 1
+        self._gauge()
+
+    def _count(self, result: str):
+        c = _metric("ADMISSION")
+        if c:
+            c.labels(route=self.route, result=result).inc()
+
+    def _gauge(self):
+        g = _metric("ADMIT_STATE")
+        if g:
+            g.labels(route=self.route, state="active").set(self.active)
+            g.labels(route=self.route, state="waiting").set(len(self._waiters))
+
+    def stats(self) -> Dict:
+        return {"limit": self.limit, "queue": self.queue, "active": self.active, "waiting": len(self._waiters),
+                "service_ms": round((self.service_s or 0.0) * 1000, 1),
+                "full_service_ms": round((self.full_service_s or 0.0) * 1000, 1)}
+
+_limits = _parse_limits(ADMIT_LIMITS)
+_controllers: Dict[str, AdmissionController] = {}
+
+def get_controller(route: str) -> Optional[AdmissionController]:
+    if not ADMISSION_ENABLED:
+        return None
+    if route not in _controllers:
+        limit, queue = _limits.get(route, DEFAULT_LIMIT)
+        _controllers[route] = AdmissionController(route, limit, queue)
+    return _controllers[route]
+
+class _Unlimited:
+    waited_ms, degraded = 0.0, False
+
+    def release(self):
+        pass
+
+async def acquire(route: str):
+    """A slot for `route` (call .release() when done); raises Overloaded instead of queueing past budget."""
+    ctrl = get_controller(route)
+    return _Unlimited() if ctrl is None else await ctrl.acquire()
+
+@asynccontextmanager
+async def admit(route: str):
+    slot = await acquire(route)
+    try:
+        yield slot
+    finally:
+        slot.release()
+
+def stats() -> Dict[str, Dict]:
+    return {route: c.stats() for route, c in _controllers.items()}
@@ -0,0 +1,36 @@
+import os, logging, threading
+
+log = logging.getLogger("api.cache")
+
+# Shared Redis clients. One per process, built on first use: under gunicorn that is after fork,
+# so workers never inherit the master's sockets. No REDIS_URL -> None and callers skip caching.
+
+REDIS_URL = os.getenv("REDIS_URL", "")
+REDIS_TIMEOUT_S = float(os.getenv("REDIS_TIMEOUT_S", "0.25"))   # a slow cache must not slow queries
+
+_sync = None
+_async = None
+_lock = threading.Lock()
+
+def redis_sync():
+    global _sync
+    if _sync is None and REDIS_URL:
+        with _lock:
+            if _sync is None:
+                import redis
+                _sync = redis.from_url(REDIS_URL, socket_timeout=REDIS_TIMEOUT_S, socket_connect_timeout=REDIS_TIMEOUT_S)
+    return _sync
+
+def redis_async():
+    global _async
+    if _async is None and REDIS_URL:
+        with _lock:
+            if _async is None:
+                import redis.asyncio as aredis
+                _async = aredis.from_url(REDIS_URL, socket_timeout=REDIS_TIMEOUT_S, socket_connect_timeout=REDIS_TIMEOUT_S)
+    return _async
+
+def reset_after_fork():
+    # Drop clients inherited from a parent process; the next call reconnects
+    global _sync, _async
+    _sync = _async = None
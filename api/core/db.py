@@ -1,10 +1,6 @@
 from sqlalchemy import create_engine, event
-import os, glob, logging, re
-
-try:
-    from pgvector.psycopg2 import register_vector
-except ImportError:
-    register_vector = None
+from sqlalchemy.pool import QueuePool
+import os, logging, re, threading, time
 
 log = logging.getLogger("api.db")
 
@@ -30,44 +26,85 @@ def _mask(url: str) -> str:
 
 db_url = coalesce_db_url()
 
-if not db_url:
-    raise RuntimeError(
-        "No DB URL found. Set DATABASE_URL in the service env. "
-        "On Render, use Environment → From Database to inject DATABASE_URL."
-    )
-
-log.info("DB connecting to %s", _mask(db_url))
-engine = create_engine(
-    db_url,
-    pool_pre_ping=True,         # drops dead connections
-    pool_recycle=300,           # avoid stale sockets
-    pool_size=int(os.getenv("DB_POOL_SIZE") or 5),
-    max_overflow=int(os.getenv("DB_MAX_OVERFLOW") or 5),
-    future=True,
-)
+class _TimedQueuePool(QueuePool):
+    # Checkout time (waiting for a free connection, or connecting an overflow one) for api.core.loadmon
+    def _do_get(self):
+        t0 = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            from api.core.loadmon import observe_pool_wait
+            observe_pool_wait((time.perf_counter() - t0) * 1000)
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_engine():
+    """Engine on first use: importing this module never connects or raises, so the app can boot and report."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                if not db_url:
+                    raise RuntimeError(
+                        "No DB URL found. Set DATABASE_URL in the service env. "
+                        "On Render, use Environment → From Database to inject DATABASE_URL."
+                    )
+                log.info("DB connecting to %s", _mask(db_url))
+                eng = create_engine(
+                    db_url,
+                    pool_pre_ping=True,         # drops dead connections
+                    pool_recycle=300,           # avoid stale sockets
+                    poolclass=_TimedQueuePool,
+                    pool_size=int(os.getenv("DB_POOL_SIZE") or 5),
+                    max_overflow=int(os.getenv("DB_MAX_OVERFLOW") or 5),
+                    future=True,
+                )
+                event.listen(eng, "connect", _on_connect)
+                from api.core.sqlstats import instrument
+                instrument(eng)
+                _engine = eng
+    return _engine
+
+class _LazyEngine:
+    # `from api.core.db import engine` keeps working; the real Engine is built on first attribute access
+    def __getattr__(self, name):
+        return getattr(get_engine(), name)
+
+    def __repr__(self):
+        return f"<lazy engine {_mask(db_url)}>"
+
+engine = _LazyEngine()
+
+def dispose_after_fork():
+    # gunicorn post_fork: pooled connections opened in the master must not be shared with workers
+    if _engine is not None:
+        _engine.dispose(close=False)
 
 VECTOR_ADAPTER = False
 
-def run_sql_file(path: str):
-    with engine.begin() as conn:
-        with open(path, "r", encoding="utf-8") as f:
-            sql = f.read()
-        for stmt in [s.strip() for s in sql.split(";") if s.strip()]:
-            conn.exec_driver_sql(stmt + ";")
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "1") == "1"
 
 def run_startup_migrations():
-    paths = sorted(glob.glob("migrations/*.sql"))
-    for p in paths:
-        try:
-            log.info(f"migration start {p}")
-            run_sql_file(p)
-            log.info(f"migration ok {p}")
-        except Exception as e:
-            log.warning("migration_skip", extra={"msg": f"{p} {type(e).__name__}: {e}"})
+    # Deploys run `python -m api.core.migrate` up front (render.yaml preDeployCommand) and set
+    # MIGRATE_ON_STARTUP=0; when enabled here it costs one SELECT once everything is applied.
+    if not MIGRATE_ON_STARTUP:
+        return
+    from api.core.migrate import migrate
+    try:
+        applied = migrate(get_engine())
+    except Exception as e:
+        log.error("migration_failed %s: %s", type(e).__name__, e)
+        raise
+    if applied:
+        log.info("migrations applied: %s", ", ".join(applied))
             
-@event.listens_for(engine, "connect")
 def _on_connect(dbapi_connection, connection_record):
     global VECTOR_ADAPTER
+    try:
+        from pgvector.psycopg2 import register_vector   # pulls in numpy: load on first connection, not import
+    except ImportError:
+        register_vector = None
     if register_vector is not None and not VECTOR_ADAPTER:
         try:
             register_vector(dbapi_connection)
@@ -0,0 +1,54 @@
+import os, time
+from typing import Optional
+
+# Per-request time budget. /query creates one Deadline when the request arrives (admission wait counts
+# against it) and hands it to every stage; each stage takes its timeout from what is left instead of
+# a fixed constant, and skips to its cheaper fallback when too little is left:
+#   embed       httpx total timeout, capped at TOUT_READ       -> deterministic fallback embedding
+#   search      SET LOCAL statement_timeout, capped at SQL_TIMEOUT_MS; the no-filter retry only if time is left
+#   rerank      only with >= DEADLINE_RERANK_MIN_MS left        -> boost order
+#   llm         each call only with >= DEADLINE_LLM_MIN_MS left -> quotes as-is, or extractive sentences
+# DEADLINE_TAIL_MS is always held back for the extractive answer and the response, and the deadline
+# itself ends QUERY_DEADLINE_MARGIN_MS before QUERY_TIMEOUT_SEC, so the outer wait_for stays a backstop.
+
+QUERY_DEADLINE_MARGIN_MS = float(os.getenv("QUERY_DEADLINE_MARGIN_MS", "300"))
+DEADLINE_TAIL_MS = float(os.getenv("DEADLINE_TAIL_MS", "300"))
+DEADLINE_LLM_MIN_MS = float(os.getenv("DEADLINE_LLM_MIN_MS", "1200"))
+DEADLINE_RERANK_MIN_MS = float(os.getenv("DEADLINE_RERANK_MIN_MS", "2500"))
+SQL_TIMEOUT_MS = int(os.getenv("SQL_TIMEOUT_MS", "3000"))
+
+class Deadline:
+    __slots__ = ("budget_s", "at")
+
+    def __init__(self, budget_s: float):
+        self.budget_s = budget_s
+        self.at = time.monotonic() + budget_s
+
+    @classmethod
+    def for_request(cls, timeout_s: float) -> "Deadline":
+        return cls(max(0.0, timeout_s - QUERY_DEADLINE_MARGIN_MS / 1000))
+
+    def remaining(self) -> float:
+        return max(0.0, self.at - time.monotonic())
+
+    def elapsed(self) -> float:
+        return self.budget_s - (self.at - time.monotonic())
+
+    def timeout(self, cap: Optional[float] = None, reserve_s: float = DEADLINE_TAIL_MS / 1000) -> float:
+        """Seconds a stage may take: what is left minus `reserve_s` for later stages, at most `cap`; may be 0."""
+        left = max(0.0, self.remaining() - reserve_s)
+        return left if cap is None else min(cap, left)
+
+    def timeout_ms(self, cap_ms: Optional[int] = None, reserve_s: float = DEADLINE_TAIL_MS / 1000) -> int:
+        return int(self.timeout(None if cap_ms is None else cap_ms / 1000, reserve_s) * 1000)
+
+    def allows(self, min_ms: float, reserve_s: float = DEADLINE_TAIL_MS / 1000) -> bool:
+        return self.timeout(reserve_s=reserve_s) * 1000 >= min_ms
+
+def count_fallback(stage: str):
+    try:
+        from api.routers.metrics import DEADLINE_FALLBACKS
+        if DEADLINE_FALLBACKS:
+            DEADLINE_FALLBACKS.labels(stage=stage).inc()
+    except Exception:
+        pass
@@ -2,9 +2,12 @@ from fastapi import Request, HTTPException
 from fastapi.responses import JSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
 import logging, time, uuid
+from api.core import loadmon, profiler, tracing
 
 log = logging.getLogger("api.errors")
 
+QUIET_PATHS = ("/health", "/metrics")
+
 def json_error(code: str, message: str, context: dict | None = None, status: int = 400):
     return JSONResponse(
         status_code=status,
@@ -15,12 +18,36 @@ def json_error(code: str, message: str, context: dict | None = None, status: int
         }
     )
 
+def _route_label(request: Request) -> str:
+    # No route here has path parameters, so a matched path is already bounded; 404s share one label
+    return request.url.path if request.scope.get("endpoint") else "unmatched"
+
+def _observe(route: str, status: int, ms: float):
+    try:
+        from api.routers.metrics import HTTP_LAT
+        if HTTP_LAT:
+            HTTP_LAT.labels(route=route, status=str(status)).observe(ms)
+    except Exception:
+        pass
+
 class EnforceJSONMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next):
         request.state.request_id = str(uuid.uuid4())
-        t0 = time.time()
+        tr = tracing.start(request.state.request_id, request.url.path)
+        prof = profiler.start_request(request.headers)
+        counted = not request.url.path.startswith(QUIET_PATHS)
+        if counted:
+            loadmon.request_started()
+        t0 = time.perf_counter()
+        status = 500
         try:
-            resp = await call_next(request)
+            with tracing.otel_span("http.request", request.state.request_id):
+                resp = await call_next(request)
+            status = resp.status_code
+            total = (time.perf_counter() - t0) * 1000
+            resp.headers["Server-Timing"] = tr.server_timing(total)
+            if prof is not None:
+                resp.headers["X-Profile-Id"] = request.state.request_id
             return resp
         except Exception as exc:
             etype = type(exc).__name__
@@ -36,4 +63,16 @@ class EnforceJSONMiddleware(BaseHTTPMiddleware):
                 }
             )
         finally:
-            request.state.duration_ms = int((time.time() - t0) * 1000)
+            ms = (time.perf_counter() - t0) * 1000
+            if counted:
+                loadmon.request_finished()
+            if prof is not None:
+                profiler.finish_request(prof, request.state.request_id, request.url.path, status)
+            request.state.duration_ms = int(ms)
+            route = _route_label(request)
+            _observe(route, status, ms)
+            # Probes and scrapes only at debug level
+            level = logging.DEBUG if request.url.path.startswith(QUIET_PATHS) else logging.INFO
+            log.log(level, "request_done", extra={
+                "request_id": request.state.request_id, "route": route, "method": request.method,
+                "status": status, "duration_ms": round(ms, 1), "index": tr.index or None, "stages": tr.stages()})
@@ -1,25 +1,36 @@
 from __future__ import annotations
 import os, json, time
 from typing import Any, Dict, Optional
-
-# Lazy import so tests without the package still run
-try:
-    from openai import OpenAI, APIError, RateLimitError, APITimeoutError
-except Exception:
-    OpenAI = None
-    APIError = RateLimitError = APITimeoutError = Exception
+from api.core.deadline import DEADLINE_LLM_MIN_MS
 
 _client = None
+_sdk = None
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+OPENAI_BASE = os.getenv("OPENAI_BASE")     # same variable as embeddings; unset = SDK default
+
+def _openai():
+    # The SDK costs ~0.7s to import: deferred to warm-up / first call; missing package is fine for tests
+    global _sdk
+    if _sdk is None:
+        try:
+            import openai
+            _sdk = openai
+        except Exception:
+            _sdk = False
+    return _sdk
+
+def _retryable():
+    sdk = _openai()
+    return (sdk.RateLimitError, sdk.APITimeoutError, sdk.APIError) if sdk else (Exception,)
 
 def _client_ok() -> bool:
-    return bool(OPENAI_API_KEY) and OpenAI is not None
+    return bool(OPENAI_API_KEY) and bool(_openai())
 
 def _get_client():
     global _client
     if _client is None and _client_ok():
-        _client = OpenAI(api_key=OPENAI_API_KEY)
+        _client = _openai().OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE)
     return _client
 
 def openai_chat(
@@ -32,10 +43,13 @@ def openai_chat(
     temperature: float = 0.2,
     timeout_s: float = 8.0,
     retries: int = 1,
+    deadline=None,
 ) -> Any:
     """
     Returns str by default; when json_mode=True returns parsed dict
     Fallback (no API key): returns echo/extracted stub so the app won't crash
+    With a deadline (api.core.deadline), every attempt's timeout is capped by what is left of it
+    and there is no retry without DEADLINE_LLM_MIN_MS to spare.
     """
     use_model = model or os.getenv("LLM_MODEL", "gpt-4o-mini")
 
@@ -46,7 +60,9 @@ def openai_chat(
         return user[: max_tokens]
 
     last_err = None
+    retryable = _retryable()
     for attempt in range(retries + 1):
+        attempt_timeout = timeout_s if deadline is None else deadline.timeout(cap=timeout_s)
         try:
             client = _get_client()
             kwargs: Dict[str, Any] = {
@@ -57,7 +73,7 @@ def openai_chat(
                 ],
                 "temperature": temperature,
                 "max_tokens": max_tokens,
-                "timeout": timeout_s,
+                "timeout": attempt_timeout,
             }
             if json_mode:
                 kwargs["response_format"] = {"type": "json_object"}
@@ -70,10 +86,11 @@ def openai_chat(
                     # if model returns invalid JSON once, try plain parse fallback
                     return json.loads(text[text.find("{"): text.rfind("}")+1])
             return text
-        except (RateLimitError, APITimeoutError, APIError) as e:
+        except retryable as e:
             last_err = e
-            if attempt < retries:
-                time.sleep(0.4 * (attempt + 1))
+            backoff = 0.4 * (attempt + 1)
+            if attempt < retries and (deadline is None or deadline.allows(DEADLINE_LLM_MIN_MS + backoff * 1000)):
+                time.sleep(backoff)
                 continue
             raise
     raise RuntimeError(f"openai_chat failed: {last_err!r}")
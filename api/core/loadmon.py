@@ -0,0 +1,175 @@
+import os, time, asyncio, logging, threading
+from typing import Dict, Optional
+
+log = logging.getLogger("api.loadmon")
+
+# Saturation signals for tuning DB_POOL_SIZE / DB_MAX_OVERFLOW and thread limits. A background task on
+# the server loop wakes every LOADMON_INTERVAL_S and records:
+#   event-loop lag   how late the wake-up was: time the loop spent running something that did not await
+#   thread pools     AnyIO's default limiter (sync endpoints, anyio.to_thread.run_sync in generate) and
+#                    asyncio's default executor (asyncio.to_thread): occupancy, and the wait of a no-op
+#                    probe pushed through each, i.e. how long real work queues for a thread right now
+#   DB pool          checked out / overflow / idle from engine.pool; checkout wait from every checkout
+#   in flight        requests inside the middleware (probes and scrapes excluded)
+# Everything goes to /metrics and to /debug/load (last sample, this worker only).
+
+LOADMON_ENABLED = os.getenv("LOADMON_ENABLED", "1") == "1"
+LOADMON_INTERVAL_S = float(os.getenv("LOADMON_INTERVAL_S", "0.5"))
+LOOP_LAG_WARN_MS = float(os.getenv("LOOP_LAG_WARN_MS", "250"))
+WARN_EVERY_S = 10.0
+
+_inflight = 0
+_pool_wait = {"n": 0, "ms": 0.0, "max_ms": 0.0}
+_pool_lock = threading.Lock()
+_last: Dict = {}
+_stop: Optional[asyncio.Event] = None
+
+def _metrics():
+    try:
+        from api.routers import metrics
+        return metrics if metrics.HAVE_PROM else None
+    except Exception:
+        return None
+
+# --- Called from the request path ---
+
+def request_started():
+    # Middleware only, on the loop thread: no lock
+    global _inflight
+    _inflight += 1
+    m = _metrics()
+    if m:
+        m.INFLIGHT.set(_inflight)
+
+def request_finished():
+    global _inflight
+    _inflight = max(0, _inflight - 1)
+    m = _metrics()
+    if m:
+        m.INFLIGHT.set(_inflight)
+
+def inflight() -> int:
+    return _inflight
+
+def observe_pool_wait(ms: float):
+    # Any thread: DB checkouts happen on the loop and in workers alike
+    with _pool_lock:
+        _pool_wait["n"] += 1
+        _pool_wait["ms"] += ms
+        _pool_wait["max_ms"] = max(_pool_wait["max_ms"], ms)
+    m = _metrics()
+    if m:
+        m.DB_POOL_WAIT.observe(ms)
+
+# --- Samplers ---
+
+def pool_stats() -> Optional[Dict]:
+    from api.core import db
+    if db._engine is None:      # not built yet: do not connect just to report on it
+        return None
+    p = db._engine.pool
+    if not hasattr(p, "checkedout"):
+        return None
+    size = p.size()
+    with _pool_lock:
+        w = dict(_pool_wait)
+        _pool_wait.update(n=0, ms=0.0, max_ms=0.0)
+    return {"size": size, "max_overflow": getattr(p, "_max_overflow", 0), "checked_out": p.checkedout(),
+            "idle": p.checkedin(), "overflow": max(0, p.overflow()),
+            "checkouts": w["n"], "wait_avg_ms": round(w["ms"] / w["n"], 2) if w["n"] else 0.0,
+            "wait_max_ms": round(w["max_ms"], 2)}
+
+def anyio_stats() -> Dict:
+    # Must run on the event loop: the default limiter is per loop
+    from anyio import to_thread
+    st = to_thread.current_default_thread_limiter().statistics()
+    return {"busy": st.borrowed_tokens, "limit": int(st.total_tokens), "waiting": st.tasks_waiting}
+
+def executor_stats(loop: asyncio.AbstractEventLoop) -> Optional[Dict]:
+    # asyncio's default executor exists after the first to_thread; its counters are private, hence getattr.
+    # uvloop does not expose it at all: only the probe wait is reported there.
+    ex = getattr(loop, "_default_executor", None)
+    if ex is None:
+        return None
+    q = getattr(ex, "_work_queue", None)
+    return {"threads": len(getattr(ex, "_threads", ())), "limit": getattr(ex, "_max_workers", None),
+            "waiting": q.qsize() if q is not None else None}
+
+def _noop():
+    return None
+
+async def _probe(pool: str, waits: Dict[str, float]):
+    t0 = time.perf_counter()
+    try:
+        if pool == "anyio":
+            from anyio import to_thread
+            await to_thread.run_sync(_noop)
+        else:
+            await asyncio.get_running_loop().run_in_executor(None, _noop)
+    except Exception:
+        return
+    ms = (time.perf_counter() - t0) * 1000
+    waits[pool] = ms
+    m = _metrics()
+    if m:
+        m.THREAD_WAIT.labels(pool=pool).observe(ms)
+
+# --- Background loop (lifespan) ---
+
+def _publish(snap: Dict):
+    m = _metrics()
+    if not m:
+        return
+    m.LOOP_LAG.observe(snap["loop_lag_ms"])
+    for pool in ("anyio", "asyncio"):
+        for state, v in (snap.get(pool) or {}).items():
+            if isinstance(v, (int, float)) and state != "probe_wait_ms":     # that one is THREAD_WAIT
+                m.THREADS.labels(pool=pool, state=state).set(v)
+    pool = snap.get("db_pool")
+    if pool:
+        for state in ("size", "max_overflow", "checked_out", "idle", "overflow"):
+            m.DB_POOL.labels(state=state).set(pool[state])
+
+async def monitor_loop(interval_s: float = LOADMON_INTERVAL_S):
+    global _stop
+    _stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    waits: Dict[str, float] = {}
+    probes: Dict[str, asyncio.Task] = {}
+    warned = 0.0
+    while not _stop.is_set():
+        t0 = loop.time()
+        try:
+            await asyncio.wait_for(_stop.wait(), interval_s)
+            break
+        except asyncio.TimeoutError:
+            pass
+        lag_ms = max(0.0, (loop.time() - t0 - interval_s) * 1000)
+        try:
+            # One probe per pool in flight at a time: a saturated pool must not pile up probes behind real work
+            for pool in ("anyio", "asyncio"):
+                if pool not in probes or probes[pool].done():
+                    probes[pool] = asyncio.create_task(_probe(pool, waits))
+            snap = {"at": time.time(), "loop_lag_ms": round(lag_ms, 2), "inflight": _inflight,
+                    "anyio": {**anyio_stats(), "probe_wait_ms": round(waits.get("anyio", 0.0), 2)},
+                    "asyncio": {**(executor_stats(loop) or {}), "probe_wait_ms": round(waits.get("asyncio", 0.0), 2)},
+                    "db_pool": pool_stats()}
+            _last.clear()
+            _last.update(snap)
+            _publish(snap)
+        except Exception:
+            log.exception("loadmon_sample_failed")
+            continue
+        if lag_ms >= LOOP_LAG_WARN_MS and loop.time() - warned >= WARN_EVERY_S:
+            warned = loop.time()
+            log.warning("event_loop_lag lag_ms=%.0f inflight=%d (sync work on the loop; see /debug/profile)",
+                        lag_ms, _inflight)
+    for t in probes.values():
+        t.cancel()
+
+def stop_monitor():
+    if _stop is not None:
+        _stop.set()
+
+def snapshot() -> Dict:
+    return dict(_last)
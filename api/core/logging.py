@@ -14,7 +14,7 @@ class JsonLineFormatter(logging.Formatter):
             "msg": record.getMessage(),
             "logger": record.name,
         }
-        for k in ("request_id", "route", "index", "topic", "lang", "duration_ms"):
+        for k in ("request_id", "route", "method", "status", "index", "topic", "lang", "duration_ms", "stages"):
             if hasattr(record, k):
                 base[k] = getattr(record, k)
         if record.exc_info:
@@ -37,4 +37,4 @@ def configure_logging(db_url_for_log: str | None = None):
         logging.getLogger("sqlalchemy.engine").setLevel(logging.INFO)
         logging.getLogger("sqlalchemy.pool").setLevel(logging.INFO)
     if db_url_for_log:
-        root.info("startup db", sanitize_db_url(db_url_for_log))
+        root.info("startup db %s", sanitize_db_url(db_url_for_log))
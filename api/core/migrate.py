@@ -0,0 +1,253 @@
+"""
+Versioned migrations: each migrations/*.sql file is applied once, recorded in schema_migrations
+with its sha256, under a Postgres advisory lock so concurrent workers/deploys never race.
+
+  python -m api.core.migrate            # apply pending (same as `up`)
+  python -m api.core.migrate status     # applied / pending / changed
+  python -m api.core.migrate verify     # exit 1 if an applied file was edited
+
+A file whose first line is `-- migrate: no-transaction` runs statement by statement in autocommit
+(required for CREATE/DROP INDEX CONCURRENTLY). Keep those statements idempotent (IF [NOT] EXISTS):
+a failure midway leaves the earlier ones applied and the file is retried on the next run. A failed
+CREATE INDEX CONCURRENTLY leaves an INVALID index behind that IF NOT EXISTS would skip; the runner
+drops it before building again.
+"""
+import os, re, sys, glob, time, hashlib, logging
+from pathlib import Path
+from typing import Dict, List, Optional
+
+log = logging.getLogger("api.migrate")
+
+MIGRATIONS_DIR = os.getenv("MIGRATIONS_DIR") or str(Path(__file__).resolve().parents[2] / "migrations")
+MIGRATE_LOCK_KEY = 7_236_000
+MIGRATE_LOCK_TIMEOUT = os.getenv("MIGRATE_LOCK_TIMEOUT", "10s")   # per DDL statement, so a busy table fails fast instead of queueing queries
+MIGRATE_IGNORE_CHECKSUMS = os.getenv("MIGRATE_IGNORE_CHECKSUMS", "0") == "1"
+
+_NO_TX = re.compile(r"^\s*--\s*migrate:\s*no-transaction\b", re.I)
+_DOLLAR = re.compile(r"\$([A-Za-z_][A-Za-z0-9_]*)?\$")
+_CIC = re.compile(r"^\s*(?:(?:--[^\n]*\n|/\*.*?\*/)\s*)*CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+"
+                  r"(?:IF\s+NOT\s+EXISTS\s+)?((?:\"[^\"]+\"|\w+)(?:\.(?:\"[^\"]+\"|\w+))?)", re.I | re.S)
+
+class MigrationError(RuntimeError):
+    pass
+
+# --- SQL splitting ---
+
+def split_sql(sql: str) -> List[str]:
+    """Split on top-level `;`, respecting quotes, dollar-quoted bodies and comments; comment-only pieces are dropped."""
+    out, buf, i, n = [], [], 0, len(sql)
+    has_code = False
+    while i < n:
+        c = sql[i]
+        nxt = sql[i + 1] if i + 1 < n else ""
+        if c == "-" and nxt == "-":
+            j = sql.find("\n", i)
+            j = n if j < 0 else j
+            buf.append(sql[i:j]); i = j
+            continue
+        if c == "/" and nxt == "*":
+            depth, j = 1, i + 2
+            while j < n and depth:
+                if sql.startswith("/*", j):
+                    depth += 1; j += 2
+                elif sql.startswith("*/", j):
+                    depth -= 1; j += 2
+                else:
+                    j += 1
+            buf.append(sql[i:j]); i = j
+            continue
+        if c in ("'", '"'):
+            j = i + 1
+            while j < n:
+                if sql[j] == c:
+                    if j + 1 < n and sql[j + 1] == c:   # doubled quote escape
+                        j += 2
+                        continue
+                    break
+                j += 1
+            buf.append(sql[i:j + 1]); i = j + 1; has_code = True
+            continue
+        if c == "$":
+            m = _DOLLAR.match(sql, i)
+            if m:
+                end = sql.find(m.group(0), m.end())
+                j = n if end < 0 else end + len(m.group(0))
+                buf.append(sql[i:j]); i = j; has_code = True
+                continue
+        if c == ";":
+            if has_code:
+                out.append("".join(buf).strip())
+            buf, has_code = [], False
+            i += 1
+            continue
+        if not c.isspace():
+            has_code = True
+        buf.append(c); i += 1
+    if has_code:
+        out.append("".join(buf).strip())
+    return out
+
+# --- Files ---
+
+def checksum(sql: str) -> str:
+    return hashlib.sha256(sql.replace("\r\n", "\n").encode("utf-8")).hexdigest()
+
+def discover(path: str = MIGRATIONS_DIR) -> List[Dict]:
+    out = []
+    for p in sorted(glob.glob(os.path.join(path, "*.sql"))):
+        with open(p, "r", encoding="utf-8") as f:
+            sql = f.read()
+        out.append({"version": os.path.basename(p), "path": p, "sql": sql,
+                    "checksum": checksum(sql), "no_tx": bool(_NO_TX.match(sql))})
+    return out
+
+# --- Runner ---
+
+_DDL = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+  version TEXT PRIMARY KEY,
+  checksum TEXT NOT NULL,
+  applied_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  duration_ms INTEGER
+)
+"""
+
+def _applied(conn, create: bool = False) -> Dict[str, str]:
+    # Only the lock holder creates the table: concurrent CREATE ... IF NOT EXISTS can still collide
+    from sqlalchemy import text
+    if create:
+        conn.execute(text(_DDL))
+    elif conn.execute(text("SELECT to_regclass('schema_migrations')")).scalar_one() is None:
+        return {}
+    return dict(conn.execute(text("SELECT version, checksum FROM schema_migrations")).all())
+
+def _exec(conn, stmt: str):
+    # Raw DBAPI cursor: no parameter parsing, so '%' and ':name' in SQL are left alone
+    cur = conn.connection.cursor()
+    try:
+        cur.execute(stmt)
+    finally:
+        cur.close()
+
+def _drop_invalid_index(conn, stmt: str):
+    m = _CIC.match(stmt)
+    if not m:
+        return
+    cur = conn.connection.cursor()
+    try:
+        cur.execute("SELECT i.indisvalid FROM pg_index i WHERE i.indexrelid = to_regclass(%s)", (m.group(1),))
+        row = cur.fetchone()
+        if row and not row[0]:
+            log.warning("dropping invalid index %s left by an earlier failed build", m.group(1))
+            cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {m.group(1)}")
+    finally:
+        cur.close()
+
+def _apply(engine, m: Dict):
+    from sqlalchemy import text
+    stmts = split_sql(m["sql"])
+    t0 = time.time()
+    record = text("""
+        INSERT INTO schema_migrations (version, checksum, duration_ms) VALUES (:v, :c, :d)
+        ON CONFLICT (version) DO UPDATE SET checksum = EXCLUDED.checksum, applied_at = now(), duration_ms = EXCLUDED.duration_ms
+    """)
+    if m["no_tx"]:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            # Session-level setting on a pooled connection: undone before it goes back to the app
+            _exec(conn, f"SET lock_timeout = '{MIGRATE_LOCK_TIMEOUT}'")
+            try:
+                for s in stmts:
+                    _drop_invalid_index(conn, s)
+                    _exec(conn, s)
+                conn.execute(record, {"v": m["version"], "c": m["checksum"], "d": int((time.time() - t0) * 1000)})
+            finally:
+                try:
+                    _exec(conn, "RESET lock_timeout")
+                except Exception:
+                    conn.invalidate()
+    else:
+        with engine.begin() as conn:
+            _exec(conn, f"SET LOCAL lock_timeout = '{MIGRATE_LOCK_TIMEOUT}'")
+            for s in stmts:
+                _exec(conn, s)
+            conn.execute(record, {"v": m["version"], "c": m["checksum"], "d": int((time.time() - t0) * 1000)})
+    log.info("migration applied %s stmts=%d ms=%d", m["version"], len(stmts), int((time.time() - t0) * 1000))
+
+def status(engine=None, path: str = MIGRATIONS_DIR) -> Dict[str, List[str]]:
+    from api.core.db import engine as default_engine
+    engine = engine or default_engine
+    files = discover(path)
+    with engine.begin() as conn:
+        applied = _applied(conn)
+    out = {"applied": [], "pending": [], "changed": []}
+    for m in files:
+        if m["version"] not in applied:
+            out["pending"].append(m["version"])
+        elif applied[m["version"]] != m["checksum"]:
+            out["changed"].append(m["version"])
+        else:
+            out["applied"].append(m["version"])
+    return out
+
+def migrate(engine=None, path: str = MIGRATIONS_DIR) -> List[str]:
+    """Apply pending migrations in filename order; returns the versions applied. Raises MigrationError."""
+    from sqlalchemy import text
+    from api.core.db import engine as default_engine
+    engine = engine or default_engine
+    files = discover(path)
+
+    # Fast path for every worker after the first: one SELECT, no lock
+    with engine.begin() as conn:
+        applied = _applied(conn)
+    if all(m["version"] in applied for m in files) and not _changed(files, applied):
+        return []
+
+    done = []
+    with engine.connect() as lock_conn:
+        # Session lock, held across the per-file transactions below; other workers block here, then see it all applied
+        lock_conn.execute(text("SELECT pg_advisory_lock(:k)"), {"k": MIGRATE_LOCK_KEY})
+        lock_conn.commit()
+        try:
+            with engine.begin() as conn:
+                applied = _applied(conn, create=True)
+            changed = _changed(files, applied)
+            if changed and not MIGRATE_IGNORE_CHECKSUMS:
+                raise MigrationError(f"applied migrations were edited: {changed}; add a new file instead "
+                                     f"(or set MIGRATE_IGNORE_CHECKSUMS=1)")
+            for m in files:
+                if m["version"] in applied:
+                    continue
+                try:
+                    _apply(engine, m)
+                except Exception as e:
+                    raise MigrationError(f"{m['version']} failed: {type(e).__name__}: {e}") from e
+                done.append(m["version"])
+        finally:
+            lock_conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": MIGRATE_LOCK_KEY})
+            lock_conn.commit()
+    return done
+
+def _changed(files: List[Dict], applied: Dict[str, str]) -> List[str]:
+    return [m["version"] for m in files if m["version"] in applied and applied[m["version"]] != m["checksum"]]
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse, json
+    ap = argparse.ArgumentParser(prog="python -m api.core.migrate")
+    ap.add_argument("command", nargs="?", default="up", choices=["up", "status", "verify"])
+    ap.add_argument("--dir", default=MIGRATIONS_DIR)
+    args = ap.parse_args(argv)
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(levelname)s %(name)s: %(message)s")
+    try:
+        if args.command == "up":
+            applied = migrate(path=args.dir)
+            print(json.dumps({"applied": applied}))
+            return 0
+        st = status(path=args.dir)
+        print(json.dumps(st, indent=2))
+        return 1 if args.command == "verify" and (st["changed"] or st["pending"]) else 0
+    except MigrationError as e:
+        print(f"migration error: {e}", file=sys.stderr)
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
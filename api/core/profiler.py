@@ -0,0 +1,165 @@
+import os, sys, time, random, logging, threading
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+log = logging.getLogger("api.profiler")
+
+# Stdlib sampling profiler: a background thread snapshots every thread's Python stack
+# (sys._current_frames) every PROFILE_INTERVAL_MS and counts identical stacks. Output is speedscope
+# JSON (https://www.speedscope.app, one profile per thread) or collapsed stacks for flamegraph.pl.
+# A sync DB call or BeautifulSoup parse on the event loop thread shows up as that thread's stack
+# under the request handler instead of in an await.
+#
+# Two ways in, both behind DEBUG_TOKEN (unset = off):
+#   GET /debug/profile?seconds=N                 whole worker for N seconds
+#   X-Profile: 1 + X-Debug-Token on any request  that request, kept in memory, id in X-Profile-Id
+# plus PROFILE_SAMPLE_RATE, a fraction of ordinary requests profiled the same way.
+# One sampler runs at a time per worker; requests that arrive while one runs are not profiled.
+
+DEBUG_TOKEN = os.getenv("DEBUG_TOKEN", "")
+PROFILE_MAX_S = float(os.getenv("PROFILE_MAX_S", "60"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "20"))
+MAX_DEPTH = 128
+
+# Leaf frames of threads that are parked, not working (runners.run: uvloop waiting inside C)
+_IDLE = {("selectors.py", "select"), ("runners.py", "run"), ("threading.py", "wait"),
+         ("threading.py", "_wait_for_tstate_lock"), ("queue.py", "get"), ("thread.py", "_worker")}
+
+Frame = Tuple[str, str, int]     # function, file, first line
+
+class Sampler:
+    def __init__(self, interval_ms: float = PROFILE_INTERVAL_MS, idle: bool = False):
+        self.interval_s = max(interval_ms, 0.5) / 1000
+        self.idle = idle
+        self.stacks: Dict[int, Counter] = {}
+        self.names: Dict[int, str] = {}
+        self.samples = 0
+        self.t0 = self.t1 = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _take(self):
+        me = threading.get_ident()
+        for tid, frame in sys._current_frames().items():
+            if tid == me:
+                continue
+            stack: List[Frame] = []
+            f = frame
+            while f is not None and len(stack) < MAX_DEPTH:
+                co = f.f_code
+                stack.append((co.co_name, co.co_filename, co.co_firstlineno))
+                f = f.f_back
+            if not stack or (not self.idle and (os.path.basename(stack[0][1]), stack[0][0]) in _IDLE):
+                continue
+            self.stacks.setdefault(tid, Counter())[tuple(reversed(stack))] += 1
+        self.samples += 1
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._take()
+            self._stop.wait(self.interval_s)
+
+    def start(self) -> "Sampler":
+        self.t0 = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> "Sampler":
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.t1 = time.perf_counter()
+        self.names = {t.ident: t.name for t in threading.enumerate() if t.ident in self.stacks}
+        return self
+
+    def run(self, seconds: float) -> "Sampler":
+        self.start()
+        self._stop.wait(seconds)
+        return self.stop()
+
+    def speedscope(self, name: str = "profile") -> Dict:
+        frames: List[Dict] = []
+        index: Dict[Frame, int] = {}
+        ms = self.interval_s * 1000
+        profiles = []
+        for tid, counter in sorted(self.stacks.items(), key=lambda kv: -sum(kv[1].values())):
+            samples, weights = [], []
+            for stack, n in counter.most_common():
+                ids = []
+                for fr in stack:
+                    if fr not in index:
+                        index[fr] = len(frames)
+                        frames.append({"name": fr[0], "file": fr[1], "line": fr[2]})
+                    ids.append(index[fr])
+                samples.append(ids)
+                weights.append(round(n * ms, 3))
+            profiles.append({"type": "sampled", "name": self.names.get(tid, str(tid)), "unit": "milliseconds",
+                             "startValue": 0, "endValue": round(sum(weights), 3), "samples": samples, "weights": weights})
+        return {"$schema": "https://www.speedscope.app/file-format-schema.json", "name": name,
+                "exporter": "bilingual-rag", "activeProfileIndex": 0,
+                "shared": {"frames": frames}, "profiles": profiles}
+
+    def collapsed(self) -> str:
+        # "thread;outer (file:line);...;leaf (file:line) count" per line: flamegraph.pl / speedscope input
+        lines = []
+        for tid, counter in self.stacks.items():
+            root = self.names.get(tid, str(tid)).replace(";", ":")
+            for stack, n in counter.items():
+                path = ";".join(f"{fn} ({os.path.basename(file)}:{line})" for fn, file, line in stack)
+                lines.append(f"{root};{path} {n}")
+        return "\n".join(sorted(lines)) + "\n"
+
+    def summary(self) -> Dict:
+        return {"samples": self.samples, "interval_ms": self.interval_s * 1000,
+                "seconds": round(self.t1 - self.t0, 3), "threads": len(self.stacks)}
+
+# --- One sampler at a time per worker ---
+
+_busy = threading.Lock()
+_recent: "OrderedDict[str, Dict]" = OrderedDict()
+
+def token_ok(token: Optional[str]) -> bool:
+    import hmac
+    return bool(DEBUG_TOKEN) and hmac.compare_digest((token or "").encode(), DEBUG_TOKEN.encode())
+
+def profile_for(seconds: float, interval_ms: float = PROFILE_INTERVAL_MS, idle: bool = False) -> Optional[Sampler]:
+    """Blocking: sample the whole worker for `seconds` (capped); None if a profile is already running."""
+    if not _busy.acquire(blocking=False):
+        return None
+    try:
+        return Sampler(interval_ms, idle).run(min(max(seconds, 0.1), PROFILE_MAX_S))
+    finally:
+        _busy.release()
+
+def start_request(headers) -> Optional[Sampler]:
+    """Begin profiling this request if asked for (X-Profile + token) or sampled; None otherwise."""
+    asked = headers.get("x-profile") in ("1", "true") and token_ok(headers.get("x-debug-token"))
+    if not asked and not (PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE):
+        return None
+    if not _busy.acquire(blocking=False):
+        return None
+    try:
+        return Sampler().start()
+    except Exception:
+        _busy.release()
+        raise
+
+def finish_request(sampler: Sampler, request_id: str, path: str, status: int):
+    try:
+        sampler.stop()
+    finally:
+        _busy.release()
+    _recent[request_id] = {"request_id": request_id, "path": path, "status": status,
+                           "created_at": time.time(), **sampler.summary(),
+                           "profile": sampler.speedscope(f"{path} {request_id}")}
+    while len(_recent) > PROFILE_KEEP:
+        _recent.popitem(last=False)
+    log.info("request_profiled id=%s path=%s samples=%d", request_id, path, sampler.samples)
+
+def recent(request_id: Optional[str] = None):
+    if request_id:
+        return _recent.get(request_id)
+    return [{k: v for k, v in p.items() if k != "profile"} for p in reversed(_recent.values())]
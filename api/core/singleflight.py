@@ -0,0 +1,107 @@
+import os, json, uuid, asyncio, hashlib, logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+log = logging.getLogger("api.singleflight")
+
+# Request coalescing: concurrent calls with the same key share one computation. Per process the
+# followers await the leader's task; with SINGLEFLIGHT_REDIS=1 a Redis lock extends that across
+# workers/instances (the lock holder publishes its result, others poll for it).
+# The shared task is shielded: a caller that times out or disconnects does not cancel it for the rest.
+
+SINGLEFLIGHT_ENABLED = os.getenv("SINGLEFLIGHT_ENABLED", "1") == "1"
+SINGLEFLIGHT_REDIS = os.getenv("SINGLEFLIGHT_REDIS", "0") == "1"
+SINGLEFLIGHT_LOCK_TTL_S = float(os.getenv("SINGLEFLIGHT_LOCK_TTL_S", "30"))     # a crashed leader frees the key after this
+SINGLEFLIGHT_WAIT_S = float(os.getenv("SINGLEFLIGHT_WAIT_S", "10"))             # then a cross-worker follower computes itself
+SINGLEFLIGHT_POLL_S = float(os.getenv("SINGLEFLIGHT_POLL_S", "0.05"))
+SINGLEFLIGHT_RESULT_TTL_S = float(os.getenv("SINGLEFLIGHT_RESULT_TTL_S", "5"))
+
+# Delete the lock only if we still own it (it may have expired and been taken over)
+_RELEASE = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+
+def _json_default(o):
+    return o.isoformat() if hasattr(o, "isoformat") else str(o)
+
+def _count(scope: str):
+    try:
+        from api.routers.metrics import COALESCED
+        if COALESCED:
+            COALESCED.labels(scope=scope).inc()
+    except Exception:
+        pass
+
+class SingleFlight:
+    def __init__(self, name: str, use_redis: bool = SINGLEFLIGHT_REDIS):
+        self.name = name
+        self.use_redis = use_redis
+        self._calls: Dict[str, asyncio.Future] = {}
+
+    def inflight(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Result of fn(), computed once for all concurrent callers with this key. Results shared
+        across workers go through JSON, so fn should return JSON-friendly data."""
+        task = self._calls.get(key)
+        if task is not None:
+            _count("local")
+            return await asyncio.shield(task)
+        task = asyncio.ensure_future(self._lead(key, fn))
+        self._calls[key] = task
+        task.add_done_callback(lambda t: self._done(key, t))
+        return await asyncio.shield(task)
+
+    def _done(self, key: str, task: asyncio.Future):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()    # retrieved here: every waiter may have gone already
+
+    async def _lead(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        from api.core.cache import redis_async
+        rds = redis_async() if self.use_redis else None
+        if rds is None:
+            return await fn()
+        h = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        lock_key, res_key, token = f"sf:{self.name}:lock:{h}", f"sf:{self.name}:res:{h}", uuid.uuid4().hex
+        try:
+            got = await rds.set(lock_key, token, nx=True, px=int(SINGLEFLIGHT_LOCK_TTL_S * 1000))
+        except Exception as e:
+            log.warning("singleflight_redis_unavailable %s", type(e).__name__)
+            return await fn()
+        if got:
+            try:
+                out = await fn()
+                try:
+                    await rds.set(res_key, json.dumps(out, default=_json_default), px=int(SINGLEFLIGHT_RESULT_TTL_S * 1000))
+                except Exception:
+                    pass
+                return out
+            finally:
+                try:
+                    await rds.eval(_RELEASE, 1, lock_key, token)
+                except Exception:
+                    pass
+        # Another worker is computing it: wait for its result, or take over if it goes away
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + SINGLEFLIGHT_WAIT_S
+        try:
+            while loop.time() < deadline:
+                await asyncio.sleep(SINGLEFLIGHT_POLL_S)
+                raw = await rds.get(res_key)
+                if raw is not None:
+                    _count("redis")
+                    return json.loads(raw)
+                if not await rds.exists(lock_key):
+                    break
+        except Exception as e:
+            log.warning("singleflight_redis_failed %s", type(e).__name__)
+        return await fn()
+
+_flights: Dict[str, SingleFlight] = {}
+
+def get_flight(name: str) -> Optional[SingleFlight]:
+    if not SINGLEFLIGHT_ENABLED:
+        return None
+    if name not in _flights:
+        _flights[name] = SingleFlight(name)
+    return _flights[name]
@@ -0,0 +1,246 @@
+import os, re, time, queue, logging, threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+log = logging.getLogger("api.sql")
+
+# Per-statement timing on every engine statement (SQLAlchemy cursor events), replacing SA_LOG for
+# production use. Statements are labelled by the code that issues them (`with label("purge"):` or
+# @label("upsert_document")); unlabelled ones fall back to their SQL verb. Raw psycopg2 cursor paths
+# (execute_values in store.bulk_insert_chunks) report through observe().
+#
+# Statements slower than SLOW_SQL_MS are logged and, at most once per label per
+# SLOW_SQL_EXPLAIN_EVERY_S, explained off the request path: statement, parameters and the
+# transaction's SET LOCAL settings (ivfflat.probes) are queued to one background thread, which
+# replays them on its own pooled connection in a transaction it rolls back, under
+# SLOW_SQL_EXPLAIN_TIMEOUT_MS. Reads get EXPLAIN (ANALYZE, BUFFERS), which runs them a second time;
+# writes only get a plan, never an execution. A full queue drops the sample. Samples go to a ring
+# buffer (GET /debug/slow-sql) and are checked for the regressions we have hit before:
+#   seq_scan       Seq Scan over SQL_SEQSCAN_TABLES reading >= SQL_SEQSCAN_MIN_ROWS rows
+#   ann_not_used   a Sort on a pgvector distance (<=>, <->, <#>): the ANN index did not produce the order
+
+SQL_STATS_ENABLED = os.getenv("SQL_STATS_ENABLED", "1") == "1"
+SLOW_SQL_MS = float(os.getenv("SLOW_SQL_MS", "250"))
+SLOW_SQL_EXPLAIN = os.getenv("SLOW_SQL_EXPLAIN", "1") == "1"
+SLOW_SQL_EXPLAIN_EVERY_S = float(os.getenv("SLOW_SQL_EXPLAIN_EVERY_S", "60"))
+SLOW_SQL_KEEP = int(os.getenv("SLOW_SQL_KEEP", "50"))
+SLOW_SQL_EXPLAIN_TIMEOUT_MS = int(os.getenv("SLOW_SQL_EXPLAIN_TIMEOUT_MS", "10000"))
+SLOW_SQL_QUEUE = 8
+SQL_SEQSCAN_TABLES = {t.strip() for t in os.getenv("SQL_SEQSCAN_TABLES", "chunks,documents").split(",") if t.strip()}
+SQL_SEQSCAN_MIN_ROWS = int(os.getenv("SQL_SEQSCAN_MIN_ROWS", "5000"))
+
+_VERBS = {"select", "insert", "update", "delete", "with", "set", "show", "create", "drop", "alter", "analyze",
+          "reindex", "copy", "lock", "truncate", "vacuum"}
+_LEAD = re.compile(r"^\s*(?:(?:--[^\n]*\n|/\*.*?\*/)\s*)*(\w+)", re.S)
+_WRITES = re.compile(r"\b(insert|update|delete|merge)\b", re.I)
+_DISTANCE = re.compile(r"<=>|<->|<#>")
+_SET_LOCAL = re.compile(r"^\s*SET\s+LOCAL\s+([\w.]+)\s*(?:=|\bTO\b)\s*(.+?)\s*;?\s*$", re.I | re.S)
+
+_label: ContextVar[Optional[str]] = ContextVar("sql_label", default=None)
+_samples: deque = deque(maxlen=SLOW_SQL_KEEP)
+_explained: Dict[str, float] = {}
+_lock = threading.Lock()
+_jobs: "queue.Queue" = queue.Queue(maxsize=SLOW_SQL_QUEUE)
+_worker: Optional[threading.Thread] = None
+
+@contextmanager
+def label(name: str):
+    """Label every statement issued inside; also usable as a decorator."""
+    token = _label.set(name)
+    try:
+        yield
+    finally:
+        _label.reset(token)
+
+def _verb(statement: str) -> str:
+    m = _LEAD.match(statement or "")
+    v = m.group(1).lower() if m else ""
+    return v if v in _VERBS else "other"
+
+def current_label(statement: str = "") -> str:
+    return _label.get() or f"sql_{_verb(statement)}"
+
+def _metrics():
+    try:
+        from api.routers import metrics
+        return metrics if metrics.HAVE_PROM else None
+    except Exception:
+        return None
+
+def observe(name: str, ms: float):
+    m = _metrics()
+    if m:
+        m.SQL_LAT.labels(statement=name).observe(ms)
+
+# --- Engine events ---
+
+def instrument(engine):
+    from sqlalchemy import event
+    if not SQL_STATS_ENABLED:
+        return
+    event.listen(engine, "before_cursor_execute", _before)
+    event.listen(engine, "after_cursor_execute", _after)
+    event.listen(engine, "commit", _end_tx)
+    event.listen(engine, "rollback", _end_tx)
+
+def _before(conn, cursor, statement, parameters, context, executemany):
+    # On the execution context, not the connection: a statement that raises (statement_timeout)
+    # never reaches _after, and its start time goes away with the context
+    if context is not None:
+        context._sqlstats_t0 = time.perf_counter()
+
+def _after(conn, cursor, statement, parameters, context, executemany):
+    t0 = getattr(context, "_sqlstats_t0", None)
+    if t0 is None:
+        return
+    ms = (time.perf_counter() - t0) * 1000
+    m = _SET_LOCAL.match(statement or "")
+    if m:
+        # Replayed with the statement when it is explained; forgotten at commit/rollback
+        conn.info.setdefault("sqlstats_local", {})[m.group(1).lower()] = m.group(2)
+    name = current_label(statement)
+    observe(name, ms)
+    if ms >= SLOW_SQL_MS:
+        try:
+            _slow(conn, cursor, name, statement, parameters, executemany, ms)
+        except Exception:
+            log.exception("slow_sql_capture_failed statement=%s", name)
+
+def _end_tx(conn):
+    conn.info.pop("sqlstats_local", None)
+
+def _slow(conn, cursor, name: str, statement: str, parameters, executemany: bool, ms: float):
+    m = _metrics()
+    if m:
+        m.SQL_SLOW.labels(statement=name).inc()
+    log.warning("slow_sql statement=%s ms=%.0f rows=%s", name, ms, getattr(cursor, "rowcount", None))
+    verb = _verb(statement)
+    if not SLOW_SQL_EXPLAIN or executemany or verb not in ("select", "with", "insert", "update", "delete"):
+        return
+    now = time.monotonic()
+    with _lock:
+        if now - _explained.get(name, -SLOW_SQL_EXPLAIN_EVERY_S) < SLOW_SQL_EXPLAIN_EVERY_S:
+            return
+        _explained[name] = now
+    from api.core import tracing
+    tr = tracing.current()
+    settings = {k: v for k, v in (conn.info.get("sqlstats_local") or {}).items() if k != "statement_timeout"}
+    job = (conn.engine, name, statement, parameters, ms, verb in ("select", "with") and not _WRITES.search(statement),
+           settings, tr.request_id if tr else None)
+    try:
+        _jobs.put_nowait(job)
+    except queue.Full:
+        log.warning("slow_sql_explain_dropped statement=%s (queue full)", name)
+        return
+    _ensure_worker()
+
+# --- Background explain ---
+
+def _ensure_worker():
+    global _worker
+    with _lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_explain_loop, name="sqlstats-explain", daemon=True)
+            _worker.start()
+
+def _explain_loop():
+    while True:
+        job = _jobs.get()
+        try:
+            explain_later(*job)
+        except Exception:
+            log.exception("slow_sql_explain_failed statement=%s", job[1])
+        finally:
+            _jobs.task_done()
+
+def explain_later(engine, name: str, statement: str, parameters, ms: float, analyze: bool,
+                  settings: Dict[str, str], request_id: Optional[str] = None) -> Dict:
+    """Explain a captured statement on a connection of its own: same SET LOCALs, time-limited, rolled back."""
+    raw = engine.raw_connection()       # DBAPI level: the EXPLAIN is not itself timed or explained
+    try:
+        cur = raw.cursor()
+        try:
+            cur.execute(f"SET LOCAL statement_timeout = {max(1, SLOW_SQL_EXPLAIN_TIMEOUT_MS):d}")
+            for key, value in settings.items():
+                cur.execute(f"SET LOCAL {key} = {value}")
+        finally:
+            cur.close()
+        plan = explain(raw, statement, parameters, analyze=analyze)
+    finally:
+        try:
+            raw.rollback()
+        finally:
+            raw.close()
+    return capture(name, statement, ms, plan, analyzed=analyze, request_id=request_id)
+
+def explain(dbapi_conn, statement: str, parameters=None, analyze: bool = True) -> Dict:
+    """EXPLAIN (FORMAT JSON) on a raw DBAPI connection, in a savepoint when inside a transaction."""
+    opts = "ANALYZE, BUFFERS, FORMAT JSON" if analyze else "FORMAT JSON"
+    in_tx = not getattr(dbapi_conn, "autocommit", False)
+    cur = dbapi_conn.cursor()
+    try:
+        if in_tx:
+            cur.execute("SAVEPOINT sqlstats_explain")
+        try:
+            cur.execute(f"EXPLAIN ({opts}) {statement}", parameters or None)
+            plan = cur.fetchone()[0]
+        except Exception as e:
+            if in_tx:
+                cur.execute("ROLLBACK TO SAVEPOINT sqlstats_explain")
+            return {"error": f"{type(e).__name__}: {e}"[:300]}
+        if in_tx:
+            cur.execute("RELEASE SAVEPOINT sqlstats_explain")
+        return plan[0] if isinstance(plan, list) else plan
+    finally:
+        cur.close()
+
+# --- Plan checks ---
+
+def _nodes(plan: Dict):
+    yield plan
+    for child in plan.get("Plans") or ():
+        yield from _nodes(child)
+
+def _rows(node: Dict) -> int:
+    # Rows a node read: actual (with filtered-out rows) when analyzed, else the planner's estimate
+    if "Actual Rows" in node:
+        return int(node["Actual Rows"] * node.get("Actual Loops", 1) + node.get("Rows Removed by Filter", 0))
+    return int(node.get("Plan Rows", 0))
+
+def findings(plan: Dict, tables=None, min_rows: Optional[int] = None) -> List[Dict]:
+    tables = SQL_SEQSCAN_TABLES if tables is None else tables
+    min_rows = SQL_SEQSCAN_MIN_ROWS if min_rows is None else min_rows
+    out = []
+    root = plan.get("Plan") if isinstance(plan, dict) else None
+    if not root:
+        return out
+    for node in _nodes(root):
+        kind = node.get("Node Type")
+        if kind == "Seq Scan" and node.get("Relation Name") in tables and _rows(node) >= min_rows:
+            out.append({"kind": "seq_scan", "relation": node["Relation Name"], "rows": _rows(node)})
+        elif kind in ("Sort", "Incremental Sort") and any(_DISTANCE.search(k) for k in node.get("Sort Key") or ()):
+            # Rows fed into the sort: a top-k over a handful of rows is fine, over the whole table it is not
+            rows = _rows(node["Plans"][0]) if node.get("Plans") else _rows(node)
+            if rows >= min_rows:
+                rel = next((n.get("Relation Name") for n in _nodes(node) if n.get("Relation Name")), None)
+                out.append({"kind": "ann_not_used", "relation": rel, "rows": rows})
+    return out
+
+def capture(name: str, statement: str, ms: float, plan: Dict, analyzed: bool, request_id: Optional[str] = None) -> Dict:
+    found = findings(plan)
+    sample = {"at": time.time(), "statement": name, "ms": round(ms, 1), "request_id": request_id,
+              "analyzed": analyzed, "findings": found, "sql": statement[:4000], "plan": plan}
+    _samples.appendleft(sample)
+    m = _metrics()
+    for f in found:
+        log.warning("sql_plan_regression statement=%s kind=%s relation=%s rows=%s",
+                    name, f["kind"], f["relation"], f["rows"])
+        if m:
+            m.SQL_PLAN_FLAGS.labels(statement=name, kind=f["kind"], relation=f["relation"] or "").inc()
+    return sample
+
+def samples(limit: Optional[int] = None, plans: bool = True) -> List[Dict]:
+    out = list(_samples)[:limit]
+    return out if plans else [{k: v for k, v in s.items() if k != "plan"} for s in out]
@@ -0,0 +1,135 @@
+import os, gc, time, logging, threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+log = logging.getLogger("api.startup")
+
+# Cold start: the module graph stays light (heavy SDKs import on first use) and the expensive pieces
+# are warmed in a background thread after the server binds. /health/ready answers 503 until done.
+#   PHASES: seconds per startup phase (import_* measured in api.main, warm_* here) -> rag_startup_seconds
+
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "1") == "1"
+DEFAULT_INDEX = os.getenv("DEFAULT_INDEX_NAME", "c300o45")
+
+PHASES: Dict[str, float] = {}
+_T0 = time.perf_counter()
+
+_state = {"status": "starting", "error": None, "ready_s": None}
+_ready = threading.Event()
+
+@contextmanager
+def phase(name: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        PHASES[name] = round(time.perf_counter() - t0, 4)
+
+def _migrations():
+    from api.core.db import run_startup_migrations
+    run_startup_migrations()
+
+def _tokenizer():
+    from api.rag.embed import API_KEY, bucket_table, get_encoding
+    get_encoding().encode("hola")
+    if not API_KEY:
+        bucket_table()
+
+def _faq():
+    from api.rag.router import load_faq
+    load_faq(os.getenv("FAQ_PATH"))
+
+def _reranker():
+    from api.rag.rerank import preload
+    preload()
+
+def _llm_sdk():
+    from api.core.llm import _openai
+    _openai()
+
+def _llm_client():
+    from api.core.llm import _get_client
+    _get_client()
+
+def _extractors():
+    import trafilatura  # noqa: F401
+    from bs4 import BeautifulSoup  # noqa: F401
+    from rapidfuzz import process  # noqa: F401
+
+def _db_pool():
+    from sqlalchemy import text
+    from api.core.db import engine
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+def _active_index():
+    from api.rag.store import active_index_name
+    active_index_name(DEFAULT_INDEX)
+
+# (name, fn, required): a failed required step keeps the instance unready; optional ones only log
+STEPS: List[Tuple[str, Callable[[], None], bool]] = [
+    ("migrations", _migrations, True),
+    ("tokenizer", _tokenizer, False),
+    ("faq", _faq, False),
+    ("reranker", _reranker, False),
+    ("llm_sdk", _llm_sdk, False),
+    ("llm_client", _llm_client, False),
+    ("extractors", _extractors, False),
+    ("db_pool", _db_pool, False),
+    ("active_index", _active_index, False),
+]
+
+# Read-only assets safe to build in the gunicorn master: no sockets, threads or DB connections
+PRELOAD_STEPS = ("tokenizer", "faq", "reranker", "llm_sdk", "extractors")
+
+def warm_up(steps: Optional[List[Tuple[str, Callable[[], None], bool]]] = None) -> Dict:
+    steps = STEPS if steps is None else steps
+    _state.update(status="warming", error=None)
+    for name, fn, required in steps:
+        if not WARMUP_ENABLED and not required:
+            continue
+        try:
+            with phase(f"warm_{name}"):
+                fn()
+        except Exception as e:
+            if required:
+                _state.update(status="failed", error=f"{name}: {type(e).__name__}: {e}")
+                log.error("warmup_failed step=%s %s: %s", name, type(e).__name__, e)
+                _publish()
+                return status()
+            log.warning("warmup_step_failed step=%s %s: %s", name, type(e).__name__, e)
+    _state.update(status="ok", ready_s=round(time.perf_counter() - _T0, 3))
+    _ready.set()
+    _publish()
+    log.info("warmup_done ready_s=%s phases=%s", _state["ready_s"], PHASES)
+    return status()
+
+def preload():
+    """Load shared read-only assets before fork (gunicorn.conf.py), then freeze them out of the
+    cyclic GC so collections in the workers don't write to, and un-share, their pages."""
+    for name, fn, _ in STEPS:
+        if name not in PRELOAD_STEPS:
+            continue
+        try:
+            with phase(f"preload_{name}"):
+                fn()
+        except Exception as e:
+            log.warning("preload_step_failed step=%s %s: %s", name, type(e).__name__, e)
+    gc.collect()
+    gc.freeze()
+    log.info("preload_done frozen=%d phases=%s", gc.get_freeze_count(), {k: v for k, v in PHASES.items() if k.startswith("preload_")})
+
+def _publish():
+    try:
+        from api.routers.metrics import STARTUP_SECONDS
+        if STARTUP_SECONDS:
+            for k, v in PHASES.items():
+                STARTUP_SECONDS.labels(phase=k).set(v)
+    except Exception:
+        pass
+
+def is_ready() -> bool:
+    return _ready.is_set()
+
+def status() -> Dict:
+    return {**_state, "phases": dict(PHASES)}
@@ -0,0 +1,95 @@
+import os, time, logging
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+log = logging.getLogger("api.tracing")
+
+# Per-request stage timings. EnforceJSONMiddleware starts a Trace for each request (contextvar, so it
+# follows the request into tasks and worker threads); `with span("embed"):` records a stage on it and in
+# rag_stage_latency_ms{stage,route,index}. The stages go back to the client as a Server-Timing header
+# and onto the request's log line. With TRACING_OTEL=1 and opentelemetry-api installed each span is
+# also an OpenTelemetry span (request_id attribute); without a configured SDK those are no-ops.
+
+TRACING_OTEL = os.getenv("TRACING_OTEL", "0") == "1"
+
+class Trace:
+    __slots__ = ("request_id", "route", "index", "spans")
+
+    def __init__(self, request_id: str, route: str = ""):
+        self.request_id = request_id
+        self.route = route
+        self.index = ""
+        self.spans: List[Tuple[str, float]] = []
+
+    def stages(self) -> Dict[str, float]:
+        # A stage entered twice (e.g. two searches) reports its total
+        out: Dict[str, float] = {}
+        for name, ms in self.spans:
+            out[name] = round(out.get(name, 0.0) + ms, 2)
+        return out
+
+    def server_timing(self, total_ms: Optional[float] = None) -> str:
+        parts = [f"{name};dur={ms:.1f}" for name, ms in self.stages().items()]
+        if total_ms is not None:
+            parts.append(f"total;dur={total_ms:.1f}")
+        return ", ".join(parts)
+
+_current: ContextVar[Optional[Trace]] = ContextVar("rag_trace", default=None)
+
+def start(request_id: str, route: str = "") -> Trace:
+    tr = Trace(request_id, route)
+    _current.set(tr)
+    return tr
+
+def current() -> Optional[Trace]:
+    return _current.get()
+
+def annotate(route: Optional[str] = None, index: Optional[str] = None):
+    tr = _current.get()
+    if tr is not None:
+        if route is not None:
+            tr.route = route
+        if index is not None:
+            tr.index = index
+
+_tracer = None
+
+def _otel():
+    global _tracer
+    if not TRACING_OTEL:
+        return None
+    if _tracer is None:
+        try:
+            from opentelemetry import trace as otel_trace
+            _tracer = otel_trace.get_tracer("bilingual-rag")
+        except ImportError:
+            _tracer = False
+    return _tracer or None
+
+def otel_span(name: str, request_id: Optional[str] = None):
+    tracer = _otel()
+    if tracer is None:
+        return nullcontext()
+    return tracer.start_as_current_span(name, attributes={"request_id": request_id or ""})
+
+def _observe(stage: str, ms: float, tr: Optional[Trace]):
+    try:
+        from api.routers.metrics import STAGE_LAT
+        if STAGE_LAT:
+            STAGE_LAT.labels(stage=stage, route=tr.route if tr else "", index=tr.index if tr else "").observe(ms)
+    except Exception:
+        pass
+
+@contextmanager
+def span(name: str):
+    tr = _current.get()
+    t0 = time.perf_counter()
+    try:
+        with otel_span(f"rag.{name}", tr.request_id if tr else None):
+            yield
+    finally:
+        ms = (time.perf_counter() - t0) * 1000
+        if tr is not None:
+            tr.spans.append((name, ms))
+        _observe(name, ms, tr)
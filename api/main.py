@@ -1,18 +1,37 @@
 from contextlib import asynccontextmanager
-from api.core.logging import configure_logging
-from api.core.db import engine, run_startup_migrations
-from fastapi import FastAPI
-from sqlalchemy import text
-from api.core.db import coalesce_db_url
-from api.core.errors import json_error, EnforceJSONMiddleware
-from api.routers import ingest, query, health, metrics, debug
-from api.routers.metrics import router as metrics_router
+from api.core.startup import phase, warm_up
+with phase("import_framework"):
+    from fastapi import FastAPI
+    from sqlalchemy import text
+    from api.core.logging import configure_logging
+    from api.core.db import engine, coalesce_db_url
+    from api.core.errors import json_error, EnforceJSONMiddleware
+with phase("import_routers"):
+    from api.routers import ingest, query, health, metrics, debug
+    from api.routers.metrics import router as metrics_router
+    from api.rag.extract import shutdown_pool
+    from api.rag.fetch import close_scheduler
+    from api.rag.gc import GC_ENABLED, gc_loop, stop_gc
+    from api.core.loadmon import LOADMON_ENABLED, monitor_loop, stop_monitor
+import asyncio
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    run_startup_migrations()
+    # Migrations and heavy imports run off the loop: the port opens immediately, /health/ready gates traffic
+    warm_task = asyncio.create_task(asyncio.to_thread(warm_up))
+    gc_task = asyncio.create_task(gc_loop()) if GC_ENABLED else None
+    mon_task = asyncio.create_task(monitor_loop()) if LOADMON_ENABLED else None
     yield
+    if mon_task:
+        stop_monitor()
+        mon_task.cancel()
+    warm_task.cancel()
+    if gc_task:
+        stop_gc()
+        gc_task.cancel()
+    await close_scheduler()
+    shutdown_pool()
 
 db_url = coalesce_db_url()
 configure_logging(db_url)
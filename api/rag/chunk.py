@@ -1,45 +1,69 @@
-import re, trafilatura
-from bs4 import BeautifulSoup
+import re
+from api.rag.extract import HTML_PARSER
+from api.rag import segment
 from typing import List, Tuple
 
-SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+")
 _HTML_WS = re.compile(r"\s+")
+_HAS_WORD = re.compile(r"\w")
 
 def clean_whitespace(s: str) -> str:
     return re.sub(r"\s+", " ", (s or "").strip())
 
 def split_sentences(text: str) -> List[str]:
-    return [s.strip() for s in SENTENCE_SPLIT.split(text) if s.strip()]
+    return segment.split(text)
 
-def chunk_by_tokens(sentences: List[str], max_tokens: int = 600, overlap: int = 60, count_tokens=lambda x: len(x.split())) -> List[Tuple[str, int]]:
+def _join(buf: List[str]) -> Tuple[str, List[int]]:
+    starts, pos = [], 0
+    for s in buf:
+        starts.append(pos)
+        pos += len(s) + 1
+    return " ".join(buf), starts
+
+def chunk_by_tokens(sentences: List[str], max_tokens: int = 600, overlap: int = 60, count_tokens=lambda x: len(x.split()),
+                    with_starts: bool = False) -> List[Tuple]:
+    # with_starts: also return each chunk's sentence start offsets, (text, tokens, starts)
     chunks, buf, buf_tokens = [], [], 0
+    def emit():
+        chunk_text, starts = _join(buf)
+        chunks.append((chunk_text, buf_tokens, starts) if with_starts else (chunk_text, buf_tokens))
     for s in sentences:
         t = count_tokens(s)
         if buf_tokens + t > max_tokens and buf:
-            chunk_text = " ".join(buf)
-            chunks.append((chunk_text, buf_tokens))
+            emit()
             # overlap
             while buf and buf_tokens > overlap:
                 buf_tokens -= count_tokens(buf.pop(0))
         buf.append(s)
         buf_tokens += t
     if buf:
-        chunks.append((" ".join(buf), buf_tokens))
+        emit()
     return chunks
 
 def extract_html(html: str) -> str:
+    # CPU-heavy: from async code call it via api.rag.extract.run_extract(extract_html, html)
+    import trafilatura
+    from bs4 import BeautifulSoup
     # 1) Try trafilatura (article/main content)
     extracted = trafilatura.extract(html, include_comments=False, include_formatting=False, favor_precision=True) or ""
     if len(extracted.strip()) >= 400:
         return _HTML_WS.sub(" ", extracted).strip()
     # 2) Fallback to BeautifulSoup full-text
-    soup = BeautifulSoup(html, "html.parser")
+    soup = BeautifulSoup(html, HTML_PARSER)
     for t in soup(["script", "style", "noscript", "header", "footer", "nav", "aside"]):
         t.decompose()
     txt = soup.get_text(" ", strip=True)
     return _HTML_WS.sub(" ", txt).strip()
 
 def split_unicode(text: str):
-    # Unicode-friendly sentence splitter
-    parts = re.split(r"(?<=[\.\!\?])\s+", text)
-    return [p.strip() for p in parts if len(p.strip()) >= 80]
+    # Short sentences (dates, amounts, eligibility rules) are kept; only punctuation debris is dropped
+    return [s for s in segment.split(text) if _HAS_WORD.search(s)]
+
+def make_chunks(text: str, max_tokens: int = 600, overlap: int = 60) -> List[Tuple[str, int, List[int]]]:
+    # Sentence split + token packing shared by ingest and reindex (must stay picklable for process pools).
+    # Each chunk carries its sentence start offsets so query time never re-splits.
+    sentences = split_unicode(text or "")
+    chunks = [ct for ct in chunk_by_tokens(sentences, max_tokens=max_tokens, overlap=overlap, with_starts=True) if ct[1] > 0]
+    if not chunks and len(text or "") >= 600:
+        head = text[:2000]
+        chunks = [(head, min(len(head.split()), max_tokens), segment.sentence_starts(head))]
+    return chunks
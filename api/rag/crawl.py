@@ -0,0 +1,331 @@
+import os, re, gzip, json, hashlib, logging, asyncio
+import datetime as dt
+import xml.etree.ElementTree as ET
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit, urlunsplit, parse_qsl, urlencode, quote, unquote
+from urllib.robotparser import RobotFileParser
+from sqlalchemy import text
+from api.core.db import engine
+from api.core.lang import detect_lang
+from api.rag.fetch import ALLOWED_DOMAINS, UA, fetch_page, get_scheduler, interleave_by_host
+from api.rag.pipeline import ingest_text, NoChunks
+
+log = logging.getLogger("api.crawl")
+
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", "4"))
+CRAWL_MAX_DEPTH = int(os.getenv("CRAWL_MAX_DEPTH", "2"))
+CRAWL_MAX_ATTEMPTS = int(os.getenv("CRAWL_MAX_ATTEMPTS", "3"))
+CRAWL_MAX_SITEMAPS = int(os.getenv("CRAWL_MAX_SITEMAPS", "50"))
+
+_TRACKING = re.compile(r"^(utm_\w+|fbclid|gclid|mc_cid|mc_eid|_ga)$", re.I)
+_SKIP_EXT = re.compile(r"\.(pdf|jpe?g|png|gif|svg|webp|zip|docx?|xlsx?|pptx?|mp[34]|css|js|xml|ics|txt)$", re.I)
+_HOST_ALIASES = {"es.m.wikipedia.org": "es.wikipedia.org"}
+
+# --- URL hygiene ---
+
+def canonicalize(url: str, base: Optional[str] = None) -> Optional[str]:
+    """Stable key for a page: https, lowercase host, no fragment/tracking params, one encoding, no trailing slash."""
+    if not url:
+        return None
+    if base:
+        url = urljoin(base, url.strip())
+    parts = urlsplit(url.strip())
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        return None
+    host = _HOST_ALIASES.get(parts.hostname.lower(), parts.hostname.lower())
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+    path = quote(unquote(re.sub(r"/{2,}", "/", parts.path or "/")), safe="/:@!$&'()*+,;=-._~")
+    if len(path) > 1 and path.endswith("/"):
+        path = path.rstrip("/")
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not _TRACKING.match(k)))
+    return urlunsplit(("https", host, path, query, ""))
+
+def _parse_lastmod(s: Optional[str]) -> Optional[dt.datetime]:
+    s = (s or "").strip()
+    if not s:
+        return None
+    try:
+        d = dt.datetime.fromisoformat(s.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return d if d.tzinfo else d.replace(tzinfo=dt.timezone.utc)
+
+def parse_sitemap(body: bytes) -> Tuple[List[Tuple[str, Optional[dt.datetime]]], List[Tuple[str, Optional[dt.datetime]]]]:
+    """Returns (pages, child_sitemaps) as (loc, lastmod) pairs; handles gzip and sitemap indexes."""
+    if body[:2] == b"\x1f\x8b":
+        body = gzip.decompress(body)
+    try:
+        root = ET.fromstring(body)
+    except ET.ParseError:
+        return [], []
+    items = []
+    for el in root:
+        loc = lastmod = None
+        for child in el:
+            name = child.tag.rsplit("}", 1)[-1]
+            if name == "loc":
+                loc = (child.text or "").strip()
+            elif name == "lastmod":
+                lastmod = _parse_lastmod(child.text)
+        if loc:
+            items.append((loc, lastmod))
+    if root.tag.rsplit("}", 1)[-1] == "sitemapindex":
+        return [], items
+    return items, []
+
+def load_sites(path: str) -> Dict[str, Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        sites = {s["host"]: s for s in json.load(f)}
+    unknown = set(sites) - ALLOWED_DOMAINS
+    if unknown:
+        raise ValueError(f"seed hosts not in ALLOWED_DOMAINS: {sorted(unknown)}")
+    return sites
+
+def in_scope(url: Optional[str], sites: Dict[str, Dict]) -> Optional[Dict]:
+    if not url or _SKIP_EXT.search(urlsplit(url).path):
+        return None
+    parts = urlsplit(url)
+    site = sites.get(parts.hostname or "")
+    if site is None:
+        return None
+    for p in site.get("prefixes") or ["/"]:
+        if parts.path == p.rstrip("/") or parts.path.startswith(p):
+            return site
+    return None
+
+# --- Persistent frontier ---
+
+class Frontier:
+    """crawl_frontier table: one row per canonical URL, freshest lastmod first."""
+
+    def add(self, entries: Iterable[Tuple[str, int, Optional[dt.datetime]]]) -> int:
+        rows = [{"u": u, "h": urlsplit(u).hostname, "d": d, "m": m} for u, d, m in entries]
+        if not rows:
+            return 0
+        with engine.begin() as conn:
+            # Known URLs only go back to pending when the sitemap reports a newer lastmod than our last fetch
+            conn.execute(text("""
+                INSERT INTO crawl_frontier (url, host, depth, lastmod)
+                VALUES (:u, :h, :d, :m)
+                ON CONFLICT (url) DO UPDATE SET
+                  lastmod = GREATEST(crawl_frontier.lastmod, EXCLUDED.lastmod),
+                  depth = LEAST(crawl_frontier.depth, EXCLUDED.depth),
+                  attempts = CASE WHEN crawl_frontier.status IN ('done', 'failed')
+                                   AND EXCLUDED.lastmod > COALESCE(crawl_frontier.fetched_at, '-infinity')
+                                  THEN 0 ELSE crawl_frontier.attempts END,
+                  status = CASE WHEN crawl_frontier.status IN ('done', 'failed')
+                                 AND EXCLUDED.lastmod > COALESCE(crawl_frontier.fetched_at, '-infinity')
+                                THEN 'pending' ELSE crawl_frontier.status END
+            """), rows)
+        return len(rows)
+
+    def claim(self, n: int) -> List[Dict]:
+        # Round-robin over hosts (row_number per host), freshest first within a host
+        with engine.begin() as conn:
+            rows = conn.execute(text("""
+                UPDATE crawl_frontier f SET status = 'in_progress', attempts = f.attempts + 1
+                FROM (
+                  SELECT url, rn, lastmod FROM (
+                    SELECT url, lastmod,
+                           row_number() OVER (PARTITION BY host ORDER BY lastmod DESC NULLS LAST, depth, discovered_at) AS rn
+                    FROM crawl_frontier WHERE status = 'pending'
+                  ) ranked
+                  ORDER BY rn, lastmod DESC NULLS LAST
+                  LIMIT :n
+                ) pick
+                WHERE f.url = pick.url AND f.status = 'pending'
+                RETURNING f.url, f.host, f.depth, f.lastmod, f.content_hash, pick.rn
+            """), {"n": int(n)}).mappings().all()
+        rows = sorted((dict(r) for r in rows), key=lambda r: r["rn"])
+        by_url = {r["url"]: r for r in rows}
+        return [by_url[u] for u in interleave_by_host(by_url)]
+
+    def finish(self, url: str, *, content_hash: Optional[str] = None, error: Optional[str] = None):
+        with engine.begin() as conn:
+            if error is None:
+                conn.execute(text("""
+                    UPDATE crawl_frontier SET status = 'done', fetched_at = now(), last_error = NULL,
+                      content_hash = COALESCE(:h, content_hash)
+                    WHERE url = :u
+                """), {"u": url, "h": content_hash})
+            else:
+                conn.execute(text("""
+                    UPDATE crawl_frontier
+                    SET status = CASE WHEN attempts >= :max THEN 'failed' ELSE 'pending' END,
+                        last_error = :e
+                    WHERE url = :u
+                """), {"u": url, "e": error[:500], "max": CRAWL_MAX_ATTEMPTS})
+
+    def skip(self, url: str, reason: str):
+        # Terminal: out of scope or disallowed by robots.txt, never retried
+        with engine.begin() as conn:
+            conn.execute(text("UPDATE crawl_frontier SET status = 'skipped', last_error = :e WHERE url = :u"),
+                         {"u": url, "e": reason})
+
+    def duplicate_of(self, url: str, content_hash: str) -> Optional[str]:
+        with engine.connect() as conn:
+            return conn.execute(text(
+                "SELECT url FROM crawl_frontier WHERE content_hash = :h AND url <> :u LIMIT 1"
+            ), {"h": content_hash, "u": url}).scalar_one_or_none()
+
+    def requeue_stale(self, recrawl_after_days: Optional[float] = None) -> int:
+        # in_progress rows are leftovers from an interrupted run
+        with engine.begin() as conn:
+            n = conn.execute(text("UPDATE crawl_frontier SET status = 'pending' WHERE status = 'in_progress'")).rowcount or 0
+            if recrawl_after_days:
+                n += conn.execute(text("""
+                    UPDATE crawl_frontier SET status = 'pending', attempts = 0
+                    WHERE status = 'done' AND fetched_at < now() - make_interval(secs => :s)
+                """), {"s": recrawl_after_days * 86400}).rowcount or 0
+        return n
+
+# --- Crawler ---
+
+class Crawler:
+    def __init__(self, sites: Dict[str, Dict], *, index_name: str, max_tokens: int = 600, overlap: int = 60,
+                 max_depth: int = CRAWL_MAX_DEPTH, embedding_model: Optional[str] = None,
+                 frontier: Optional[Frontier] = None):
+        self.sites = sites
+        self.index_name = index_name
+        self.max_tokens = max_tokens
+        self.overlap = overlap
+        self.max_depth = max_depth
+        self.embedding_model = embedding_model
+        self.frontier = frontier or Frontier()
+        self._robots: Dict[str, Optional[RobotFileParser]] = {}
+        self.stats: Counter = Counter()
+
+    async def _robots_for(self, host: str) -> Optional[RobotFileParser]:
+        if host not in self._robots:
+            rp = None
+            try:
+                r = await get_scheduler().get(f"https://{host}/robots.txt")
+                if r.status_code == 200:
+                    rp = RobotFileParser()
+                    rp.parse(r.text.splitlines())
+            except Exception:
+                rp = None
+            self._robots[host] = rp
+        return self._robots[host]
+
+    async def discover(self) -> int:
+        # Sitemaps (configured, else robots.txt Sitemap: lines) + start_urls, all at depth 0
+        added = 0
+        for host, site in self.sites.items():
+            entries = [(u, 0, None) for u in (canonicalize(s) for s in site.get("start_urls") or []) if in_scope(u, self.sites)]
+            maps = list(site.get("sitemaps") or [])
+            if not maps:
+                rp = await self._robots_for(host)
+                maps = list((rp.site_maps() if rp else None) or [])
+            seen, queue = set(), maps[:]
+            while queue and len(seen) < CRAWL_MAX_SITEMAPS:
+                sm = queue.pop(0)
+                if sm in seen:
+                    continue
+                seen.add(sm)
+                try:
+                    r = await get_scheduler().get(sm)
+                    if r.status_code != 200:
+                        continue
+                    pages, children = parse_sitemap(r.content)
+                except Exception as e:
+                    log.warning("sitemap_failed url=%s err=%s", sm, type(e).__name__)
+                    continue
+                queue.extend(loc for loc, _ in children)
+                for loc, lastmod in pages:
+                    u = canonicalize(loc)
+                    if in_scope(u, self.sites):
+                        entries.append((u, 0, lastmod))
+            added += self.frontier.add(entries)
+            log.info("discover host=%s sitemaps=%d entries=%d", host, len(seen), len(entries))
+        return added
+
+    async def _process(self, e: Dict) -> str:
+        url, depth = e["url"], e["depth"]
+        site = in_scope(url, self.sites)
+        rp = await self._robots_for(e["host"])
+        if site is None or (rp and not rp.can_fetch(UA, url)):
+            self.frontier.skip(url, "out_of_scope" if site is None else "robots_disallowed")
+            return "skipped"
+        try:
+            page = await fetch_page(url, links=True)
+        except Exception as ex:
+            self.frontier.finish(url, error=f"{type(ex).__name__}: {ex}")
+            return "failed"
+
+        # Canonical elsewhere in scope: enqueue it instead of storing a duplicate
+        canon = canonicalize(page.get("canonical") or page["url"], base=page["url"])
+        if canon and canon != url and in_scope(canon, self.sites):
+            self.frontier.add([(canon, depth, e.get("lastmod"))])
+            self.frontier.finish(url)
+            return "canonicalized"
+
+        if depth < self.max_depth:
+            links = {canonicalize(h, base=page["url"]) for h in page.get("links") or []}
+            self.frontier.add((u, depth + 1, None) for u in links if in_scope(u, self.sites))
+
+        txt = page["text"]
+        h = hashlib.sha1(txt.encode("utf-8")).hexdigest()
+        if h == e.get("content_hash") or self.frontier.duplicate_of(url, h):
+            self.frontier.finish(url, content_hash=h)
+            return "unchanged"
+        try:
+            await ingest_text(
+                txt, source_uri=url, source_type="url",
+                lang=site.get("lang") or detect_lang(txt),
+                topic=site.get("topic"), country=site.get("country"),
+                index_name=self.index_name, max_tokens=self.max_tokens, overlap=self.overlap,
+                embedding_model=self.embedding_model,
+            )
+        except NoChunks:
+            self.frontier.finish(url, content_hash=h)
+            return "no_chunks"
+        except Exception as ex:
+            self.frontier.finish(url, error=f"ingest {type(ex).__name__}: {ex}")
+            return "failed"
+        self.frontier.finish(url, content_hash=h)
+        return "ingested"
+
+    async def run(self, *, max_pages: int = 200, concurrency: int = CRAWL_CONCURRENCY) -> Dict:
+        """Bounded worker pool fed from the frontier; per-host politeness is enforced by the fetch scheduler."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+
+        async def producer():
+            claimed = 0
+            while claimed < max_pages:
+                batch = self.frontier.claim(min(concurrency * 2, max_pages - claimed))
+                if not batch:
+                    # Workers may still add links; give them a moment before giving up
+                    if queue.empty() and self.stats["inflight"] == 0:
+                        break
+                    await asyncio.sleep(0.5)
+                    continue
+                for e in batch:
+                    await queue.put(e)
+                claimed += len(batch)
+            for _ in range(concurrency):
+                await queue.put(None)
+
+        async def worker():
+            while True:
+                e = await queue.get()
+                if e is None:
+                    return
+                self.stats["inflight"] += 1
+                try:
+                    outcome = await self._process(e)
+                except Exception as ex:
+                    log.exception("crawl_worker_failed url=%s", e["url"])
+                    self.frontier.finish(e["url"], error=f"{type(ex).__name__}: {ex}")
+                    outcome = "failed"
+                finally:
+                    self.stats["inflight"] -= 1
+                self.stats[outcome] += 1
+                log.info("crawl %s url=%s depth=%s", outcome, e["url"], e["depth"])
+
+        await asyncio.gather(producer(), *(worker() for _ in range(concurrency)))
+        out = dict(self.stats)
+        out.pop("inflight", None)
+        return out
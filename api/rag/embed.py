@@ -1,6 +1,6 @@
-import os, httpx, hashlib, math
-from typing import List
-import tiktoken
+import os, httpx, asyncio, hashlib, math, logging
+from array import array
+from typing import List, Optional, Tuple
 
 OPENAI_BASE = os.getenv("OPENAI_BASE", "https://api.openai.com/v1")
 API_KEY = os.getenv("OPENAI_API_KEY")
@@ -8,16 +8,41 @@ MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
 EMBED_DIM = 1536 # text-embedding-3-*
 TIMEOUT = httpx.Timeout(float(os.getenv("HTTP_TIMEOUT", "15")), read=float(os.getenv("TOUT_READ", "5")), connect=float(os.getenv("TOUT_CONNECT", "5")))
 
+EMBED_CACHE_TTL_S = int(os.getenv("EMBED_CACHE_TTL_S", "86400"))   # Redis query-embedding cache, shared by all workers
+
+log = logging.getLogger("api.embed")
+
 _headers = {"Authorization": f"Bearer {API_KEY}", "Content-Type": "application/json"}
-_enc = tiktoken.get_encoding("cl100k_base")
+_enc = None
+_buckets: Optional[array] = None
+
+def get_encoding():
+    # BPE tables take ~200ms to load: done by the startup warm-up, or on first use
+    global _enc
+    if _enc is None:
+        import tiktoken
+        _enc = tiktoken.get_encoding("cl100k_base")
+    return _enc
+
+def _bucket(tok: int, dim: int) -> int:
+    return int(hashlib.md5(str(tok).encode()).hexdigest(), 16) % dim
+
+def bucket_table() -> array:
+    # token id -> fallback dimension, one md5 per vocab entry instead of per token per call.
+    # Built before fork under gunicorn (preload) so every worker shares the same pages.
+    global _buckets
+    if _buckets is None:
+        _buckets = array("H", (_bucket(i, EMBED_DIM) for i in range(get_encoding().n_vocab)))
+    return _buckets
 
 def _fallback_embed(texts: List[str], dim: int = EMBED_DIM) -> List[list]:
     vecs = []
+    enc = get_encoding()
+    table = bucket_table() if dim == EMBED_DIM else None
     for t in texts:
         v = [0.0] * dim
-        for tok in _enc.encode(t or ""):
-            h = int(hashlib.md5(str(tok).encode()).hexdigest(), 16)
-            v[h % dim] += 1.0
+        for tok in enc.encode(t or ""):
+            v[table[tok] if table is not None and tok < len(table) else _bucket(tok, dim)] += 1.0
         norm = math.sqrt(sum(x*x for x in v)) or 1.0
         vecs.append([x / norm for x in v])
     return vecs
@@ -37,25 +62,85 @@ async def _embed_batch(texts: List[str], model: str) -> List[list]:
         err = {"text": r.text}
     raise RuntimeError(f"openai_embed_error:{r.status_code}:{err}")
 
-async def embed_texts(texts: List[str], model: str | None = None) -> List[list]:
+async def embed_texts(texts: List[str], model: str | None = None, cache: bool = False, deadline=None) -> List[list]:
+    return (await embed_with_status(texts, model, cache=cache, deadline=deadline))[0]
+
+async def embed_with_status(texts: List[str], model: str | None = None, cache: bool = False,
+                            deadline=None) -> Tuple[List[list], bool]:
+    # embed_texts, plus whether any vector is the local fallback after an API error or timeout
     # Normalize inputs (no Nones)
     texts = [t if isinstance(t, str) and t.strip() else " " for t in texts]
     use_model = (model or MODEL).strip()
+    if cache:
+        return await _embed_cached(texts, use_model, deadline)
+    return await _embed_uncached(texts, use_model, deadline)
 
+async def _embed_uncached(texts: List[str], use_model: str, deadline=None) -> Tuple[List[list], bool]:
+    # (vectors, whether any batch fell back to the local embedding after an API error or timeout)
     # Batch to avoid oversized payload edge cases
     BATCH = 64
     if not API_KEY:
-        return _fallback_embed(texts)
+        return _fallback_embed(texts), False
 
     out: List[list] = []
+    fell_back = False
     i = 0
     while i < len(texts):
         batch = texts[i:i+BATCH]
         try:
-            out.extend(await _embed_batch(batch, use_model))
+            # With a request deadline the whole call (not each read) is bounded by what is left of it
+            out.extend(await asyncio.wait_for(_embed_batch(batch, use_model),
+                                              deadline.timeout(cap=TIMEOUT.read) if deadline is not None else None))
         except Exception as e:
+            if deadline is not None and isinstance(e, asyncio.TimeoutError):
+                from api.core.deadline import count_fallback
+                count_fallback("embed")
             # Fallback deterministically for the entire remaining set
             print(f"[embed] Falling back due to: {e}")
             out.extend(_fallback_embed(batch))
+            fell_back = True
         i += BATCH
-    return out
+    return out, fell_back
+
+def _cache_key(model: str, text: str) -> str:
+    return f"emb:{model if API_KEY else 'fallback'}:{hashlib.sha1(text.encode('utf-8')).hexdigest()}"
+
+async def _embed_cached(texts: List[str], model: str, deadline=None) -> Tuple[List[list], bool]:
+    # Query path only: repeated questions skip the embeddings API in every worker. Redis down -> plain embed.
+    from api.core.cache import redis_async
+    rds = redis_async()
+    if rds is None:
+        return await _embed_uncached(texts, model, deadline)
+    keys = [_cache_key(model, t) for t in texts]
+    try:
+        cached = await rds.mget(keys)
+    except Exception as e:
+        log.warning("embed_cache_unavailable %s", type(e).__name__)
+        return await _embed_uncached(texts, model, deadline)
+    miss = [i for i, v in enumerate(cached) if v is None]
+    _count(len(texts) - len(miss), len(miss))
+    out: List[Optional[list]] = [array("f", v).tolist() if v is not None else None for v in cached]
+    if miss:
+        fresh, fell_back = await _embed_uncached([texts[i] for i in miss], model, deadline)
+        for i, vec in zip(miss, fresh):
+            out[i] = vec
+        if fell_back:
+            # Fallback vectors must not sit under the model's key for EMBED_CACHE_TTL_S
+            return out, True
+        try:
+            pipe = rds.pipeline(transaction=False)
+            for i, vec in zip(miss, fresh):
+                pipe.set(keys[i], array("f", vec).tobytes(), ex=EMBED_CACHE_TTL_S)
+            await pipe.execute()
+        except Exception as e:
+            log.warning("embed_cache_write_failed %s", type(e).__name__)
+    return out, False
+
+def _count(hits: int, misses: int):
+    try:
+        from api.routers.metrics import CACHE_LOOKUPS
+        if CACHE_LOOKUPS:
+            CACHE_LOOKUPS.labels(cache="embed", result="hit").inc(hits)
+            CACHE_LOOKUPS.labels(cache="embed", result="miss").inc(misses)
+    except Exception:
+        pass
@@ -0,0 +1,139 @@
+import os, json, math, time, asyncio, logging, itertools
+from typing import Dict, Iterable, List, Optional, Sequence
+
+log = logging.getLogger("api.evaluate")
+
+# Offline retrieval evaluation. Every gold query is embedded once (one batched call), then each
+# configuration (index_name x reranker x ivfflat probes) retrieves once at max(k) with the same
+# search -> boost -> rerank path /query uses, and recall@k / MRR / nDCG@k all come from that one
+# ranking. Queries run concurrently in worker threads; nothing calls the LLM.
+#
+# Relevance is document-level: a retrieved chunk is relevant if its source_uri starts with the
+# catalog URL of one of the query's relevant_ids; later chunks of an already-found document add nothing.
+
+KS = (1, 3, 5)
+
+def relevant_flags(uris: Sequence[str], relevant_urls: Sequence[str]) -> List[bool]:
+    seen, out = set(), []
+    for uri in uris:
+        hit = next((u for u in relevant_urls if u and (uri or "").startswith(u)), None)
+        out.append(hit is not None and hit not in seen)
+        if hit is not None:
+            seen.add(hit)
+    return out
+
+def recall_at(flags: Sequence[bool], n_relevant: int, k: int) -> float:
+    return sum(flags[:k]) / n_relevant if n_relevant else 0.0
+
+def mrr(flags: Sequence[bool]) -> float:
+    return next((1.0 / (i + 1) for i, f in enumerate(flags) if f), 0.0)
+
+def ndcg_at(flags: Sequence[bool], n_relevant: int, k: int) -> float:
+    dcg = sum(1.0 / math.log2(i + 2) for i, f in enumerate(flags[:k]) if f)
+    ideal = sum(1.0 / math.log2(i + 2) for i in range(min(n_relevant, k)))
+    return dcg / ideal if ideal else 0.0
+
+def score(uris: Sequence[str], relevant_urls: Sequence[str], ks: Iterable[int] = KS) -> Dict[str, float]:
+    flags = relevant_flags(uris, relevant_urls)
+    n = len([u for u in relevant_urls if u])
+    out = {f"recall@{k}": recall_at(flags, n, k) for k in ks}
+    out["mrr"] = mrr(flags)
+    out.update({f"ndcg@{k}": ndcg_at(flags, n, k) for k in ks})
+    return out
+
+def _pct(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    v = sorted(values)
+    return v[min(len(v) - 1, int(round(p / 100 * (len(v) - 1))))]
+
+def load_gold(gold_path: str, catalog_path: str, topic_hints: bool = True) -> List[Dict]:
+    with open(catalog_path, "r", encoding="utf-8") as f:
+        catalog = {d["id"]: d for d in json.load(f)}
+    with open(gold_path, "r", encoding="utf-8") as f:
+        gold = json.load(f)
+    out = []
+    for row in gold:
+        rel = [catalog[r] for r in row["relevant_ids"] if r in catalog]
+        # Same hinting as scripts/eval_retrieval.py: topic of the first catalogued relevant doc
+        topic = next((d.get("topic") for d in rel if d.get("topic")), None) if topic_hints else None
+        out.append({"query": row["query"], "relevant_urls": [d["url"] for d in rel], "topic": topic})
+    return out
+
+def _retrieve(q: str, qvec, *, index_name: str, k: int, rerank: bool, probes: Optional[int],
+              topic: Optional[str], langs: Sequence[str]) -> List[Dict]:
+    from api.rag.retrieve import _rank, _search
+    sims = _search(qvec, k=k, lang=tuple(langs), topic=topic, country=None, index_name=index_name, probes=probes)
+    return _rank(q, sims, k=k, use_reranker=rerank)[0]
+
+async def evaluate_config(gold: List[Dict], vecs: List[list], *, index_name: str, rerank: bool, probes: Optional[int],
+                          ks: Sequence[int] = KS, langs: Sequence[str] = ("es", "en"), concurrency: int = 8) -> Dict:
+    sem = asyncio.Semaphore(concurrency)
+    kmax = max(ks)
+
+    async def one(row, vec):
+        async with sem:
+            t0 = time.perf_counter()
+            try:
+                hits = await asyncio.to_thread(_retrieve, row["query"], vec, index_name=index_name, k=kmax,
+                                               rerank=rerank, probes=probes, topic=row["topic"], langs=langs)
+                err = None
+            except Exception as e:
+                hits, err = [], f"{type(e).__name__}: {e}"[:200]
+            ms = (time.perf_counter() - t0) * 1000
+        uris = [h.get("source_uri") or "" for h in hits]
+        return {"query": row["query"], "ms": round(ms, 2), "uris": uris, "error": err,
+                **score(uris, row["relevant_urls"], ks)}
+
+    if gold:
+        # Untimed first search: pool connections and the index's first pages are not the config's fault
+        try:
+            await asyncio.to_thread(_retrieve, gold[0]["query"], vecs[0], index_name=index_name, k=kmax, rerank=rerank,
+                                    probes=probes, topic=gold[0]["topic"], langs=langs)
+        except Exception:
+            pass
+    t0 = time.perf_counter()
+    rows = await asyncio.gather(*(one(r, v) for r, v in zip(gold, vecs)))
+    wall = time.perf_counter() - t0
+    n = len(rows) or 1
+    metrics = {m: round(sum(r[m] for r in rows) / n, 4) for m in rows[0] if m.startswith(("recall@", "ndcg@", "mrr"))} if rows else {}
+    lat = [r["ms"] for r in rows if not r["error"]]
+    return {"index_name": index_name, "rerank": rerank, "probes": probes, "queries": len(rows),
+            "errors": sum(1 for r in rows if r["error"]), **metrics,
+            "p50_ms": round(_pct(lat, 50), 1), "p95_ms": round(_pct(lat, 95), 1), "wall_s": round(wall, 2), "rows": rows}
+
+async def sweep(gold: List[Dict], *, indexes: Sequence[str], rerank: Sequence[bool] = (False,),
+                probes: Sequence[Optional[int]] = (None,), ks: Sequence[int] = KS, langs: Sequence[str] = ("es", "en"),
+                concurrency: int = 8, model: Optional[str] = None) -> Dict:
+    from api.rag.embed import embed_texts
+    t0 = time.perf_counter()
+    vecs = await embed_texts([g["query"] for g in gold], model=model)
+    embed_s = time.perf_counter() - t0
+    if any(rerank):
+        os.environ["RERANK_ENABLED"] = "1"      # rerank() checks it per call
+    results = []
+    for idx, rr, pr in itertools.product(indexes, rerank, probes):
+        res = await evaluate_config(gold, vecs, index_name=idx, rerank=rr, probes=pr, ks=ks, langs=langs,
+                                    concurrency=concurrency)
+        if rr:
+            from api.rag.rerank import _maybe_load
+            res["rerank_available"] = bool(_maybe_load())
+        log.info("eval_config index=%s rerank=%s probes=%s ndcg@%d=%.3f p95=%.1f", idx, rr, pr, max(ks),
+                 res.get(f"ndcg@{max(ks)}", 0.0), res["p95_ms"])
+        results.append(res)
+    return {"queries": len(gold), "ks": list(ks), "embed_s": round(embed_s, 2), "configs": results}
+
+def markdown_table(report: Dict) -> str:
+    ks = report["ks"]
+    head = (["index", "rerank", "probes"] + [f"R@{k}" for k in ks] + ["MRR", f"nDCG@{max(ks)}", "p50 ms", "p95 ms", "errors"])
+    lines = ["| " + " | ".join(head) + " |", "|" + "|".join("---" if i < 3 else "---:" for i in range(len(head))) + "|"]
+    kmax = max(ks)
+    # Best quality first; p95 breaks ties
+    for c in sorted(report["configs"], key=lambda c: (-c.get(f"ndcg@{kmax}", 0.0), c["p95_ms"])):
+        rerank = ("on" if c.get("rerank_available", True) else "on (unavailable)") if c["rerank"] else "off"
+        cells = [c["index_name"], rerank, str(c["probes"] or "default")]
+        cells += [f"{c.get(f'recall@{k}', 0.0):.2f}" for k in ks]
+        cells += [f"{c.get('mrr', 0.0):.3f}", f"{c.get(f'ndcg@{kmax}', 0.0):.3f}", f"{c['p50_ms']:.0f}", f"{c['p95_ms']:.0f}",
+                  str(c["errors"])]
+        lines.append("| " + " | ".join(cells) + " |")
+    return "\n".join(lines)
@@ -0,0 +1,166 @@
+import os, asyncio, logging, threading, multiprocessing
+from importlib.util import find_spec
+from typing import List, Optional, Set
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# lxml's C parser is several times faster than the pure-Python html.parser (checked without importing it)
+HTML_PARSER = "lxml" if find_spec("lxml") else "html.parser"
+
+log = logging.getLogger("api.extract")
+
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", "2"))          # 0 = run in a thread instead
+EXTRACT_TIMEOUT_S = float(os.getenv("EXTRACT_TIMEOUT_S", "20"))
+EXTRACT_MAX_BYTES = int(os.getenv("EXTRACT_MAX_BYTES", "3000000"))  # UTF-8 bytes; larger pages are truncated
+
+GOV_HOSTS = {"www.cdc.gov", "www.usa.gov", "www.irs.gov", "www.uscis.gov", "www.vote.gov", "www.who.int"}
+
+class ExtractTimeout(Exception):
+    pass
+
+def _site_text(soup, host: str) -> str:
+    text = ""
+    if "wikipedia.org" in host:
+        # Prefer main content; caller falls back to the REST plain-text endpoint if thin
+        node = soup.select_one("#mw-content-text") or soup.find("main") or soup.find("article")
+        if node:
+            text = node.get_text(" ")
+    elif host in GOV_HOSTS:
+        node = soup.find("main") or soup.find(id="main") or soup.find("article")
+        text = (node.get_text(" ") if node else soup.get_text(" "))
+    else:
+        text = soup.get_text(" ")
+    return " ".join(text.split())
+
+def extract_site_text(html: str, host: str) -> str:
+    # Runs in a worker process: only the cleaned text crosses back to the parent
+    from bs4 import BeautifulSoup
+    return _site_text(BeautifulSoup(html, HTML_PARSER), host)
+
+def extract_page(html: str, host: str) -> dict:
+    # Crawler variant: text plus raw hrefs and <link rel=canonical>; URL resolution happens in the parent
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, HTML_PARSER)
+    canon = soup.find("link", rel="canonical")
+    links = [a["href"] for a in soup.find_all("a", href=True)]
+    return {"text": _site_text(soup, host), "links": links, "canonical": canon.get("href") if canon else None}
+
+class _Pool:
+    # A running parse cannot be cancelled, and killing one worker breaks every future in its executor.
+    # So a timeout retires the whole pool instead: new work goes to a fresh one, and the retired pool
+    # is terminated once everything still running in it is stuck work nobody waits for.
+    def __init__(self):
+        # spawn: never fork the server process (threads, sockets, DB pool)
+        self.ex = ProcessPoolExecutor(max_workers=EXTRACT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        self.inflight: Set[Future] = set()
+        self.stuck: Set[Future] = set()
+        self.retired = self.closed = False
+
+    def submit(self, fn, *args) -> Future:
+        cf = self.ex.submit(fn, *args)
+        with _lock:
+            self.inflight.add(cf)
+        cf.add_done_callback(self._done)     # before wrap_future's: runs first
+        return cf
+
+    def _done(self, cf: Future):
+        # Executor thread: bookkeeping only, closing happens on the loop
+        with _lock:
+            self.inflight.discard(cf)
+            self.stuck.discard(cf)
+
+    def abandon(self, cf: Future):
+        with _lock:
+            if not cf.done():
+                self.stuck.add(cf)
+
+    def drained(self) -> bool:
+        with _lock:
+            return not (self.inflight - self.stuck)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        for p in list((getattr(self.ex, "_processes", None) or {}).values()):
+            try:
+                p.terminate()
+            except Exception:
+                pass
+        self.ex.shutdown(wait=False, cancel_futures=True)
+
+_pool: Optional[_Pool] = None
+_retired: List[_Pool] = []
+_lock = threading.Lock()
+
+def _get_pool() -> _Pool:
+    global _pool
+    if _pool is None:
+        _pool = _Pool()
+    return _pool
+
+def _retire(pool: _Pool):
+    global _pool
+    if _pool is pool:
+        _pool = None
+    if not pool.retired:
+        pool.retired = True
+        _retired.append(pool)
+    _reap()
+
+def _reap():
+    for pool in list(_retired):
+        if pool.drained():
+            pool.close()
+            _retired.remove(pool)
+
+def shutdown_pool():
+    global _pool
+    pools, _pool = [p for p in [_pool, *_retired] if p is not None], None
+    _retired.clear()
+    for pool in pools:
+        pool.close()
+
+def _cap(html: str) -> str:
+    # Chars <= bytes <= 4 * chars in UTF-8: only encode when the cap can actually be hit
+    if len(html) * 4 <= EXTRACT_MAX_BYTES:
+        return html
+    raw = html.encode("utf-8")
+    return html if len(raw) <= EXTRACT_MAX_BYTES else raw[:EXTRACT_MAX_BYTES].decode("utf-8", "ignore")
+
+async def _in_pool(fn, html: str, args, timeout: float):
+    pool = _get_pool()
+    cf = pool.submit(fn, html, *args)
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(cf), timeout)
+    except (asyncio.TimeoutError, asyncio.CancelledError):
+        # Still queued: cancelled above and gone. Running: stuck in a worker until the pool is closed
+        pool.abandon(cf)
+        _retire(pool)
+        raise
+    except BrokenProcessPool:
+        _retire(pool)       # a worker died (OOM kill, crash): every future in it failed, nothing to wait for
+        raise
+    finally:
+        _reap()
+
+async def run_extract(fn, html: str, *args):
+    """Run a CPU-bound extractor off the event loop with a size cap and timeout."""
+    html = _cap(html)
+    loop = asyncio.get_running_loop()
+    t_end = loop.time() + EXTRACT_TIMEOUT_S
+    try:
+        if EXTRACT_WORKERS <= 0:
+            return await asyncio.wait_for(loop.run_in_executor(None, fn, html, *args), EXTRACT_TIMEOUT_S)
+        try:
+            return await _in_pool(fn, html, args, EXTRACT_TIMEOUT_S)
+        except BrokenProcessPool:
+            # Usually another page's crash took this one down with it: one more try on a fresh pool
+            log.warning("extract_pool_broken fn=%s, retrying", getattr(fn, "__name__", fn))
+            try:
+                return await _in_pool(fn, html, args, max(0.0, t_end - loop.time()))
+            except BrokenProcessPool:
+                raise ExtractTimeout("extraction worker died twice")
+    except asyncio.TimeoutError:
+        log.warning("extract_timeout fn=%s chars=%d", getattr(fn, "__name__", fn), len(html))
+        raise ExtractTimeout(f"extraction exceeded {EXTRACT_TIMEOUT_S}s")
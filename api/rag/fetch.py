@@ -1,47 +1,190 @@
-import os, httpx, urllib
-from bs4 import BeautifulSoup
+import os, httpx, urllib, asyncio, time, logging
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from typing import Dict, Iterable, List, Optional
+from api.rag.extract import run_extract, extract_site_text, extract_page
 
 UA = os.getenv("USER_AGENT", "LatinoRAGBot/0.1 (+https://demo.local)")
 
 TIMEOUT = httpx.Timeout(float(os.getenv("HTTP_TIMEOUT", "15")), read=float(os.getenv("TOUT_READ", "25")), connect=float(os.getenv("TOUT_CONNECT", "5")))
 
-async def fetch_text(url: str) -> str:
-    headers = {
-        "User-Agent": UA,
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8"}
+ALLOWED_DOMAINS = {
+    "es.wikipedia.org", "es.m.wikipedia.org", "www.cdc.gov", "www.usa.gov",
+    "www.irs.gov", "www.uscis.gov", "www.vote.gov", "www.who.int"
+}
+
+# Politeness: per-host concurrency + request rate, plus a global cap on in-flight fetches
+HOST_CONCURRENCY = int(os.getenv("FETCH_HOST_CONCURRENCY", "2"))
+HOST_RPS = float(os.getenv("FETCH_HOST_RPS", "1.0"))
+MAX_CONCURRENCY = int(os.getenv("FETCH_MAX_CONCURRENCY", "8"))
+MAX_RETRY_AFTER_S = float(os.getenv("FETCH_MAX_RETRY_AFTER_S", "120"))
+FETCH_RETRIES = int(os.getenv("FETCH_RETRIES", "2"))
+# Overrides, e.g. "es.wikipedia.org=4:2,www.cdc.gov=1:0.5" (host=concurrency:rps)
+HOST_LIMITS = os.getenv("FETCH_HOST_LIMITS", "")
+
+log = logging.getLogger("api.fetch")
+
+def _parse_host_limits(spec: str) -> Dict[str, tuple]:
+    out = {}
+    for part in (spec or "").split(","):
+        host, _, lim = part.strip().partition("=")
+        if not host or not lim:
+            continue
+        conc, _, rps = lim.partition(":")
+        try:
+            out[host] = (int(conc or HOST_CONCURRENCY), float(rps or HOST_RPS))
+        except ValueError:
+            log.warning("bad FETCH_HOST_LIMITS entry %r", part)
+    return out
+
+def _retry_after_s(r: httpx.Response) -> Optional[float]:
+    val = (r.headers.get("Retry-After") or "").strip()
+    if not val:
+        return None
+    if val.isdigit():
+        return float(val)
+    try:
+        return max(0.0, parsedate_to_datetime(val).timestamp() - time.time())
+    except Exception:
+        return None
+
+def interleave_by_host(urls: Iterable[str]) -> List[str]:
+    # Round-robin across hosts so a long run of one domain doesn't sit at the head of the queue
+    buckets: "OrderedDict[str, List[str]]" = OrderedDict()
+    for u in urls:
+        buckets.setdefault(httpx.URL(u).host or "", []).append(u)
+    out = []
+    while buckets:
+        for host in list(buckets):
+            out.append(buckets[host].pop(0))
+            if not buckets[host]:
+                del buckets[host]
+    return out
+
+class _HostSlot:
+    def __init__(self, concurrency: int, rps: float):
+        self.sem = asyncio.Semaphore(max(1, concurrency))
+        self.interval = 1.0 / rps if rps > 0 else 0.0
+        self.next_at = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait_turn(self):
+        # Reserve the next start time under the lock, sleep outside it
+        async with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_at)
+            self.next_at = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    def back_off(self, seconds: float):
+        self.next_at = max(self.next_at, time.monotonic() + seconds)
+
+class FetchScheduler:
+    """
+    Shared fetch path for ingest: per-host concurrency and rate caps, Retry-After aware.
+    A request takes its host slot first and a global slot last, so tasks waiting on a
+    throttled host never hold capacity other hosts could use.
+    """
+    def __init__(self, *, host_concurrency: int = HOST_CONCURRENCY, host_rps: float = HOST_RPS,
+                 max_concurrency: int = MAX_CONCURRENCY, retries: int = FETCH_RETRIES,
+                 host_limits: Optional[Dict[str, tuple]] = None, client: Optional[httpx.AsyncClient] = None):
+        self.host_concurrency = host_concurrency
+        self.host_rps = host_rps
+        self.retries = retries
+        self.host_limits = host_limits if host_limits is not None else _parse_host_limits(HOST_LIMITS)
+        self._global = asyncio.Semaphore(max(1, max_concurrency))
+        self._hosts: Dict[str, _HostSlot] = {}
+        self._client = client
+
+    def _slot(self, host: str) -> _HostSlot:
+        slot = self._hosts.get(host)
+        if slot is None:
+            conc, rps = self.host_limits.get(host, (self.host_concurrency, self.host_rps))
+            slot = self._hosts[host] = _HostSlot(conc, rps)
+        return slot
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=TIMEOUT, follow_redirects=True, headers={
+                "User-Agent": UA,
+                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8"})
+        return self._client
+
+    async def get(self, url: str) -> httpx.Response:
+        host = httpx.URL(url).host or ""
+        slot = self._slot(host)
+        r = None
+        for attempt in range(self.retries + 1):
+            async with slot.sem:
+                await slot.wait_turn()
+                async with self._global:
+                    r = await self._get_client().get(url)
+            if r.status_code not in (429, 503) or attempt >= self.retries:
+                return r
+            wait = _retry_after_s(r)
+            wait = min(wait if wait is not None else 2.0 ** (attempt + 1), MAX_RETRY_AFTER_S)
+            slot.back_off(wait)
+            log.warning("fetch_throttled host=%s status=%s wait=%.1fs", host, r.status_code, wait)
+            try:
+                from api.routers.metrics import FETCH_THROTTLED
+                if FETCH_THROTTLED:
+                    FETCH_THROTTLED.labels(host=host).inc()
+            except Exception:
+                pass
+        return r
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+_schedulers: Dict[asyncio.AbstractEventLoop, FetchScheduler] = {}
+
+def get_scheduler() -> FetchScheduler:
+    # asyncio primitives and the httpx client belong to one loop: one scheduler per loop, closed on that
+    # loop by close_scheduler() (app lifespan, scripts). Loops that ended without it are dropped here.
+    loop = asyncio.get_running_loop()
+    sched = _schedulers.get(loop)
+    if sched is None:
+        for old in [l for l in _schedulers if l.is_closed()]:
+            log.warning("fetch_scheduler_not_closed: its event loop ended first")
+            del _schedulers[old]
+        sched = _schedulers[loop] = FetchScheduler()
+    return sched
+
+async def close_scheduler():
+    sched = _schedulers.pop(asyncio.get_running_loop(), None)
+    if sched is not None:
+        await sched.aclose()
+
+async def fetch_page(url: str, *, links: bool = False) -> Dict:
+    sched = get_scheduler()
     # 1) Fetch HTML
-    timeout = TIMEOUT
-    async with httpx.AsyncClient(timeout=timeout, follow_redirects=True, headers=headers) as client:
-        r = await client.get(url)
-        r.raise_for_status()
-        html = r.text
-
-    # 2) Parse with site-specific selectors
-    soup = BeautifulSoup(html, "html.parser")
-    host = httpx.URL(url).host or ""
-    text = ""
-
-    if "wikipedia.org" in host:
-        # Prefer main content
-        node = soup.select_one("#mw-content-text") or soup.find("main") or soup.find("article")
-        if node:
-            text = node.get_text(" ")
-        # If still thin, use REST plain-text
-        if len(text.strip()) < 400 and "/wiki/" in url:
-            title = urllib.parse.unquote(url.split("/wiki/")[-1])
-            rest = f"https://{host.replace('m.', '')}/api/rest_v1/page/plain/{title}"
-            async with httpx.AsyncClient(timeout=timeout, follow_redirects=True, headers=headers) as client:
-                rr = await client.get(rest)
-                if rr.status_code == 200 and rr.text.strip():
-                    text = rr.text
-
-    elif host in {"www.cdc.gov", "www.usa.gov", "www.irs.gov", "www.uscis.gov", "www.vote.gov", "www.who.int"}:
-        node = soup.find("main") or soup.find(id="main") or soup.find("article")
-        text = (node.get_text(" ") if node else soup.get_text(" "))
+    r = await sched.get(url)
+    r.raise_for_status()
+    html = r.text
 
+    # 2) Parse with site-specific selectors (process pool, off the event loop)
+    host = httpx.URL(url).host or ""
+    if links:
+        page = await run_extract(extract_page, html, host)
     else:
-        text = soup.get_text(" ")
+        page = {"text": await run_extract(extract_site_text, html, host)}
+    text = page["text"]
+
+    # If still thin, use Wikipedia's REST plain-text
+    if "wikipedia.org" in host and len(text) < 400 and "/wiki/" in url:
+        title = urllib.parse.unquote(url.split("/wiki/")[-1])
+        rest = f"https://{host.replace('m.', '')}/api/rest_v1/page/plain/{title}"
+        rr = await sched.get(rest)
+        if rr.status_code == 200 and rr.text.strip():
+            text = rr.text
 
     # Normalize whitespace
-    text = " ".join(text.split())
-    return text
\ No newline at end of file
+    page["text"] = " ".join(text.split())
+    page["url"] = str(r.url)
+    return page
+
+async def fetch_text(url: str) -> str:
+    return (await fetch_page(url))["text"]
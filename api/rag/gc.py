@@ -0,0 +1,209 @@
+import os, time, asyncio, logging, threading
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import text
+from api.core.db import engine
+from api.core.sqlstats import label
+
+log = logging.getLogger("api.gc")
+
+GC_ENABLED = os.getenv("GC_ENABLED", "1") == "1"
+GC_INTERVAL_S = float(os.getenv("GC_INTERVAL_S", "300"))
+GC_GRACE_S = float(os.getenv("GC_GRACE_S", "3600"))            # superseded versions kept this long (rollback window)
+GC_DOC_BATCH = int(os.getenv("GC_DOC_BATCH", "100"))
+GC_CHUNK_BATCH = int(os.getenv("GC_CHUNK_BATCH", "2000"))      # rows per DELETE transaction
+GC_PAUSE_S = float(os.getenv("GC_PAUSE_S", "0.2"))             # between batches, lets queries and autovacuum breathe
+GC_MAX_SECONDS = float(os.getenv("GC_MAX_SECONDS", "60"))      # work budget per cycle
+GC_VACUUM_AFTER = int(os.getenv("GC_VACUUM_AFTER", "20000"))   # deleted chunks before a targeted VACUUM
+GC_REINDEX_FRACTION = float(os.getenv("GC_REINDEX_FRACTION", "0.2"))
+GC_REINDEX_HOURS = os.getenv("GC_REINDEX_HOURS", "")           # UTC window like "2-5"; empty = any hour
+GC_LOCK_KEY = 7_236_001                                        # pg advisory lock: one collector across workers
+
+VECTOR_INDEX = "idx_chunks_embedding_current"
+
+# --- Purge (request path: flag the documents and retire their chunks; rows are removed by the collector) ---
+
+def soft_delete(conn, *, url: Optional[str] = None, domain: Optional[str] = None,
+                index_name: Optional[str] = None) -> List[str]:
+    if bool(url) == bool(domain):
+        raise ValueError("give exactly one of url or domain")
+    where = "source_uri = :u" if url else "lower(split_part(source_uri, '/', 3)) = :h"
+    if index_name:
+        where += " AND index_name = :idx"
+    ids = conn.execute(text(f"""
+        UPDATE documents SET deleted = TRUE, deleted_at = now()
+        WHERE NOT deleted AND {where}
+        RETURNING id
+    """), {"u": url, "h": (domain or "").lower(), "idx": index_name}).scalars().all()
+    return [str(i) for i in ids]
+
+def retire_chunks(doc_ids: List[str]) -> int:
+    # Takes the documents' chunks out of the current set (and the top-k) in GC_CHUNK_BATCH-row
+    # transactions, like _delete_chunks: a domain purge never holds locks on all its chunks at once
+    total = 0
+    while doc_ids:
+        with engine.begin() as conn:
+            n = conn.execute(text("""
+                UPDATE chunks SET is_current = FALSE WHERE id IN (
+                  SELECT id FROM chunks WHERE doc_id = ANY(CAST(:ids AS uuid[])) AND is_current LIMIT :n
+                )
+            """), {"ids": doc_ids, "n": GC_CHUNK_BATCH}).rowcount or 0
+        total += n
+        if n < GC_CHUNK_BATCH:
+            break
+        time.sleep(GC_PAUSE_S)
+    return total
+
+@label("purge")
+def purge(*, url: Optional[str] = None, domain: Optional[str] = None, index_name: Optional[str] = None) -> int:
+    """Soft-delete a page or a whole host and retire its chunks; blocking, so call it off the event loop."""
+    with engine.begin() as conn:
+        ids = soft_delete(conn, url=url, domain=domain, index_name=index_name)
+    # A crash between batches leaves chunks of deleted documents current until the collector deletes them
+    retire_chunks(ids)
+    return len(ids)
+
+# --- Collector (background: bounded transactions) ---
+
+def _candidates(limit: int) -> List[str]:
+    with engine.connect() as conn:
+        rows = conn.execute(text("""
+            SELECT id FROM documents
+            WHERE deleted OR superseded_at < now() - make_interval(secs => :grace)
+            LIMIT :n
+        """), {"grace": GC_GRACE_S, "n": limit}).scalars().all()
+    return [str(r) for r in rows]
+
+def _delete_chunks(doc_ids: List[str], stop: Optional[threading.Event], deadline: float) -> Tuple[int, bool]:
+    # Small DELETEs in separate transactions: short row locks, no long-held snapshot, steady WAL.
+    # Returns (deleted, done); done is False if the budget ran out first.
+    total = 0
+    while True:
+        with engine.begin() as conn:
+            n = conn.execute(text("""
+                DELETE FROM chunks WHERE id IN (
+                  SELECT id FROM chunks WHERE doc_id = ANY(CAST(:ids AS uuid[])) LIMIT :n
+                )
+            """), {"ids": doc_ids, "n": GC_CHUNK_BATCH}).rowcount or 0
+        total += n
+        if n < GC_CHUNK_BATCH:
+            return total, True
+        if (stop and stop.is_set()) or time.monotonic() > deadline:
+            log.info("gc_budget_exhausted chunks=%d", total)
+            return total, False
+        time.sleep(GC_PAUSE_S)
+
+def _record(chunks: int):
+    if chunks:
+        with engine.begin() as conn:
+            conn.execute(text("""
+                UPDATE gc_state SET deleted_since_vacuum = deleted_since_vacuum + :n,
+                                    deleted_since_reindex = deleted_since_reindex + :n
+                WHERE id = 1
+            """), {"n": chunks})
+    try:
+        from api.routers.metrics import GC_DELETED
+        if GC_DELETED and chunks:
+            GC_DELETED.labels(table="chunks").inc(chunks)
+    except Exception:
+        pass
+
+def _in_window(spec: str) -> bool:
+    if not spec:
+        return True
+    try:
+        lo, hi = (int(x) for x in spec.split("-", 1))
+    except ValueError:
+        return True
+    h = time.gmtime().tm_hour
+    return lo <= h < hi if lo <= hi else (h >= lo or h < hi)
+
+def maintenance(force: bool = False) -> Dict:
+    """VACUUM after enough deletes; REINDEX CONCURRENTLY the vector index once churn passes a fraction of it."""
+    out = {}
+    with engine.connect() as conn:
+        st = conn.execute(text("SELECT deleted_since_vacuum, deleted_since_reindex FROM gc_state WHERE id = 1")).first()
+        # Planner estimate, not count(*): this runs every cycle
+        size = conn.execute(text("SELECT reltuples FROM pg_class WHERE relname = 'chunks'")).scalar_one_or_none() or 0
+    if not st:
+        return out
+    since_vacuum, since_reindex = st
+    # Neither command may run inside a transaction block; neither blocks reads or writes on chunks
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if force or since_vacuum >= GC_VACUUM_AFTER:
+            t0 = time.time()
+            conn.exec_driver_sql("VACUUM (ANALYZE) chunks")
+            conn.execute(text("UPDATE gc_state SET deleted_since_vacuum = 0, last_vacuum_at = now() WHERE id = 1"))
+            out["vacuum_s"] = round(time.time() - t0, 2)
+        if since_reindex and (force or since_reindex >= GC_REINDEX_FRACTION * max(size, 1)) and _in_window(GC_REINDEX_HOURS):
+            t0 = time.time()
+            conn.exec_driver_sql(f"REINDEX INDEX CONCURRENTLY {VECTOR_INDEX}")
+            conn.execute(text("UPDATE gc_state SET deleted_since_reindex = 0, last_reindex_at = now() WHERE id = 1"))
+            out["reindex_s"] = round(time.time() - t0, 2)
+    if out:
+        log.info("gc_maintenance %s", out)
+    return out
+
+@label("gc")
+def collect(*, max_seconds: float = GC_MAX_SECONDS, stop: Optional[threading.Event] = None) -> Dict:
+    """One GC cycle: chunks of purged/superseded documents in small batches, then the document rows."""
+    stats = {"docs": 0, "chunks": 0}
+    deadline = time.monotonic() + max_seconds
+    with engine.connect() as lock_conn:
+        # Session-level lock: survives the commit, so this connection never sits idle in a transaction
+        got = lock_conn.execute(text("SELECT pg_try_advisory_lock(:k)"), {"k": GC_LOCK_KEY}).scalar_one()
+        lock_conn.commit()
+        if not got:
+            return {"skipped": "locked"}
+        try:
+            while not (stop and stop.is_set()) and time.monotonic() < deadline:
+                ids = _candidates(GC_DOC_BATCH)
+                if not ids:
+                    break
+                n, done = _delete_chunks(ids, stop, deadline)
+                stats["chunks"] += n
+                _record(n)
+                if not done:
+                    break
+                with engine.begin() as conn:
+                    # Chunks are gone, so the cascade has nothing left to do
+                    stats["docs"] += conn.execute(text("DELETE FROM documents WHERE id = ANY(CAST(:ids AS uuid[]))"),
+                                                  {"ids": ids}).rowcount or 0
+            if not (stop and stop.is_set()):
+                stats.update(maintenance())
+        finally:
+            lock_conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": GC_LOCK_KEY})
+            lock_conn.commit()
+    if stats["docs"] or stats["chunks"]:
+        log.info("gc_cycle docs=%d chunks=%d", stats["docs"], stats["chunks"])
+    return stats
+
+# --- Background loop (lifespan) ---
+
+_wake: Optional[asyncio.Event] = None
+_stop = threading.Event()
+
+def wake():
+    # Called from request handlers on the server loop after a purge
+    if _wake is not None:
+        _wake.set()
+
+async def gc_loop():
+    global _wake
+    _wake = asyncio.Event()
+    _stop.clear()
+    while not _stop.is_set():
+        try:
+            await asyncio.wait_for(_wake.wait(), GC_INTERVAL_S)
+        except asyncio.TimeoutError:
+            pass
+        _wake.clear()
+        try:
+            await asyncio.to_thread(collect, stop=_stop)
+        except Exception:
+            log.exception("gc_cycle_failed")
+
+def stop_gc():
+    # The running batch finishes; the cycle exits at the next batch boundary
+    _stop.set()
+    if _wake is not None:
+        _wake.set()
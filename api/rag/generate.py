@@ -1,16 +1,15 @@
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 import anyio, re
+from api.core.deadline import DEADLINE_LLM_MIN_MS, count_fallback
 from api.core.llm import openai_chat
+from api.core.tracing import span
+from api.rag.lexical import best_sentences, query_terms, sentence_terms, terms
 
 # --- Helpers 
 
 _WS = re.compile(r"\s+")
-_SENT = re.compile(r"(?<=[.!?])\s+")
-# Sentences that look like definitional answers in ES/EN
-_DEF_VERBS = re.compile(
-    r"\b(es|son|se\s+define\s+como|consiste|es\s+una|es\s+un|is|are|is\s+a|is\s+an)\b",
-    re.IGNORECASE,
-)
+# Sentences that look like definitional answers in ES/EN ("es", "son", "se define como", "consiste", "is", "are")
+_DEF_TERMS = frozenset(terms("es son define consiste is are"))
 
 SYS = (
 "You are a precise bilingual assistant. Answer ONLY using the provided context. "
@@ -35,24 +34,9 @@ def _subject_from_question(q: str) -> Optional[str]:
         return _WS.sub(" ", m.group(1)).strip("?.! ")
     return None
 
-def _best_sentences(question: str, texts: List[str], n: int = 2) -> List[str]:
-    q = set(re.findall(r"\w+", question.lower()))
-    cands = []
-    for t in texts:
-        for s in _SENT.split(t or ""):
-            s = (s or "").strip()
-            if not s: 
-                continue
-            toks = set(re.findall(r"\w+", s.lower()))
-            cands.append((len(q & toks), s))
-    cands.sort(key=lambda x: x[0], reverse=True)
-    out = []
-    for _, s in cands:
-        if all(s not in o and o not in s for o in out):
-            out.append(s)
-        if len(out) >= n:
-            break
-    return out
+def _best_sentences(question: str, texts: List, n: int = 2) -> List[str]:
+    # texts: retrieved rows (precomputed sentence term sets are reused) or plain strings
+    return best_sentences(query_terms(question), texts, n)
 
 # --- Context building ---
 
@@ -71,15 +55,13 @@ def build_context(cands: List[Dict]) -> str:
 
 def _first_def_sentence(subject: Optional[str], sims: List[Dict]) -> Optional[str]:
     # Scan top chunks for a subject-containing sentence that looks definitive
-    text = " ".join((c.get("text") or c.get("snippet") or "") for c in sims[:5])
-    for sent in _SENT.split(text):
-        s = _norm(sent)
-        if not s:
-            continue
-        if subject and subject.lower() not in s.lower():
-            continue
-        if _DEF_VERBS.search(s):
-            return s
+    subj = set(terms(subject)) if subject else set()
+    for c in sims[:5]:
+        for sent, ts in sentence_terms(c):
+            if subj and not subj <= ts:
+                continue
+            if ts & _DEF_TERMS:
+                return _norm(sent)
     return None
 
 def rule_based_definition(question: str, sims: List[Dict]) -> str:
@@ -92,13 +74,31 @@ def rule_based_definition(question: str, sims: List[Dict]) -> str:
     # Nothing reliable in context
     return "Rule_based_definition failed"
 
+def extractive_answer(question: str, cands: List[Dict]) -> Optional[str]:
+    # Best-matching sentences of the top source, cited as [1]; no LLM
+    sents = _best_sentences(question, list(cands or [])[:1], n=2)
+    return " ".join(sents) + " [1]" if sents else None
+
 # --- Main generator ---
 
-async def quote_then_summarize(question: str, cands: List[Dict], target_lang: str) -> str:
+def _llm_time(deadline, stage: str) -> bool:
+    # No LLM call is started that could not finish inside the request deadline
+    if deadline is None or deadline.allows(DEADLINE_LLM_MIN_MS):
+        return True
+    count_fallback(stage)
+    return False
+
+async def quote_then_summarize(question: str, cands: List[Dict], target_lang: str, extractive_only: bool = False,
+                               deadline=None) -> Tuple[str, bool]:
+    """(answer, full): full is True only for an LLM summary of extracted quotes. Every fallback
+    (no quotes, LLM error, degraded mode, deadline) returns False, so callers can avoid caching it."""
     # Limit context size
     cands = list(cands or [])[:5]
     if not cands:
-        return "No no cands provided."
+        return "No no cands provided.", False
+    if extractive_only or not _llm_time(deadline, "llm_extract"):
+        # Overload (degraded mode) or too little time left: skip both LLM calls
+        return extractive_answer(question, cands) or "First rule-based fallback failed.", False
     
     ctx = build_context(cands)
     
@@ -111,7 +111,8 @@ async def quote_then_summarize(question: str, cands: List[Dict], target_lang: st
             "Return JSON: {\"quotes\":[{\"i\":<source_number>,\"text\":\"...\"}...]}. "
             "If not answerable, return {\"quotes\":[]}."
         )
-        return openai_chat(SYS, extract_prompt, json_mode=True, max_tokens=300)
+        with span("llm_extract"):
+            return openai_chat(SYS, extract_prompt, json_mode=True, max_tokens=300, deadline=deadline)
     
     quotes = []
     try:
@@ -127,13 +128,11 @@ async def quote_then_summarize(question: str, cands: List[Dict], target_lang: st
     
     # IF LMM returns nothing, extractive fallback from top source
     if not quotes:
-        top_snippet = (cands[0].get("text") or cands[0].get("snippet") or "").strip()
-        sents = _best_sentences(question, [top_snippet], n=2)
-        if sents:
-            # cite [1] since using the 1st source
-            return " ".join(sents) + " [1]"
-        # Still nothing relevant
-        return "First rule-based fallback failed."
+        # cite [1] since using the 1st source
+        return extractive_answer(question, cands) or "First rule-based fallback failed.", False
+    if not _llm_time(deadline, "llm_summarize"):
+        # The quotes are already grounded and numbered: answer with them rather than run out of time
+        return " ".join(f"{q['text']} [{q['i']}]" for q in quotes), False
 
     # Summarize quotes with LLM
     def _summarize_sync():
@@ -145,18 +144,15 @@ async def quote_then_summarize(question: str, cands: List[Dict], target_lang: st
             "After each sentence, add [i] markers from the quote source numbers. "
             "Do not invent facts or citations."
         )
-        return openai_chat(SYS, sum_prompt, json_mode=False, max_tokens=180)
+        with span("llm_summarize"):
+            return openai_chat(SYS, sum_prompt, json_mode=False, max_tokens=180, deadline=deadline)
     
     try:
         out = await anyio.to_thread.run_sync(_summarize_sync)
         if isinstance(out, str) and out.strip():
-            return out.strip()
+            return out.strip(), True
     except Exception:
         pass
     
     # Final rule-based fallback
-    top_snippet = (cands[0].get("text") or cands[0].get("snippet") or "").strip()
-    sents = _best_sentences(question, [top_snippet], n=2)
-    if sents:
-        return " ".join(sents) + " [1]"
-    return "Final rule-based fallback failed."
+    return extractive_answer(question, cands) or "Final rule-based fallback failed.", False
@@ -0,0 +1,81 @@
+import re, unicodedata
+from functools import lru_cache
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Set, Tuple
+from api.rag.segment import row_sentences, from_starts, split
+
+# Lexical features computed once at ingest (chunks.lex) so query-time boosting and sentence
+# selection are set intersections instead of lowercasing/regex-scanning every candidate's text.
+#   lex = {"v": [sorted folded terms of the chunk], "s": [[indexes into v] per sentence]}
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+_ES_PLURAL = re.compile(r"(?<=[dlnrzjxy])es$")
+
+@lru_cache(maxsize=50000)
+def _norm_token(t: str) -> str:
+    # accent fold + light plural folding ("ciudades" -> "ciudad", "taxes" -> "tax", "forms" -> "form")
+    t = "".join(c for c in unicodedata.normalize("NFKD", t.lower()) if not unicodedata.combining(c))
+    if len(t) > 4 and _ES_PLURAL.search(t):
+        return t[:-2]
+    if len(t) > 3 and t.endswith("s") and not t.endswith(("ss", "us", "is")):
+        return t[:-1]
+    return t
+
+_STOP = frozenset(_norm_token(w) for w in """
+de la el los las un una unos unas y o en por para con del al que se su sus lo le les es son
+the a an of and or in on for to with by is are be at as it its this that from
+""".split())
+
+def terms(text: str) -> List[str]:
+    return [_norm_token(t) for t in _WORD.findall(text or "")]
+
+def query_terms(text: str) -> Set[str]:
+    # Stopwords only matter on the query side: they would match nearly every sentence
+    out = {t for t in terms(text) if t not in _STOP}
+    return out or set(terms(text))
+
+def features(text: str, starts: Optional[Sequence[int]] = None) -> Dict:
+    sents = from_starts(text, starts) if starts else split(text)
+    per_sent = [set(terms(s)) for s in sents]
+    vocab = sorted(set().union(*per_sent)) if per_sent else []
+    pos = {t: i for i, t in enumerate(vocab)}
+    return {"v": vocab, "s": [sorted(pos[t] for t in ts) for ts in per_sent]}
+
+def _get(row, key):
+    if isinstance(row, Mapping):
+        return row.get(key)
+    return getattr(row, key, None)
+
+@lru_cache(maxsize=4096)
+def uri_terms(uri: str) -> frozenset:
+    return frozenset(terms((uri or "").replace("_", " ").replace("-", " ")))
+
+def row_terms(row) -> Set[str]:
+    lex = _get(row, "lex")
+    if lex and lex.get("v") is not None:
+        return set(lex["v"])
+    text = _get(row, "text") or _get(row, "snippet") or ""
+    return set(terms(text))
+
+def sentence_terms(row) -> List[Tuple[str, Set[str]]]:
+    """(sentence, term set) pairs for a retrieved row; precomputed when chunks.lex is present."""
+    sents = row_sentences(row)
+    lex = None if isinstance(row, str) else _get(row, "lex")
+    if lex and len(lex.get("s") or []) == len(sents):
+        v = lex["v"]
+        return [(s, {v[i] for i in idx}) for s, idx in zip(sents, lex["s"])]
+    return [(s, set(terms(s))) for s in sents]
+
+def best_sentences(q_terms: Set[str], rows: Iterable, n: int) -> List[str]:
+    # Shared by the extractive fallbacks: overlap count, stable on ties, no nested duplicates
+    cands = []
+    for r in rows:
+        if r:
+            cands.extend((len(q_terms & ts), s) for s, ts in sentence_terms(r))
+    cands.sort(key=lambda x: x[0], reverse=True)
+    out: List[str] = []
+    for _, s in cands:
+        if all(s not in o and o not in s for o in out):
+            out.append(s)
+        if len(out) >= n:
+            break
+    return out
@@ -0,0 +1,234 @@
+import os, json, time, shutil, logging, threading
+from typing import Dict, List, Optional
+import numpy as np
+from api.rag.retrieve import RetrievalBackend
+
+log = logging.getLogger("api.local_index")
+
+# Postgres-free retrieval (CI, edge, load tests): an exported snapshot of the current chunks of one
+# index, searched with blocked NumPy dot products. Everything is opened with mmap, so loading is a
+# few syscalls regardless of size and every worker on the host shares the same page cache.
+#
+#   <LOCAL_INDEX_DIR>/<index_name>/
+#     manifest.json   dim, count, code tables for lang/topic/country
+#     vectors.f32     count x dim float32, L2-normalized (dot = cosine)
+#     codes.npy       count x 3 int16: lang, topic, country codes (-1 = none)
+#     rows.jsonl      one JSON row per chunk (text, section, sent_starts, lex, doc_id, source_uri, ...)
+#     offsets.npy     count + 1 uint64 byte offsets into rows.jsonl; only the k hits are read
+#     hnsw.bin        optional hnswlib graph (export --hnsw); brute force is used without it
+
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "data/local_index")
+LOCAL_BLOCK_ROWS = int(os.getenv("LOCAL_BLOCK_ROWS", "65536"))   # rows per matmul: bounds temporaries
+HNSW_EF = int(os.getenv("LOCAL_HNSW_EF", "128"))
+HNSW_OVERFETCH = int(os.getenv("LOCAL_HNSW_OVERFETCH", "8"))       # filters are applied after the graph search
+
+FORMAT = 1
+
+class LocalIndex:
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "manifest.json"), "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.dim = int(self.manifest["dim"])
+        self.count = int(self.manifest["count"])
+        self.vecs = (np.memmap(os.path.join(path, "vectors.f32"), dtype=np.float32, mode="r", shape=(self.count, self.dim))
+                     if self.count else np.zeros((0, self.dim), np.float32))
+        self.codes = np.load(os.path.join(path, "codes.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        self._fd = os.open(os.path.join(path, "rows.jsonl"), os.O_RDONLY)
+        self.code = {col: {v: i for i, v in enumerate(self.manifest[col])} for col in ("langs", "topics", "countries")}
+        self.hnsw = self._load_hnsw()
+
+    def _load_hnsw(self):
+        p = os.path.join(self.path, "hnsw.bin")
+        if not os.path.exists(p):
+            return None
+        try:
+            import hnswlib
+        except ImportError:
+            return None
+        idx = hnswlib.Index(space="ip", dim=self.dim)
+        idx.load_index(p, max_elements=self.count)
+        idx.set_ef(HNSW_EF)
+        return idx
+
+    def close(self):
+        try:
+            os.close(self._fd)
+        except OSError:
+            pass
+
+    __del__ = close     # replaced indexes are dropped once no search holds them
+
+    def _mask(self, langs: List[str], topic: Optional[str], country: Optional[str]) -> Optional[np.ndarray]:
+        # None = no row can match; an all-True mask is returned as-is so contiguous blocks can be sliced
+        ids = [self.code["langs"][l] for l in langs if l in self.code["langs"]]
+        if not ids:
+            return None
+        m = np.isin(self.codes[:, 0], ids)
+        for col, val, name in ((1, topic, "topics"), (2, country, "countries")):
+            if val:
+                c = self.code[name].get(val)
+                if c is None:
+                    return None
+                m &= self.codes[:, col] == c
+        return m
+
+    def _brute(self, q: np.ndarray, k: int, m: np.ndarray):
+        best_i = np.empty(0, np.int64)
+        best_s = np.empty(0, np.float32)
+        dense = bool(m.all())
+        sel_all = None if dense else np.flatnonzero(m)
+        n = self.count if dense else sel_all.size
+        for start in range(0, n, LOCAL_BLOCK_ROWS):
+            if dense:
+                ids = np.arange(start, min(start + LOCAL_BLOCK_ROWS, n))
+                scores = self.vecs[start:start + LOCAL_BLOCK_ROWS] @ q
+            else:
+                ids = sel_all[start:start + LOCAL_BLOCK_ROWS]
+                scores = self.vecs[ids] @ q
+            if scores.size > k:
+                top = np.argpartition(-scores, k - 1)[:k]
+                ids, scores = ids[top], scores[top]
+            best_i = np.concatenate([best_i, ids])
+            best_s = np.concatenate([best_s, scores])
+            if best_s.size > k:
+                top = np.argpartition(-best_s, k - 1)[:k]
+                best_i, best_s = best_i[top], best_s[top]
+        order = np.argsort(-best_s, kind="stable")
+        return best_i[order], best_s[order]
+
+    def _graph(self, q: np.ndarray, k: int, m: np.ndarray):
+        labels, dists = self.hnsw.knn_query(q, k=min(self.count, k * HNSW_OVERFETCH))
+        ids, scores = labels[0].astype(np.int64), 1.0 - dists[0]    # ip space returns 1 - dot
+        keep = m[ids]
+        return ids[keep][:k], scores[keep][:k]
+
+    def search(self, query_vec, *, k: int, langs: List[str], topic: Optional[str] = None,
+               country: Optional[str] = None) -> List[Dict]:
+        if not self.count or k <= 0:
+            return []
+        q = np.asarray(query_vec, dtype=np.float32)
+        if q.shape != (self.dim,):
+            raise ValueError(f"query dim {q.shape} != index dim {self.dim}")
+        q = q / (np.linalg.norm(q) or 1.0)
+        m = self._mask(langs, topic, country)
+        if m is None:
+            return []
+        ids, scores = self._graph(q, k, m) if self.hnsw is not None else (None, None)
+        if ids is None or len(ids) < min(k, int(m.sum())):
+            ids, scores = self._brute(q, k, m)
+        return [{**self.row(int(i)), "score": float(s)} for i, s in zip(ids, scores)]
+
+    def row(self, i: int) -> Dict:
+        a, b = int(self.offsets[i]), int(self.offsets[i + 1])
+        return json.loads(os.pread(self._fd, b - a, a))
+
+class LocalBackend(RetrievalBackend):
+    name = "local"
+
+    def __init__(self, root: str = LOCAL_INDEX_DIR):
+        self.root = root
+        self._open: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def index(self, index_name: str) -> LocalIndex:
+        # Re-opened when an export replaces the directory (manifest mtime changes); one stat per query.
+        # The export swap leaves a moment with no directory at all: an index already open keeps serving.
+        path = os.path.join(self.root, index_name)
+        cur = self._open.get(index_name)
+        try:
+            mtime = os.stat(os.path.join(path, "manifest.json")).st_mtime_ns
+        except FileNotFoundError:
+            if cur:
+                return cur[1]
+            raise FileNotFoundError(f"no local index {index_name!r} under {self.root}; run scripts/export_local_index.py")
+        if cur and cur[0] == mtime:
+            return cur[1]
+        with self._lock:
+            cur = self._open.get(index_name)
+            if not cur or cur[0] != mtime:
+                t0 = time.perf_counter()
+                try:
+                    idx = LocalIndex(path)
+                except FileNotFoundError:
+                    if cur:
+                        return cur[1]
+                    raise
+                self._open[index_name] = (mtime, idx)
+                log.info("local_index_opened name=%s rows=%d hnsw=%s ms=%.1f", index_name, idx.count,
+                         idx.hnsw is not None, (time.perf_counter() - t0) * 1000)
+            return self._open[index_name][1]
+
+    def search(self, query_vec, *, k, lang_filter, index_name, topic=None, country=None, probes=None, timeout_ms=None):
+        langs = list(lang_filter) or ["es", "en"]
+        return self.index(index_name).search(query_vec, k=int(k), langs=langs, topic=topic, country=country)
+
+# --- Export (Postgres -> files) ---
+
+_EXPORT_SQL = """
+SELECT c.embedding::real[] AS emb, c.text, c.section, c.sent_starts, c.lex, CAST(c.doc_id AS TEXT) AS doc_id,
+       d.source_uri, c.lang, c.topic, c.country, d.published_at
+FROM chunks c
+JOIN documents d ON d.id = c.doc_id
+WHERE c.is_current AND c.index_name = :idx AND NOT d.deleted
+ORDER BY c.doc_id, c.chunk_index
+"""
+
+def _code(table: Dict[str, int], val) -> int:
+    if val is None:
+        return -1
+    return table.setdefault(val, len(table))
+
+def export(index_name: str, root: str = LOCAL_INDEX_DIR, batch: int = 2000, hnsw: bool = False) -> Dict:
+    """Write the current chunks of `index_name` to <root>/<index_name>, replacing any previous export."""
+    from sqlalchemy import text
+    from api.core.db import engine
+    final = os.path.join(root, index_name)
+    tmp = f"{final}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    t0 = time.time()
+    tables = {"langs": {}, "topics": {}, "countries": {}}
+    codes: List[tuple] = []
+    offsets = [0]
+    dim, count = None, 0
+    with open(os.path.join(tmp, "vectors.f32"), "wb") as fv, open(os.path.join(tmp, "rows.jsonl"), "wb") as fr, \
+            engine.connect().execution_options(stream_results=True, yield_per=batch) as conn:
+        for part in conn.execute(text(_EXPORT_SQL), {"idx": index_name}).mappings().partitions():
+            vecs = np.asarray([r["emb"] for r in part], dtype=np.float32)
+            dim = dim or vecs.shape[1]
+            vecs /= np.maximum(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12)
+            vecs.tofile(fv)
+            for r in part:
+                codes.append((_code(tables["langs"], r["lang"]), _code(tables["topics"], r["topic"]),
+                              _code(tables["countries"], r["country"])))
+                row = {k: r[k] for k in ("text", "section", "sent_starts", "lex", "doc_id", "source_uri", "lang")}
+                row["published_at"] = r["published_at"].isoformat() if r["published_at"] else None
+                line = (json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8")
+                fr.write(line)
+                offsets.append(offsets[-1] + len(line))
+            count += len(part)
+    dim = dim or 1536
+    np.save(os.path.join(tmp, "codes.npy"), np.asarray(codes, dtype=np.int16).reshape(-1, 3))
+    np.save(os.path.join(tmp, "offsets.npy"), np.asarray(offsets, dtype=np.uint64))
+    if hnsw and count:
+        import hnswlib
+        g = hnswlib.Index(space="ip", dim=dim)
+        g.init_index(max_elements=count, ef_construction=200, M=16)
+        g.add_items(np.memmap(os.path.join(tmp, "vectors.f32"), dtype=np.float32, mode="r", shape=(count, dim)))
+        g.save_index(os.path.join(tmp, "hnsw.bin"))
+    manifest = {"format": FORMAT, "index_name": index_name, "dim": dim, "count": count, "created_at": time.time(),
+                **{name: sorted(t, key=t.get) for name, t in tables.items()}}
+    # manifest last: a reader never sees a manifest without its files
+    with open(os.path.join(tmp, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    # Swap directories; workers holding the old mmaps keep reading the unlinked files until they re-open
+    old = f"{final}.old-{os.getpid()}"
+    if os.path.exists(final):
+        os.replace(final, old)
+    os.replace(tmp, final)
+    shutil.rmtree(old, ignore_errors=True)
+    out = {"index_name": index_name, "rows": count, "dim": dim, "path": final, "secs": round(time.time() - t0, 2)}
+    log.info("local_index_exported %s", out)
+    return out
@@ -0,0 +1,40 @@
+from typing import Dict, Optional
+from api.core.db import engine
+from api.rag.chunk import make_chunks
+from api.rag.embed import embed_texts
+from api.rag.lexical import features
+from api.rag.retrieve import _to_pgvector_literal
+from api.rag.store import upsert_document, insert_chunks
+
+class NoChunks(ValueError):
+    pass
+
+async def ingest_text(
+    text: str,
+    *,
+    source_uri: str,
+    source_type: str,
+    lang: str,
+    topic: Optional[str] = None,
+    country: Optional[str] = None,
+    section: Optional[str] = None,
+    index_name: str = "default",
+    max_tokens: int = 600,
+    overlap: int = 60,
+    embedding_model: Optional[str] = None,
+) -> Dict:
+    # chunk -> embed -> store; shared by /ingest/url, /ingest/raw and the crawler
+    chunks = make_chunks(text, max_tokens=max_tokens, overlap=overlap)
+    if not chunks:
+        raise NoChunks(len(text or ""))
+
+    embeds = await embed_texts([c for c, _, _ in chunks], model=embedding_model)
+    # Vector literal works whether or not the pgvector adapter registered
+    payload = [(c, t, _to_pgvector_literal(e), section, starts, features(c, starts))
+               for (c, t, starts), e in zip(chunks, embeds)]
+
+    with engine.begin() as conn:
+        doc_id = upsert_document(conn, source_uri, source_type, lang, country, topic,
+                                 index_name=index_name, content=text)
+        insert_chunks(conn, doc_id, payload, index_name=index_name)
+    return {"doc_id": str(doc_id), "chunks": len(chunks), "index_name": index_name}
@@ -0,0 +1,142 @@
+import os, logging, time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import text
+from api.core.db import engine
+from api.rag.chunk import make_chunks
+from api.rag.embed import embed_texts
+from api.rag.lexical import features
+from api.rag.gc import retire_chunks
+from api.rag.store import ACTIVE_ALIAS, upsert_document, bulk_insert_chunks, set_active_index
+
+log = logging.getLogger("api.reindex")
+
+REINDEX_WORKERS = int(os.getenv("REINDEX_WORKERS") or (os.cpu_count() or 2))
+DOC_BATCH = int(os.getenv("REINDEX_DOC_BATCH", "32"))
+
+# Latest approved version of each page in the source variant
+SQL_SOURCE_DOCS = """
+SELECT DISTINCT ON (source_uri)
+  id, source_uri, source_type, lang, country, topic, version, published_at, approved, content,
+  (SELECT c.section FROM chunks c WHERE c.doc_id = documents.id LIMIT 1) AS section
+FROM documents
+WHERE index_name = :src AND approved = TRUE AND deleted = FALSE
+ORDER BY source_uri, version DESC, fetched_at DESC
+"""
+
+def _chunk_job(job: Tuple[str, int, int]) -> List[Tuple[str, int, List[int], Dict]]:
+    # Lexical features are built here too, so the parent only embeds and writes
+    content, max_tokens, overlap = job
+    return [(c, t, starts, features(c, starts)) for c, t, starts in make_chunks(content, max_tokens=max_tokens, overlap=overlap)]
+
+def load_source_docs(src: str) -> List[Dict]:
+    with engine.connect() as conn:
+        rows = conn.execute(text(SQL_SOURCE_DOCS), {"src": src}).mappings().all()
+    return [dict(r) for r in rows]
+
+async def backfill_content(docs: List[Dict]) -> int:
+    # One-time network pass for rows ingested before documents.content existed
+    from api.rag.fetch import fetch_text
+    filled = 0
+    for d in docs:
+        if d.get("content") or d.get("source_type") != "url":
+            continue
+        try:
+            d["content"] = await fetch_text(d["source_uri"])
+        except Exception as e:
+            log.warning("backfill_failed uri=%s err=%s", d["source_uri"], type(e).__name__)
+            continue
+        with engine.begin() as conn:
+            conn.execute(text("UPDATE documents SET content = :c WHERE id = :i"),
+                         {"c": d["content"], "i": str(d["id"])})
+        filled += 1
+    return filled
+
+def clear_index(index_name: str) -> int:
+    # Soft delete: chunks are retired and background GC removes the rows, both in small batches
+    # instead of one huge UPDATE or cascade
+    with engine.begin() as conn:
+        ids = conn.execute(text("""
+            UPDATE documents SET deleted = TRUE, deleted_at = now()
+            WHERE index_name = :n AND NOT deleted
+            RETURNING id
+        """), {"n": index_name}).scalars().all()
+    retire_chunks([str(i) for i in ids])
+    return len(ids)
+
+def served_index() -> str:
+    # The alias row itself, not active_index_name()'s per-process cache: a stale answer would clear the live index
+    with engine.connect() as conn:
+        name = conn.execute(text("SELECT index_name FROM index_aliases WHERE alias = :a"),
+                            {"a": ACTIVE_ALIAS}).scalar_one_or_none()
+    return name or os.getenv("DEFAULT_INDEX_NAME", "c300o45")
+
+async def reindex_variant(
+    target: str,
+    *,
+    source: str,
+    max_tokens: int = 600,
+    overlap: int = 60,
+    embedding_model: Optional[str] = None,
+    workers: Optional[int] = None,
+    doc_batch: int = DOC_BATCH,
+    activate: bool = False,
+    backfill_missing: bool = False,
+) -> Dict:
+    """
+    Rechunk + re-embed the stored text of `source` into `target`.
+    Chunking runs in a process pool ahead of embedding; each doc batch is written in one transaction.
+    """
+    if target == source:
+        raise ValueError("target index must differ from source; build a new variant and activate it")
+    if target == served_index():
+        raise ValueError(f"{target} is the active index; build a new variant and activate it")
+    t0 = time.time()
+    docs = load_source_docs(source)
+    if backfill_missing:
+        await backfill_content(docs)
+    missing = [d["source_uri"] for d in docs if not d.get("content")]
+    docs = [d for d in docs if d.get("content")]
+    log.info("reindex start src=%s dst=%s docs=%d missing_text=%d", source, target, len(docs), len(missing))
+
+    cleared = clear_index(target)
+    n_chunks = 0
+    jobs = [(d["content"], max_tokens, overlap) for d in docs]
+    with ProcessPoolExecutor(max_workers=workers or REINDEX_WORKERS) as pool:
+        # map() submits everything up front, so workers keep chunking while we embed/write
+        chunked = pool.map(_chunk_job, jobs, chunksize=4)
+        for i in range(0, len(docs), doc_batch):
+            group = docs[i:i + doc_batch]
+            group_chunks = [next(chunked) for _ in group]
+            texts = [c for chunks in group_chunks for c, _, _, _ in chunks]
+            vecs = await embed_texts(texts, model=embedding_model) if texts else []
+            rows, v = [], 0
+            with engine.begin() as conn:
+                for d, chunks in zip(group, group_chunks):
+                    if not chunks:
+                        continue
+                    doc_id = upsert_document(
+                        conn, d["source_uri"], d["source_type"], d["lang"],
+                        d["country"], d["topic"], version=d["version"] or 1,
+                        published_at=d["published_at"], index_name=target,
+                        approved=d["approved"], content=d["content"],
+                    )
+                    for idx, (c, tokens, starts, lex) in enumerate(chunks):
+                        rows.append((doc_id, idx, c, tokens, vecs[v], d["section"], target, starts, lex))
+                        v += 1
+                n_chunks += bulk_insert_chunks(conn, rows)
+            log.info("reindex batch dst=%s docs=%d/%d chunks=%d", target, min(i + doc_batch, len(docs)), len(docs), n_chunks)
+
+    if activate:
+        with engine.begin() as conn:
+            set_active_index(conn, target)
+    return {
+        "source": source,
+        "index_name": target,
+        "docs": len(docs),
+        "chunks": n_chunks,
+        "replaced_docs": cleared,
+        "missing_text": missing,
+        "activated": activate,
+        "seconds": round(time.time() - t0, 2),
+    }
@@ -20,6 +20,11 @@ def _maybe_load():
         _RERANK_AVAIL = False
     return _RERANK_AVAIL
 
+def preload():
+    # Before fork under gunicorn: the weights are loaded once and shared copy-on-write by the workers
+    if os.getenv("RERANK_ENABLED", "0") in ("1", "true", "True") and _maybe_load():
+        _model.eval()
+
 def rerank(query: str, items: List[Mapping[str, Any]], top_k: int = 5):
     # Fast no-op if disabled or unavailable
     if not os.getenv("RERANK_ENABLED", "0") in ("1", "true", "True"):
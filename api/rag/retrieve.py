@@ -1,9 +1,15 @@
-import re
+import os, re
 from sqlalchemy import text, bindparam
 from api.core.db import engine
-from typing import List, Dict, Iterable, Optional, Any
+from api.core.sqlstats import label
+from api.core.deadline import Deadline, DEADLINE_RERANK_MIN_MS, SQL_TIMEOUT_MS, count_fallback
+from api.core.tracing import span
+from api.rag.lexical import query_terms, row_terms, uri_terms
+from typing import List, Dict, Iterable, Mapping, Optional, Any, Tuple
 from sqlalchemy.dialects.postgresql import TEXT
-from pgvector.sqlalchemy import Vector
+
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "pgvector")   # pgvector | local (see api/rag/local_index.py)
+IVFFLAT_PROBES = int(os.getenv("IVFFLAT_PROBES", "0"))           # lists scanned per search; 0 = server setting (1)
 
 _WORD = re.compile(r"\w+", re.UNICODE)
 
@@ -54,38 +60,191 @@ def dedup_by_uri(rows):
         deduped.append(r)
     return deduped
 
+# Top-k over current chunks only (partial ivfflat index), then join documents for just those k rows
 SQL_TXT = """
 SELECT
   c.text,
   c.section,
+  c.sent_starts,
+  c.lex,
+  c.doc_id,
+  d.source_uri,
+  c.lang,
+  d.published_at,
+  1 - c.dist AS score
+FROM (
+  SELECT text, section, sent_starts, lex, doc_id, lang, embedding <=> :qvec AS dist
+  FROM chunks
+  WHERE is_current
+    AND index_name = :index_name
+    AND lang IN :langs
+    -- optional topic/country gates, only apply if provided
+    /*topic*/    /*country*/
+  ORDER BY embedding <=> :qvec
+  LIMIT :k
+) c
+JOIN documents d ON d.id = c.doc_id
+ORDER BY c.dist
+"""
+
+# Many query vectors, one statement: the same top-k per vector via LATERAL, rows tagged with the
+# vector's 1-based position. One round trip and one plan for a whole batch.
+SQL_MANY_TXT = """
+SELECT
+  q.ord,
+  c.text,
+  c.section,
+  c.sent_starts,
+  c.lex,
   c.doc_id,
   d.source_uri,
-  d.lang,
+  c.lang,
   d.published_at,
-  1 - (c.embedding <=> :qvec) AS score
-FROM chunks c
+  1 - c.dist AS score
+FROM unnest(CAST(:qvecs AS text[])) WITH ORDINALITY AS q(vec, ord)
+CROSS JOIN LATERAL (
+  SELECT text, section, sent_starts, lex, doc_id, lang, embedding <=> CAST(q.vec AS vector) AS dist
+  FROM chunks
+  WHERE is_current
+    AND index_name = :index_name
+    AND lang IN :langs
+    /*topic*/    /*country*/
+  ORDER BY embedding <=> CAST(q.vec AS vector)
+  LIMIT :k
+) c
 JOIN documents d ON d.id = c.doc_id
-WHERE d.approved = TRUE
-  AND c.index_name = :index_name
-  AND d.lang IN :langs
-  -- optional topic/country gates, only apply if provided
-  /*topic*/    /*country*/
-ORDER BY c.embedding <=> :qvec
-LIMIT :k
+ORDER BY q.ord, c.dist
 """
 
-def _apply_optional_filters(sql: text, topic: Optional[str] = None, country: Optional[str] = None) -> str:
-    s = SQL_TXT
+def _apply_optional_filters(sql: str, topic: Optional[str] = None, country: Optional[str] = None) -> str:
+    s = sql
     if topic:
-        s = s.replace("/*topic*/", "AND d.topic = :topic")
+        s = s.replace("/*topic*/", "AND topic = :topic")
     else:
         s = s.replace("/*topic*/", "")
     if country:
-        s = s.replace("/*country*/", "AND d.country = :country")
+        s = s.replace("/*country*/", "AND country = :country")
     else:
         s = s.replace("/*country*/", "")
     return s
 
+class RetrievalBackend:
+    """Top-k current chunks for a query vector. Rows: text, section, sent_starts, lex, doc_id,
+    source_uri, lang, published_at, score (cosine similarity), best first. `probes` is an ANN
+    recall/speed knob and `timeout_ms` a statement time limit; backends without them ignore them."""
+    name = "base"
+
+    def search(self, query_vec: list[float], *, k: int, lang_filter: Iterable[str], index_name: str,
+               topic: Optional[str] = None, country: Optional[str] = None, probes: Optional[int] = None,
+               timeout_ms: Optional[int] = None) -> list[dict]:
+        raise NotImplementedError
+
+    def search_many(self, query_vecs: list[list[float]], *, k: int, lang_filter: Iterable[str], index_name: str,
+                    topic: Optional[str] = None, country: Optional[str] = None,
+                    probes: Optional[int] = None, timeout_ms: Optional[int] = None) -> list[list[dict]]:
+        """One result list per query vector, in order. Backends that can share a round trip override this."""
+        return [self.search(v, k=k, lang_filter=lang_filter, index_name=index_name, topic=topic, country=country,
+                            probes=probes, timeout_ms=timeout_ms) for v in query_vecs]
+
+class PgVectorBackend(RetrievalBackend):
+    name = "pgvector"
+
+    def search(self, query_vec, *, k, lang_filter, index_name, topic=None, country=None, probes=None, timeout_ms=None):
+        from pgvector.sqlalchemy import Vector
+        langs = list(lang_filter) or ["es", "en"]
+
+        sql = text(_apply_optional_filters(SQL_TXT, topic, country)).bindparams(
+            bindparam("qvec", type_=Vector(1536)),
+            bindparam("langs", value=langs, expanding=True),
+            bindparam("index_name", type_=TEXT),
+            bindparam("k"),
+        )
+        if topic:
+            sql = sql.bindparams(bindparam("topic", type_=TEXT))
+        if country:
+            sql = sql.bindparams(bindparam("country", type_=TEXT))
+
+        params: Dict[str, Any] = {
+            "qvec": query_vec,
+            "index_name": index_name,
+            "k": int(k),
+        }
+        if topic:
+            params["topic"] = topic
+        if country:
+            params["country"] = country
+
+        with label("search_similar"):
+            return [dict(r) for r in self._run(sql, params, probes, timeout_ms)]
+
+    def search_many(self, query_vecs, *, k, lang_filter, index_name, topic=None, country=None, probes=None,
+                    timeout_ms=None):
+        if not query_vecs:
+            return []
+        langs = list(lang_filter) or ["es", "en"]
+        sql = text(_apply_optional_filters(SQL_MANY_TXT, topic, country)).bindparams(
+            bindparam("langs", value=langs, expanding=True),
+        )
+        params: Dict[str, Any] = {
+            # Full precision, as the single-query Vector bind sends: batched and single results stay identical
+            "qvecs": ["[" + ",".join(map(str, map(float, v))) + "]" for v in query_vecs],
+            "index_name": index_name,
+            "k": int(k),
+        }
+        if topic:
+            params["topic"] = topic
+        if country:
+            params["country"] = country
+        out: List[List[Dict]] = [[] for _ in query_vecs]
+        with label("search_many"):
+            rows = self._run(sql, params, probes, timeout_ms)
+        for r in rows:
+            row = dict(r)
+            out[row.pop("ord") - 1].append(row)
+        return out
+
+    def _run(self, sql, params: Dict[str, Any], probes: Optional[int], timeout_ms: Optional[int] = None):
+        probes = IVFFLAT_PROBES if probes is None else int(probes)
+        if not probes and timeout_ms is None:
+            with engine.connect() as conn:
+                return conn.execute(sql, params).mappings().all()
+        # SET LOCAL: scoped to this transaction, so the pooled connection goes back unchanged
+        with engine.begin() as conn:
+            if probes:
+                conn.exec_driver_sql(f"SET LOCAL ivfflat.probes = {probes:d}")
+            if timeout_ms is not None:
+                # 0 would mean "no limit" to Postgres; an exhausted budget still gets 1ms
+                conn.exec_driver_sql(f"SET LOCAL statement_timeout = {max(1, int(timeout_ms)):d}")
+            return conn.execute(sql, params).mappings().all()
+
+_backends: Dict[str, RetrievalBackend] = {}
+
+def get_backend(name: Optional[str] = None) -> RetrievalBackend:
+    name = name or RETRIEVAL_BACKEND
+    if name not in _backends:
+        if name == "pgvector":
+            _backends[name] = PgVectorBackend()
+        elif name == "local":
+            from api.rag.local_index import LocalBackend
+            _backends[name] = LocalBackend()
+        else:
+            raise ValueError(f"unknown RETRIEVAL_BACKEND {name!r}")
+    return _backends[name]
+
+def search_many(
+    query_vecs: list[list[float]],
+    *,
+    k: int,
+    lang_filter: Iterable[str],
+    index_name: str,
+    topic: Optional[str] = None,
+    country: Optional[str] = None,
+    probes: Optional[int] = None,
+    timeout_ms: Optional[int] = None,
+) -> list[list[dict]]:
+    return get_backend().search_many(query_vecs, k=k, lang_filter=lang_filter, index_name=index_name,
+                                     topic=topic, country=country, probes=probes, timeout_ms=timeout_ms)
+
 def search_similar(
     query_vec: list[float],
     *,
@@ -94,30 +253,73 @@ def search_similar(
     index_name: str,
     topic: Optional[str] = None,
     country: Optional[str] = None,
+    probes: Optional[int] = None,
+    timeout_ms: Optional[int] = None,
 ) -> list[dict]:
-    langs = list(lang_filter) or ["es", "en"]
-
-    sql = text(_apply_optional_filters(SQL_TXT, topic, country)).bindparams(
-        bindparam("qvec", type_=Vector(1536)),
-        bindparam("langs", value=langs, expanding=True),
-        bindparam("index_name", type_=TEXT),
-        bindparam("k"),
-    )
-    if topic:
-        sql = sql.bindparams(bindparam("topic", type_=TEXT))
-    if country:
-        sql = sql.bindparams(bindparam("country", type_=TEXT))
+    return get_backend().search(query_vec, k=k, lang_filter=lang_filter, index_name=index_name,
+                                topic=topic, country=country, probes=probes, timeout_ms=timeout_ms)
 
-    params: Dict[str, Any] = {
-        "qvec": query_vec,
-        "index_name": index_name,
-        "k": int(k),
-    }
-    if topic:
-        params["topic"] = topic
-    if country:
-        params["country"] = country
+# --- Query-time search and ranking (the /query routes and api/rag/evaluate.py) ---
+
+def _boost_by_uri_and_text(query: str, sims: list[dict]) -> list[dict]:
+    # Accent-folded term sets; chunk terms come precomputed from chunks.lex
+    q_terms = query_terms(query)
+    def bonus(s):
+        uri = s.get("source_uri") or s.get("uri") or ""
+        score = 2 * len(q_terms & uri_terms(uri))    # URL/title hit = strong
+        score += len(q_terms & row_terms(s))         # Body hit = weaker
+        # Keep the original distance score if present
+        base = float(s.get("score") or 0.0)
+        return (score, base)
+    return sorted(sims, key=bonus, reverse=True)
+
+def _as_text(x) -> str:
+    # Accept dict-like rows or ORM objects; fallback to snippet
+    if isinstance(x, Mapping):
+        t = x.get("text")
+        if isinstance(t, str) and t.strip():
+            return t
+        s = x.get("snippet")
+        return s if isinstance(s, str) else ""
+    # object with attributes
+    t = getattr(x, "text", None)
+    if isinstance(t, str) and t.strip():
+        return t
+    s = getattr(x, "snippet", "")
+    return s if isinstance(s, str) else ""
+
+def _sql_timeout(deadline: Optional[Deadline]) -> Optional[int]:
+    return deadline.timeout_ms(SQL_TIMEOUT_MS) if deadline is not None else None
+
+def _search(qvec, *, k: int, lang, topic: Optional[str], country: Optional[str], index_name: str,
+            deadline: Optional[Deadline] = None, probes: Optional[int] = None) -> list:
+    # Filtered search; if it finds nothing, once more without topic and with both languages.
+    # With a deadline each statement runs under statement_timeout = what is left (capped at SQL_TIMEOUT_MS).
+    with span("search"):
+        sims = search_similar(qvec, k=max(k, 8), lang_filter=tuple(lang or ("es", "en")), topic=topic,
+                              country=country, index_name=index_name, probes=probes, timeout_ms=_sql_timeout(deadline))
+    if not sims:
+        if deadline is not None and deadline.timeout() <= 0:
+            count_fallback("search_fallback")
+            return []
+        with span("search_fallback"):
+            sims = search_similar(qvec, k=max(k, 8), lang_filter=("es", "en"), topic=None, country=country,
+                                  index_name=index_name, probes=probes, timeout_ms=_sql_timeout(deadline))
+    return sims or []
 
-    with engine.connect() as conn:
-        rows = conn.execute(sql, params).mappings().all()
-        return [dict(r) for r in rows]
+def _rank(q: str, sims: list, *, k: int, use_reranker: bool, deadline: Optional[Deadline] = None) -> Tuple[list, bool]:
+    # (rows, cut): cut is True when a requested rerank did not run (deadline or reranker error)
+    with span("boost"):
+        sims = [s for s in (sims or []) if _as_text(s)]
+        sims = _boost_by_uri_and_text(q, sims)
+    if use_reranker and sims and deadline is not None and not deadline.allows(DEADLINE_RERANK_MIN_MS):
+        count_fallback("rerank")
+        return sims[:k], True
+    if use_reranker and sims:
+        try:
+            from api.rag.rerank import rerank
+            with span("rerank"):
+                return rerank(q, sims, top_k=k), False
+        except Exception:
+            return sims[:k], True
+    return sims[:k], False
@@ -1,6 +1,6 @@
 import json, re, os, unicodedata
+from functools import lru_cache
 from typing import List, Dict, Optional, Tuple
-from rapidfuzz import process, fuzz
 
 INJECTION = re.compile(r"ignore previous|system prompt|do anything now", re.I)
 
@@ -26,6 +26,8 @@ class FAQRouter:
                     qn = self._norm(obj.get("q",""))
                     if qn:
                         self.norm_to_idx[qn] = len(self.items) - 1
+        # Normalized questions for the fuzzy pass, computed once instead of per query
+        self.norm_q: List[str] = [self._norm(it.get("q", "")) for it in self.items]
 
     def _norm(self, s: str) -> str:
         s = _strip_accents(s or "").lower().strip()
@@ -53,11 +55,12 @@ class FAQRouter:
         for i, it in enumerate(self.items):
            if lang_pref and it.get("lang") not in lang_pref:
                continue
-           choices.append((i, self._norm(it.get("q", ""))))
+           choices.append((i, self.norm_q[i]))
         
         if not choices:
             return None
         
+        from rapidfuzz import process, fuzz
         idxs, texts = zip(*choices)
         best = process.extractOne(qn, texts, scorer=fuzz.token_sort_ratio)
         if best and best[1] >= 85:
@@ -69,5 +72,7 @@ class FAQRouter:
             }
         return None
 
+@lru_cache(maxsize=4)
 def load_faq(path: Optional[str]) -> FAQRouter:
+    # Cached per path: preloaded in the gunicorn master, reused by each worker's lifespan
     return FAQRouter(path)
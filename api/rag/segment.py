@@ -0,0 +1,93 @@
+import re
+from typing import List, Mapping, Optional, Sequence, Tuple
+
+# ES/EN sentence segmenter. One compiled pass finds candidate boundaries (terminal punctuation,
+# optional closing quotes/brackets, whitespace); a few cheap checks on the word before the period
+# reject abbreviations and initials. Decimals ("3.5", "1.000") never match: no whitespace after the dot.
+
+_BOUNDARY = re.compile(r"([.!?…]+)([\"'”’»)\]]*)(\s+)")
+_LAST_WORD = re.compile(r"(\w+)$")
+
+# Never end a sentence (lowercased, no trailing dot)
+_ABBREV = frozenset("""
+sr sra sres srta dr dra drs lic licda ing arq prof profa ud uds vd vds sto sta mons
+av avda dpto depto col fracc ee gob cía aprox tel ej
+mr mrs ms st gen gov sen rep rev hon mt ft vs approx dept est jan feb mar apr jun jul aug sep sept oct nov dec
+e g i
+""".split())
+# Abbreviations only when a number follows: "No. 5", "art. 14", "pág. 3"
+_NUM_ABBREV = frozenset("no nº núm num art arts pág págs pag p pp fig cap vol sec inc".split())
+# Abbreviations that may also close a sentence: split only if the next word is capitalized
+_FINAL_OK = frozenset("etc uu eeuu inc ltd co corp jr sa cv".split())
+
+Span = Tuple[int, int]
+
+def _is_boundary(text: str, m: re.Match) -> bool:
+    nxt = text[m.end():m.end() + 1]
+    if not nxt:
+        return False
+    if nxt.islower():
+        return False
+    if m.group(1) != ".":
+        return True
+    w = _LAST_WORD.search(text, 0, m.start())
+    if not w:
+        return True
+    word = w.group(1)
+    low = word.lower()
+    if len(word) == 1 and word.isalpha() and word.isupper():
+        return False                        # initial: "J. Pérez", "U. S."
+    if low in _ABBREV:
+        return False
+    if low in _NUM_ABBREV:
+        return not nxt.isdigit()
+    if low in _FINAL_OK:
+        return nxt.isupper() or nxt in "¿¡\"'“«("
+    return True
+
+def sentence_spans(text: str) -> List[Span]:
+    """(start, end) offsets of each sentence; whitespace between sentences is excluded."""
+    text = text or ""
+    spans, start = [], 0
+    for m in _BOUNDARY.finditer(text):
+        if _is_boundary(text, m):
+            spans.append((start, m.end(2)))
+            start = m.end()
+    if text[start:].strip():
+        spans.append((start, len(text.rstrip())))
+    # Leading whitespace of the first sentence
+    if spans:
+        s0, e0 = spans[0]
+        spans[0] = (s0 + len(text[s0:e0]) - len(text[s0:e0].lstrip()), e0)
+    return [(s, e) for s, e in spans if e > s]
+
+def sentence_starts(text: str) -> List[int]:
+    # Compact form stored with each chunk (chunks.sent_starts)
+    return [s for s, _ in sentence_spans(text)]
+
+def split(text: str) -> List[str]:
+    return [text[s:e] for s, e in sentence_spans(text)]
+
+def from_starts(text: str, starts: Sequence[int]) -> List[str]:
+    out = []
+    bounds = list(starts) + [len(text)]
+    for a, b in zip(bounds, bounds[1:]):
+        s = text[a:b].strip()
+        if s:
+            out.append(s)
+    return out
+
+def row_sentences(row) -> List[str]:
+    """Sentences of a retrieved chunk: stored offsets when present, else segment on the fly."""
+    if isinstance(row, str):
+        return split(row)
+    if isinstance(row, Mapping):
+        text, starts, snippet = row.get("text"), row.get("sent_starts"), row.get("snippet")
+    else:
+        text, starts, snippet = getattr(row, "text", None), getattr(row, "sent_starts", None), getattr(row, "snippet", None)
+    if isinstance(text, str) and text.strip():
+        # Offsets are only trusted if they still fit the text they were computed for
+        if starts and starts[-1] < len(text):
+            return from_starts(text, starts)
+        return split(text)
+    return split(snippet) if isinstance(snippet, str) else []
@@ -0,0 +1,137 @@
+import os, time, logging, threading
+from typing import Any, Dict, Hashable, Optional, Sequence
+import numpy as np
+
+log = logging.getLogger("api.semcache")
+
+# Answer cache keyed by meaning: a query whose embedding is within SEMCACHE_THRESHOLD cosine of an
+# answered one (same partition: index, langs, filters, answer language, k) gets that answer back
+# without retrieval or generation. One float32 matrix per process, searched with a single matvec.
+# Entries expire after SEMCACHE_TTL_S, and all of them drop when the index_generation sequence moves
+# (migrations/013: any committed ingest, re-version or purge), checked every SEMCACHE_GEN_CHECK_S.
+
+SEMCACHE_ENABLED = os.getenv("SEMCACHE_ENABLED", "1") == "1"
+SEMCACHE_MAX = int(os.getenv("SEMCACHE_MAX", "5000"))
+SEMCACHE_THRESHOLD = float(os.getenv("SEMCACHE_THRESHOLD", "0.95"))
+SEMCACHE_TTL_S = float(os.getenv("SEMCACHE_TTL_S", "900"))
+SEMCACHE_GEN_CHECK_S = float(os.getenv("SEMCACHE_GEN_CHECK_S", "2"))
+
+class SemanticCache:
+    def __init__(self, dim: int = 1536, max_entries: int = SEMCACHE_MAX,
+                 threshold: float = SEMCACHE_THRESHOLD, ttl_s: float = SEMCACHE_TTL_S):
+        self.dim, self.max, self.threshold, self.ttl_s = dim, max_entries, threshold, ttl_s
+        self._vecs = np.zeros((max_entries, dim), dtype=np.float32)
+        self._part = np.full(max_entries, -1, dtype=np.int32)       # -1 = free slot
+        self._born = np.zeros(max_entries, dtype=np.float64)
+        self._used = np.zeros(max_entries, dtype=np.float64)        # LRU clock
+        self._vals: list = [None] * max_entries
+        self._parts: Dict[Hashable, int] = {}
+        self._next_pid = 0
+        self._lock = threading.Lock()
+        self.generation: Optional[int] = None
+        self._gen_checked = 0.0
+
+    def __len__(self):
+        return int((self._part >= 0).sum())
+
+    def _unit(self, vec: Sequence[float]) -> Optional[np.ndarray]:
+        q = np.asarray(vec, dtype=np.float32)
+        if q.shape != (self.dim,):
+            return None
+        n = float(np.linalg.norm(q))
+        return q / n if n else None
+
+    def get(self, partition: Hashable, vec: Sequence[float]) -> Optional[Any]:
+        q = self._unit(vec)
+        pid = self._parts.get(partition)
+        if q is None or pid is None:
+            return None
+        now = time.time()
+        with self._lock:
+            live = (self._part == pid) & (now - self._born < self.ttl_s)
+            idx = np.flatnonzero(live)
+            if not idx.size:
+                return None
+            sims = self._vecs[idx] @ q
+            best = int(np.argmax(sims))
+            if sims[best] < self.threshold:
+                return None
+            slot = int(idx[best])
+            self._used[slot] = now
+            return self._vals[slot]
+
+    def put(self, partition: Hashable, vec: Sequence[float], value: Any):
+        q = self._unit(vec)
+        if q is None:
+            return
+        now = time.time()
+        with self._lock:
+            pid = self._parts.get(partition)
+            if pid is None:
+                if len(self._parts) >= self.max:
+                    self._drop_empty_parts()
+                pid = self._parts[partition] = self._next_pid
+                self._next_pid += 1
+            free = np.flatnonzero((self._part < 0) | (now - self._born >= self.ttl_s))
+            # Free or expired slot first, else the least recently used one
+            slot = int(free[0]) if free.size else int(np.argmin(self._used))
+            self._vecs[slot] = q
+            self._part[slot] = pid
+            self._born[slot] = self._used[slot] = now
+            self._vals[slot] = value
+
+    def _drop_empty_parts(self):
+        # Partitions come from request filters (free-form lang_pref, country_hint): keep only those
+        # still holding a slot, so the map never outgrows the cache itself
+        live = set(np.unique(self._part[self._part >= 0]).tolist())
+        self._parts = {p: i for p, i in self._parts.items() if i in live}
+
+    def clear(self):
+        with self._lock:
+            self._part[:] = -1
+            self._vals = [None] * self.max
+            self._parts.clear()
+
+    def generation_due(self) -> bool:
+        return time.time() - self._gen_checked >= SEMCACHE_GEN_CHECK_S
+
+    def check_generation(self, read_generation) -> bool:
+        """Clear everything if the index changed since the last check; returns True if it did."""
+        self._gen_checked = time.time()
+        try:
+            gen = read_generation()
+        except Exception as e:
+            log.warning("semcache_generation_failed %s", type(e).__name__)
+            return False
+        changed = self.generation is not None and gen != self.generation
+        self.generation = gen
+        if changed:
+            self.clear()
+            log.info("semcache_invalidated generation=%s", gen)
+        return changed
+
+def index_generation() -> int:
+    from sqlalchemy import text
+    from api.core.db import engine
+    from api.core.sqlstats import label
+    with engine.connect() as conn, label("index_generation"):
+        return int(conn.execute(text("SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM index_generation")).scalar_one())
+
+_cache: Optional[SemanticCache] = None
+
+def get_cache() -> Optional[SemanticCache]:
+    global _cache
+    if _cache is None and SEMCACHE_ENABLED:
+        from api.rag.embed import EMBED_DIM
+        _cache = SemanticCache(dim=EMBED_DIM)
+    return _cache
+
+def count(hit: bool):
+    try:
+        from api.routers.metrics import CACHE_LOOKUPS, SEMCACHE_ENTRIES
+        if CACHE_LOOKUPS:
+            CACHE_LOOKUPS.labels(cache="semantic", result="hit" if hit else "miss").inc()
+        if SEMCACHE_ENTRIES and _cache is not None:
+            SEMCACHE_ENTRIES.set(len(_cache))
+    except Exception:
+        pass
@@ -0,0 +1,213 @@
+import os, io, json, time, uuid, logging
+from typing import Dict, Iterator, List, Optional
+from sqlalchemy import text
+from api.core.db import engine
+
+log = logging.getLogger("api.snapshot")
+
+# Index snapshots: the live (current, not deleted) documents and chunks of one index_name as Parquet,
+# embeddings included, so a new environment or a bad reindex is recovered with a bulk load instead of
+# refetching and re-embedding.
+#
+#   <dir>/manifest.json      index_name, counts, dim, embedding dtype, format
+#   <dir>/documents.parquet  document rows (content included, for later rechunking)
+#   <dir>/chunks.parquet     chunk rows; embedding = fixed_size_list<float32|float16>[dim]
+#
+# Import assigns fresh ids (safe next to the soft-deleted rows it may be replacing), loads with COPY
+# in one transaction and rebuilds the vector index afterwards. pyarrow is only needed here.
+
+FORMAT = 1
+DOC_COLS = ["id", "source_uri", "source_type", "lang", "country", "topic", "version", "approved",
+            "published_at", "fetched_at", "content"]
+CHUNK_COLS = ["doc_id", "chunk_index", "text", "tokens", "section", "sent_starts", "lex", "embedding"]
+
+class SnapshotError(RuntimeError):
+    pass
+
+def _pa():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise SnapshotError("snapshots need pyarrow (pip install -r requirements.dev.txt)") from e
+    return pa, pq
+
+def _schemas(dim: int, dtype: str):
+    pa, _ = _pa()
+    ts = pa.timestamp("us", tz="UTC")
+    docs = pa.schema([("id", pa.string()), ("source_uri", pa.string()), ("source_type", pa.string()),
+                      ("lang", pa.string()), ("country", pa.string()), ("topic", pa.string()),
+                      ("version", pa.int32()), ("approved", pa.bool_()), ("published_at", ts),
+                      ("fetched_at", ts), ("content", pa.large_string())])
+    chunks = pa.schema([("doc_id", pa.string()), ("chunk_index", pa.int32()), ("text", pa.string()),
+                        ("tokens", pa.int32()), ("section", pa.string()), ("sent_starts", pa.list_(pa.int32())),
+                        ("lex", pa.string()),
+                        ("embedding", pa.list_(pa.float16() if dtype == "float16" else pa.float32(), dim))])
+    return docs, chunks
+
+# --- Export ---
+
+_DOCS_SQL = f"""
+SELECT {", ".join("CAST(id AS TEXT) AS id" if c == "id" else c for c in DOC_COLS)}
+FROM documents
+WHERE index_name = :idx AND NOT deleted AND superseded_at IS NULL
+ORDER BY source_uri
+"""
+
+_CHUNKS_SQL = """
+SELECT CAST(c.doc_id AS TEXT) AS doc_id, c.chunk_index, c.text, c.tokens, c.section, c.sent_starts, c.lex,
+       c.embedding::real[] AS embedding
+FROM chunks c
+JOIN documents d ON d.id = c.doc_id
+WHERE c.is_current AND c.index_name = :idx AND NOT d.deleted
+ORDER BY c.doc_id, c.chunk_index
+"""
+
+def export(index_name: str, out_dir: str, dtype: str = "float32", batch: int = 5000) -> Dict:
+    """Write index_name to out_dir (created). float16 halves the file; cosine ranking is unaffected in practice."""
+    import numpy as np
+    pa, pq = _pa()
+    if dtype not in ("float32", "float16"):
+        raise SnapshotError(f"dtype must be float32 or float16, got {dtype!r}")
+    os.makedirs(out_dir, exist_ok=True)
+    t0 = time.time()
+    with engine.connect() as conn:
+        dim = conn.execute(text("""
+            SELECT vector_dims(embedding) FROM chunks WHERE index_name = :idx AND is_current LIMIT 1
+        """), {"idx": index_name}).scalar_one_or_none() or 1536
+    doc_schema, chunk_schema = _schemas(dim, dtype)
+    counts = {"documents": 0, "chunks": 0}
+    with engine.connect().execution_options(stream_results=True, yield_per=batch) as conn:
+        with pq.ParquetWriter(os.path.join(out_dir, "documents.parquet"), doc_schema, compression="zstd") as w:
+            for part in conn.execute(text(_DOCS_SQL), {"idx": index_name}).mappings().partitions():
+                w.write_table(pa.Table.from_pylist([dict(r) for r in part], schema=doc_schema))
+                counts["documents"] += len(part)
+    with engine.connect().execution_options(stream_results=True, yield_per=batch) as conn:
+        # Embeddings go in as one flat array per batch, not a Python list per row
+        with pq.ParquetWriter(os.path.join(out_dir, "chunks.parquet"), chunk_schema, compression="zstd") as w:
+            for part in conn.execute(text(_CHUNKS_SQL), {"idx": index_name}).mappings().partitions():
+                emb = np.asarray([r["embedding"] for r in part], dtype=dtype).reshape(-1)
+                cols = {c: [r[c] for r in part] for c in CHUNK_COLS if c not in ("embedding", "lex")}
+                cols["lex"] = [json.dumps(r["lex"], ensure_ascii=False, separators=(",", ":")) if r["lex"] is not None else None
+                               for r in part]
+                cols["embedding"] = pa.FixedSizeListArray.from_arrays(pa.array(emb), dim)
+                w.write_table(pa.Table.from_pydict(cols, schema=chunk_schema))
+                counts["chunks"] += len(part)
+    manifest = {"format": FORMAT, "index_name": index_name, "dim": dim, "dtype": dtype, **counts,
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}
+    with open(os.path.join(out_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    out = {**manifest, "path": out_dir, "secs": round(time.time() - t0, 2)}
+    log.info("snapshot_exported %s", out)
+    return out
+
+# --- Import ---
+
+_ESC = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+def _copy_val(v) -> str:
+    # COPY text format: tab-separated, \N for NULL, backslash escapes
+    if v is None:
+        return "\\N"
+    if isinstance(v, bool):
+        return "t" if v else "f"
+    if isinstance(v, (list, tuple)):
+        return "{" + ",".join(str(int(x)) for x in v) + "}"
+    if hasattr(v, "isoformat"):
+        return v.isoformat()
+    return str(v).translate(_ESC)
+
+def _copy(cur, table: str, cols: List[str], rows: Iterator[List]) -> int:
+    buf, n = io.StringIO(), 0
+    for r in rows:
+        buf.write("\t".join(_copy_val(v) for v in r))
+        buf.write("\n")
+        n += 1
+    buf.seek(0)
+    cur.copy_expert(f"COPY {table} ({', '.join(cols)}) FROM STDIN", buf)
+    return n
+
+def _vec_literals(emb) -> List[str]:
+    # fixed_size_list column -> "[x,y,...]" per row, formatted from one float32 matrix
+    import numpy as np
+    arr = np.asarray(emb.flatten().to_numpy(zero_copy_only=False), dtype=np.float32).reshape(len(emb), -1)
+    out = io.StringIO()
+    np.savetxt(out, arr, fmt="%.7g", delimiter=",")
+    return ["[" + line + "]" for line in out.getvalue().splitlines()]
+
+def read_manifest(snap_dir: str) -> Dict:
+    p = os.path.join(snap_dir, "manifest.json")
+    if not os.path.exists(p):
+        raise SnapshotError(f"{snap_dir} is not a snapshot (no manifest.json)")
+    with open(p, "r", encoding="utf-8") as f:
+        m = json.load(f)
+    if m.get("format") != FORMAT:
+        raise SnapshotError(f"unsupported snapshot format {m.get('format')!r}")
+    return m
+
+def import_snapshot(snap_dir: str, index_name: Optional[str] = None, replace: bool = False,
+                    activate: bool = False, reindex: bool = True, batch: int = 5000) -> Dict:
+    """Bulk-load a snapshot as index_name (default: the exported name). An existing live index is refused
+    unless replace=True, which soft-deletes it in the same transaction (GC removes it later)."""
+    from api.rag.gc import VECTOR_INDEX
+    from api.rag.store import set_active_index
+    _, pq = _pa()
+    m = read_manifest(snap_dir)
+    target = index_name or m["index_name"]
+    t0 = time.time()
+    ids: Dict[str, str] = {}
+    out = {"index_name": target, "source": m["index_name"], "documents": 0, "chunks": 0, "replaced": 0}
+    with engine.begin() as conn:
+        live = conn.execute(text("SELECT count(*) FROM documents WHERE index_name = :idx AND NOT deleted"),
+                            {"idx": target}).scalar_one()
+        if live and not replace:
+            raise SnapshotError(f"index {target!r} has {live} live documents; pass replace=True (--replace)")
+        if live:
+            # Old chunks leave the searchable set at commit, together with the new ones arriving
+            out["replaced"] = conn.execute(text("""
+                UPDATE documents SET deleted = TRUE, deleted_at = now() WHERE index_name = :idx AND NOT deleted
+            """), {"idx": target}).rowcount or 0
+            conn.execute(text("UPDATE chunks SET is_current = FALSE WHERE index_name = :idx AND is_current"), {"idx": target})
+        cur = conn.connection.cursor()
+        try:
+            docs_meta: Dict[str, tuple] = {}
+            for rb in pq.ParquetFile(os.path.join(snap_dir, "documents.parquet")).iter_batches(batch_size=batch):
+                rows = []
+                for d in rb.to_pylist():
+                    new = str(uuid.uuid4())
+                    ids[d["id"]] = new
+                    docs_meta[new] = (d["lang"], d["topic"], d["country"], bool(d["approved"]))
+                    rows.append([new, *(d[c] for c in DOC_COLS[1:]), target])
+                out["documents"] += _copy(cur, "documents", DOC_COLS + ["index_name"], iter(rows))
+            cols = ["id", "doc_id", "chunk_index", "text", "tokens", "section", "sent_starts", "lex", "embedding",
+                    "index_name", "lang", "topic", "country", "is_current"]
+            for rb in pq.ParquetFile(os.path.join(snap_dir, "chunks.parquet")).iter_batches(batch_size=batch):
+                vecs = _vec_literals(rb.column("embedding"))
+                meta = rb.drop_columns(["embedding"]).to_pylist()
+
+                def rows():
+                    for c, vec in zip(meta, vecs):
+                        doc = ids.get(c["doc_id"])
+                        if doc is None:
+                            continue
+                        yield [str(uuid.uuid4()), doc, c["chunk_index"], c["text"], c["tokens"], c["section"],
+                               c["sent_starts"], c["lex"], vec, target, *docs_meta[doc]]
+                out["chunks"] += _copy(cur, "chunks", cols, rows())
+        finally:
+            cur.close()
+        if activate:
+            set_active_index(conn, target)
+    load_s = time.time() - t0
+    # Outside the load transaction: neither may run in one, and neither blocks readers
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql("ANALYZE documents")
+        conn.exec_driver_sql("ANALYZE chunks")
+        if reindex:
+            # ivfflat centroids were trained on the old contents; a bulk load this size needs new ones
+            t1 = time.time()
+            conn.exec_driver_sql(f"REINDEX INDEX CONCURRENTLY {VECTOR_INDEX}")
+            conn.execute(text("UPDATE gc_state SET deleted_since_reindex = 0, last_reindex_at = now() WHERE id = 1"))
+            out["reindex_s"] = round(time.time() - t1, 2)
+    out["load_s"] = round(load_s, 2)
+    log.info("snapshot_imported %s", out)
+    return out
@@ -1,22 +1,117 @@
-import uuid
+import os, time, uuid, json
 from sqlalchemy import text
 from api.core.db import engine
+from api.core.sqlstats import label, observe
 
+ACTIVE_ALIAS = "active"
+ACTIVE_TTL_S = float(os.getenv("ACTIVE_INDEX_TTL_S", "30"))
+VERSION_LOCK_NS = 7_236     # pg_advisory_xact_lock(ns, hashtext(page)): two-key space, apart from GC/migrate locks
+_active_cache = {"name": None, "ts": 0.0}
+
+def _json(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")) if obj is not None else None
+
+@label("upsert_document")
 def upsert_document(conn, source_uri, source_type, lang, country=None, topic=None,
-                    version=1, published_at=None, index_name="default", approved=True):
+                    version=None, published_at=None, index_name="default", approved=True, content=None):
+    """
+    Insert a new version of source_uri in index_name and, if it is approved, retire the chunks of older
+    versions. version=None means max(version)+1. Callers insert the new chunks in the same transaction,
+    so searches see either the old page or the new one. An unapproved version is not searchable, so the
+    current approved one stays in place rather than the page dropping out.
+    """
     doc_id = uuid.uuid4()
+    # Concurrent ingests of one page queue here until the first commits: otherwise both read the same
+    # MAX(version), and the second's retire_versions hides the first's chunks without superseding it
+    conn.execute(text("SELECT pg_advisory_xact_lock(:ns, hashtext(:uri || ' ' || :index_name))"),
+                 {"ns": VERSION_LOCK_NS, "uri": source_uri, "index_name": index_name})
     conn.execute(text("""
         INSERT INTO documents (id, source_uri, source_type, lang, country, topic,
-                               version, published_at, index_name, approved)
-        VALUES (:id,:uri,:stype,:lang,:country,:topic,:version,:published_at,:index_name,:approved)
+                               version, published_at, index_name, approved, content)
+        VALUES (:id,:uri,:stype,:lang,:country,:topic,
+                COALESCE(CAST(:version AS integer),
+                         (SELECT COALESCE(MAX(version), 0) + 1 FROM documents
+                          WHERE source_uri = :uri AND index_name = :index_name)),
+                :published_at,:index_name,:approved,:content)
     """), dict(id=str(doc_id), uri=source_uri, stype=source_type, lang=lang, country=country,
                topic=topic, version=version, published_at=published_at,
-               index_name=index_name, approved=approved))
+               index_name=index_name, approved=approved, content=content))
+    if approved:
+        retire_versions(conn, source_uri, index_name, keep=doc_id)
     return doc_id
 
+def retire_versions(conn, source_uri, index_name, keep=None) -> int:
+    # Drop older versions' chunks from the searchable set (partial index WHERE is_current);
+    # superseded_at starts their GC grace period (api/rag/gc.py)
+    conn.execute(text("""
+        UPDATE documents SET superseded_at = now()
+        WHERE source_uri = :uri AND index_name = :idx AND id <> CAST(:keep AS uuid) AND superseded_at IS NULL
+    """), {"uri": source_uri, "idx": index_name, "keep": str(keep) if keep else None})
+    res = conn.execute(text("""
+        UPDATE chunks SET is_current = FALSE
+        WHERE is_current AND index_name = :idx
+          AND doc_id IN (SELECT id FROM documents WHERE source_uri = :uri AND index_name = :idx
+                         AND id <> CAST(:keep AS uuid))
+    """), {"uri": source_uri, "idx": index_name, "keep": str(keep) if keep else None})
+    return res.rowcount or 0
+
 def insert_chunks(conn, doc_id, chunks_with_vecs, index_name="default"):
-    for idx, (text_chunk, tokens, vec, section) in enumerate(chunks_with_vecs):
-        conn.execute(text("""
-            INSERT INTO chunks (id, doc_id, chunk_index, text, tokens, embedding, section, index_name)
-            VALUES (:id, :doc_id, :idx, :text, :tokens, :embedding, :section, :index_name)
-        """), dict(id=str(uuid.uuid4()), doc_id=str(doc_id), idx=idx, text=text_chunk, tokens=tokens, embedding=vec, section=section, index_name=index_name))
+    # items: (text, tokens, vec, section, sent_starts, lex)
+    return bulk_insert_chunks(conn, [
+        (doc_id, idx, text_chunk, tokens, vec, section, index_name, starts, lex)
+        for idx, (text_chunk, tokens, vec, section, starts, lex) in enumerate(chunks_with_vecs)
+    ])
+
+def bulk_insert_chunks(conn, rows, page_size: int = 500):
+    # rows: (doc_id, chunk_index, text, tokens, vec, section, index_name, sent_starts, lex); one round-trip per page.
+    # Filter columns and is_current come from the parent document so search never joins before LIMIT.
+    from psycopg2.extras import execute_values
+    from api.rag.retrieve import _to_pgvector_literal
+    if not rows:
+        return 0
+    values = [
+        (str(uuid.uuid4()), str(doc_id), idx, txt, tokens, _to_pgvector_literal(vec), section, index_name,
+         list(starts) if starts is not None else None, _json(lex))
+        for doc_id, idx, txt, tokens, vec, section, index_name, starts, lex in rows
+    ]
+    # Raw cursor: SQLAlchemy's statement events never see this, so it is timed here
+    t0 = time.perf_counter()
+    cur = conn.connection.cursor()
+    try:
+        execute_values(cur, """
+            INSERT INTO chunks (id, doc_id, chunk_index, text, tokens, embedding, section, index_name, sent_starts, lex,
+                                lang, topic, country, is_current)
+            SELECT v.id, v.doc_id, v.idx, v.text, v.tokens, v.embedding, v.section, v.index_name, v.starts, v.lex,
+                   d.lang, d.topic, d.country, (d.approved AND NOT COALESCE(d.deleted, FALSE))
+            FROM (VALUES %s) AS v(id, doc_id, idx, text, tokens, embedding, section, index_name, starts, lex)
+            JOIN documents d ON d.id = v.doc_id
+        """, values, template="(%s::uuid, %s::uuid, %s::int, %s, %s::int, %s::vector, %s, %s, %s::integer[], %s::jsonb)",
+            page_size=page_size)
+    finally:
+        cur.close()
+        observe("insert_chunks", (time.perf_counter() - t0) * 1000)
+    return len(values)
+
+def active_index_name(default: str) -> str:
+    # Alias lookup is cached per process; a swap is visible everywhere within ACTIVE_TTL_S
+    now = time.time()
+    if _active_cache["name"] and now - _active_cache["ts"] < ACTIVE_TTL_S:
+        return _active_cache["name"]
+    name = None
+    try:
+        with engine.connect() as conn, label("active_index"):
+            name = conn.execute(text("SELECT index_name FROM index_aliases WHERE alias = :a"),
+                                {"a": ACTIVE_ALIAS}).scalar_one_or_none()
+    except Exception:
+        name = None
+    _active_cache.update(name=name or default, ts=now)
+    return _active_cache["name"]
+
+def set_active_index(conn, index_name: str):
+    # Single-row upsert: readers see either the old or the new variant, never a mix
+    conn.execute(text("""
+        INSERT INTO index_aliases (alias, index_name, updated_at)
+        VALUES (:a, :n, now())
+        ON CONFLICT (alias) DO UPDATE SET index_name = EXCLUDED.index_name, updated_at = now()
+    """), {"a": ACTIVE_ALIAS, "n": index_name})
+    _active_cache.update(name=index_name, ts=time.time())
@@ -1,12 +1,19 @@
-from fastapi import APIRouter
+import asyncio, time
+from typing import Literal, Optional
+from fastapi import APIRouter, Header, Query
+from fastapi.responses import JSONResponse, PlainTextResponse
 from sqlalchemy import text
+from api.core import admission, loadmon, profiler, sqlstats
+from api.core.sqlstats import label
 from api.core.db import engine
+from api.core.errors import json_error
 
-router = APIRouter(prefix="/debug", tags=["debug"])
+# Mounted at /debug by api.main
+router = APIRouter(tags=["debug"])
 
 @router.get("/counts")
 def counts():
-    with engine.connect() as conn:
+    with engine.connect() as conn, label("debug_counts"):
         docs = conn.execute(text("""
           SELECT index_name, topic, COUNT(*) AS n_docs
           FROM documents
@@ -15,9 +22,63 @@ def counts():
           ORDER BY 1,2
         """)).mappings().all()
         chunks = conn.execute(text("""
-          SELECT index_name, COUNT(*) AS n_chunks
+          SELECT index_name, COUNT(*) AS n_chunks, COUNT(*) FILTER (WHERE is_current) AS n_current
           FROM chunks
           GROUP BY 1
           ORDER BY 1
         """)).mappings().all()
     return {"docs": list(docs), "chunks": list(chunks)}
+
+@router.get("/load")
+def load():
+    """Last load-monitor sample for this worker (loop lag, thread pools, DB pool, in flight) and admission slots."""
+    return {"enabled": loadmon.LOADMON_ENABLED, "interval_s": loadmon.LOADMON_INTERVAL_S, **loadmon.snapshot(),
+            "admission": admission.stats()}
+
+@router.get("/slow-sql")
+def slow_sql(limit: int = Query(20, ge=1, le=500), plans: bool = True, x_debug_token: Optional[str] = Header(None)):
+    """Recent statements over SLOW_SQL_MS with their EXPLAIN plans and seq-scan / ANN findings."""
+    if not profiler.token_ok(x_debug_token):
+        return _denied()
+    return {"threshold_ms": sqlstats.SLOW_SQL_MS, "explain_every_s": sqlstats.SLOW_SQL_EXPLAIN_EVERY_S,
+            "samples": sqlstats.samples(limit, plans=plans)}
+
+def _denied():
+    if not profiler.DEBUG_TOKEN:
+        return json_error("disabled", "debug endpoints are off (set DEBUG_TOKEN)", status=404)
+    return json_error("forbidden", "missing or wrong X-Debug-Token", status=403)
+
+@router.get("/profile")
+async def profile(
+    seconds: float = Query(10, gt=0, le=profiler.PROFILE_MAX_S),
+    interval_ms: float = Query(profiler.PROFILE_INTERVAL_MS, ge=0.5, le=1000),
+    format: Literal["speedscope", "collapsed"] = "speedscope",
+    idle: bool = False,
+    x_debug_token: Optional[str] = Header(None),
+):
+    """Sample every thread of this worker for `seconds`; speedscope JSON or collapsed stacks."""
+    if not profiler.token_ok(x_debug_token):
+        return _denied()
+    # The sampler sleeps in a worker thread; the event loop keeps serving (and being sampled)
+    sampler = await asyncio.to_thread(profiler.profile_for, seconds, interval_ms, idle)
+    if sampler is None:
+        return json_error("busy", "a profile is already running in this worker", status=409)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    if format == "collapsed":
+        return PlainTextResponse(sampler.collapsed(), headers={
+            "Content-Disposition": f'attachment; filename="profile-{stamp}.folded"'})
+    return JSONResponse(sampler.speedscope(f"worker profile {stamp}"), headers={
+        "Content-Disposition": f'attachment; filename="profile-{stamp}.speedscope.json"'})
+
+@router.get("/profile/requests")
+def profiled_requests(request_id: Optional[str] = None, x_debug_token: Optional[str] = Header(None)):
+    """Recent per-request profiles (X-Profile header or PROFILE_SAMPLE_RATE); one in full with ?request_id=."""
+    if not profiler.token_ok(x_debug_token):
+        return _denied()
+    if request_id is None:
+        return {"profiles": profiler.recent()}
+    p = profiler.recent(request_id)
+    if p is None:
+        return json_error("not_found", "no profile kept for that request_id", status=404)
+    return JSONResponse(p["profile"], headers={
+        "Content-Disposition": f'attachment; filename="request-{request_id}.speedscope.json"'})
@@ -1,5 +1,8 @@
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
 from api.core.db import engine
+from api.core import startup
 import os, httpx, time
 
 router = APIRouter()
@@ -8,21 +11,32 @@ router = APIRouter()
 def live():
     return {"status": "ok"}
 
-@router.get("/ready")
-def ready():
+def _db_ping() -> str:
+    # cheap DB ping; don't crash on failure
     try:
         with engine.connect() as conn:
-            conn.execute("SELECT 1")
-        db = "ok"
+            conn.execute(text("SELECT 1"))
+        return "ok"
     except Exception:
-        db = "degraded"
-    return {"status": "ok", "db": db}
+        return "degraded"
+
+@router.get("/ready")
+def ready():
+    # 503 until the startup warm-up (migrations, tokenizer, SDK clients) has finished
+    if not startup.is_ready():
+        st = startup.status()
+        return JSONResponse(status_code=503, content={"status": st["status"], "error": st["error"]})
+    return {"status": "ok", "db": _db_ping()}
+
+@router.get("/startup")
+def startup_status():
+    return startup.status()
 
 @router.get("/routes")
 def routes():
     # lightweight registration check
     return {
-        "paths": ["/health/live", "/health/ready", "/health/dbdiag", "/health/routes"]
+        "paths": ["/health/live", "/health/ready", "/health/startup", "/health/dbdiag", "/health/routes"]
     }
 
 @router.get("/embeddings")
@@ -65,14 +79,3 @@ async def emb_probe(q: str = "hola"):
         "ok": bool(vecs and isinstance(vecs, list) and vecs[0] is not None), 
         "dim": len(vecs[0]) if vecs and vecs[0] is not None else 0
     }
-
-@router.get("/health/ready")
-def ready():
-    # cheap DB ping; don't crash on failure
-    try:
-        with engine.connect() as conn:
-            conn.execute("SELECT 1")
-        db = "ok"
-    except Exception:
-        db = "degraded"
-    return {"status": "ok", "db": db}
\ No newline at end of file
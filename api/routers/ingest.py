@@ -1,22 +1,15 @@
+import asyncio
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Optional
-from api.core.db import engine
-from api.rag.chunk import chunk_by_tokens, split_unicode
-from api.rag.embed import embed_texts
-from api.rag.fetch import fetch_text
-from api.rag.store import upsert_document, insert_chunks
-from api.rag.retrieve import _to_pgvector_literal
-from sqlalchemy import text as sqltext
+from api.rag.fetch import fetch_text, ALLOWED_DOMAINS
+from api.rag.extract import ExtractTimeout
+from api.rag.pipeline import ingest_text, NoChunks
+from api.rag.gc import purge as purge_docs, wake as wake_gc
 import httpx
 
 router = APIRouter()
 
-ALLOWED_DOMAINS = {
-    "es.wikipedia.org", "es.m.wikipedia.org", "www.cdc.gov", "www.usa.gov", 
-    "www.irs.gov", "www.uscis.gov", "www.vote.gov", "www.who.int"
-}
-
 class IngestURL(BaseModel):
     url: str
     lang: str = "es"
@@ -41,7 +34,9 @@ class IngestRaw(BaseModel):
     embedding_model: Optional[str] = None
     
 class PurgeIn(BaseModel):
-    url: str
+    url: Optional[str] = None
+    domain: Optional[str] = None        # e.g. "www.cdc.gov": every page on that host
+    index_name: Optional[str] = None    # default: all index variants
 
 
 @router.post("/url")
@@ -50,47 +45,34 @@ async def ingest_url(item: IngestURL):
         text = await fetch_text(item.url)
     except httpx.HTTPError as e:
         raise HTTPException(status_code=502, detail={"code":"fetch_failed","message":str(e)})
-    sentences = split_unicode(text)
-    chunks = [ct for ct in chunk_by_tokens(sentences, max_tokens=item.max_tokens, overlap=item.overlap) if ct[1] > 0]
-    if not chunks and len(text) >= 600:
-        chunks = [(text[:2000],  min(len(text[:2000].split()), item.max_tokens)) ]
-
-    if not chunks:
+    except ExtractTimeout as e:
+        raise HTTPException(status_code=504, detail={"code":"extract_timeout","message":str(e)})
+    try:
+        out = await ingest_text(
+            text, source_uri=item.url, source_type="url", lang=item.lang,
+            topic=item.topic, country=item.country, section=item.section,
+            index_name=item.index_name, max_tokens=item.max_tokens, overlap=item.overlap,
+            embedding_model=item.embedding_model,
+        )
+    except NoChunks:
         raise HTTPException(status_code=422, detail={"code":"no_chunks_made","len":len(text)})
 
-    embeds = await embed_texts([c for c,_ in chunks], model=item.embedding_model)
-
-    # If adapter is not active, cast embeddings to vector literal for insert
-    payload = [(c, t, _to_pgvector_literal(e), item.section) for (c,t), e in zip(chunks, embeds)]
-
-    # store
-    from sqlalchemy import text
-    with engine.begin() as conn:
-        doc_id = upsert_document(
-            conn, item.url, "url", item.lang,
-            item.country, item.topic,
-            index_name=item.index_name
-        )
-        payload = [(c, t, e, item.section) for (c, t), e in zip(chunks, embeds)]
-        insert_chunks(conn, doc_id, payload, index_name=item.index_name)
-    
     return {
-        "doc_id": str(doc_id), 
-        "chunks": len(chunks),
-        "index_name": item.index_name,
+        **out,
         "max_tokens": item.max_tokens,
         "overlap": item.overlap,
         "embedding_model": item.embedding_model or "default"
     }
 
 @router.post("/purge")
-def purge(p: PurgeIn):
-    with engine.begin() as conn:
-        row = conn.execute(sqltext("SELECT id FROM documents WHERE source_uri=:u"), {"u": p.url}).fetchone()
-        if not row:
-            return {"deleted": 0}
-        conn.execute(sqltext("DELETE FROM documents WHERE id=:i"), {"i": row[0]})
-        return {"deleted": 1}
+async def purge(p: PurgeIn):
+    # Soft delete retires the pages' chunks from search now; the rows are removed by the background GC
+    if bool(p.url) == bool(p.domain):
+        raise HTTPException(status_code=422, detail={"code":"bad_purge","message":"give exactly one of url or domain"})
+    n = await asyncio.to_thread(purge_docs, url=p.url, domain=p.domain, index_name=p.index_name)
+    if n:
+        wake_gc()
+    return {"deleted": n, "gc": "scheduled" if n else None}
     
 @router.get("/_fetch_debug")
 async def fetch_debug(url: str):
@@ -105,18 +87,12 @@ async def ingest_raw(item: IngestRaw):
     if not txt:
         raise HTTPException(status_code=400, detail="empty_text")
 
-    sentences = split_unicode(txt)
-    chunks = [ct for ct in chunk_by_tokens(sentences, max_tokens=item.max_tokens, overlap=item.overlap) if ct[1] > 0]
-    if not chunks:
+    try:
+        return await ingest_text(
+            txt, source_uri=item.source_uri, source_type="raw", lang=item.lang,
+            topic=item.topic, country=item.country, section=item.section,
+            index_name=item.index_name, max_tokens=item.max_tokens, overlap=item.overlap,
+            embedding_model=item.embedding_model,
+        )
+    except NoChunks:
         raise HTTPException(status_code=422, detail="no_chunks_made")
-
-    embeds = await embed_texts([c for c,_ in chunks], model=item.embedding_model)
-    payload = (
-        [(c, t, _to_pgvector_literal(e), item.section) for (c,t), e in zip(chunks, embeds)]
-    )
-
-    with engine.begin() as conn:
-        doc_id = upsert_document(conn, item.source_uri, "raw", item.lang, item.country, item.topic, index_name=item.index_name)
-        insert_chunks(conn, doc_id, payload, index_name=item.index_name)
-
-    return {"doc_id": str(doc_id), "chunks": len(chunks), "index_name": item.index_name}
@@ -1,9 +1,9 @@
 try:
-    from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+    from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
     HAVE_PROM = True
 except Exception:
     HAVE_PROM = False
-    Counter = Histogram = None
+    Counter = Gauge = Histogram = None
 
 from fastapi import APIRouter, Response
 
@@ -28,12 +28,120 @@ if HAVE_PROM:
         "rag_db_latency_ms", 
         "DB latency (ms)"
     )
+    FETCH_THROTTLED = Counter(
+        "rag_fetch_throttled_total",
+        "Upstream 429/503 responses during ingest fetches",
+        ["host"],
+    )
+    GC_DELETED = Counter(
+        "rag_gc_deleted_total",
+        "Rows removed by background garbage collection",
+        ["table"],
+    )
+    CACHE_LOOKUPS = Counter(
+        "rag_cache_lookups_total",
+        "Shared cache lookups",
+        ["cache", "result"],
+    )
+    SEMCACHE_ENTRIES = Gauge(
+        "rag_semcache_entries",
+        "Answers held in the in-process semantic cache",
+    )
+    COALESCED = Counter(
+        "rag_coalesced_total",
+        "Requests served by another request's in-flight computation",
+        ["scope"],
+    )
+    STAGE_LAT = Histogram(
+        "rag_stage_latency_ms",
+        "Per-stage latency inside a request (ms)",
+        ["stage", "route", "index"],
+        buckets=[1,5,10,25,50,100,250,500,1000,2500,5000],
+    )
+    HTTP_LAT = Histogram(
+        "rag_http_request_ms",
+        "End-to-end request duration as seen by the middleware (ms)",
+        ["route", "status"],
+        buckets=[5,25,100,250,500,1000,2000,3000,5000,8000],
+    )
+    INFLIGHT = Gauge(
+        "rag_inflight_requests",
+        "Requests currently inside the middleware (health probes and scrapes excluded)",
+    )
+    LOOP_LAG = Histogram(
+        "rag_event_loop_lag_ms",
+        "How late the load monitor's periodic wake-up ran (ms): time the loop was blocked",
+        buckets=[1,5,10,25,50,100,250,500,1000,2500],
+    )
+    THREADS = Gauge(
+        "rag_threadpool",
+        "Worker thread pools: busy/limit/waiting (anyio limiter) or threads/limit/waiting (asyncio executor)",
+        ["pool", "state"],
+    )
+    THREAD_WAIT = Histogram(
+        "rag_threadpool_wait_ms",
+        "Round trip of a no-op pushed through the pool (ms): queueing for a free thread",
+        ["pool"],
+        buckets=[0.5,1,5,10,25,50,100,250,500,1000],
+    )
+    DB_POOL = Gauge(
+        "rag_db_pool",
+        "SQLAlchemy pool: size, max_overflow, checked_out, idle, overflow",
+        ["state"],
+    )
+    DB_POOL_WAIT = Histogram(
+        "rag_db_pool_wait_ms",
+        "Connection checkout time (ms): queueing for a pooled connection, or opening a new one",
+        buckets=[0.5,1,5,10,25,50,100,250,500,1000,5000],
+    )
+    SQL_LAT = Histogram(
+        "rag_sql_latency_ms",
+        "Statement execution time by label (ms)",
+        ["statement"],
+        buckets=[1,5,10,25,50,100,250,500,1000,2500,5000],
+    )
+    SQL_SLOW = Counter(
+        "rag_sql_slow_total",
+        "Statements slower than SLOW_SQL_MS",
+        ["statement"],
+    )
+    SQL_PLAN_FLAGS = Counter(
+        "rag_sql_plan_regressions_total",
+        "Slow-statement plans with a seq scan on a large table or a sort on vector distance",
+        ["statement", "kind", "relation"],
+    )
+    ADMISSION = Counter(
+        "rag_admission_total",
+        "Admission decisions per route: admitted, degraded, rejected",
+        ["route", "result"],
+    )
+    ADMIT_WAIT = Histogram(
+        "rag_admission_wait_ms",
+        "Time an admitted request queued for a slot (ms)",
+        ["route"],
+        buckets=[1,10,25,50,100,250,500,1000,2000],
+    )
+    ADMIT_STATE = Gauge(
+        "rag_admission_slots",
+        "Requests running (active) and queued (waiting) per route",
+        ["route", "state"],
+    )
+    DEADLINE_FALLBACKS = Counter(
+        "rag_deadline_fallbacks_total",
+        "Stages skipped or cut to their cheaper fallback because the request deadline was close",
+        ["stage"],
+    )
+    STARTUP_SECONDS = Gauge(
+        "rag_startup_seconds",
+        "Cold start breakdown: import and warm-up phases (s)",
+        ["phase"],
+    )
     
     @router.get("/metrics")
     def metrics():
         return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
 else:
-    REQUESTS = ERRORS = LATENCY = EMB_LAT = DB_LAT = None
+    REQUESTS = ERRORS = LATENCY = EMB_LAT = DB_LAT = FETCH_THROTTLED = GC_DELETED = STARTUP_SECONDS = CACHE_LOOKUPS = SEMCACHE_ENTRIES = COALESCED = STAGE_LAT = HTTP_LAT = INFLIGHT = LOOP_LAG = THREADS = THREAD_WAIT = DB_POOL = DB_POOL_WAIT = SQL_LAT = SQL_SLOW = SQL_PLAN_FLAGS = ADMISSION = ADMIT_WAIT = ADMIT_STATE = DEADLINE_FALLBACKS = None
     
     @router.get("/metrics")
     def metrics_stub():
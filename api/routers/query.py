@@ -1,12 +1,19 @@
 from contextlib import asynccontextmanager
 from fastapi import APIRouter, HTTPException, Request
-from typing import Annotated, List, Mapping, Optional
+from typing import Annotated, Dict, List, Mapping, Optional
 from pydantic import BaseModel, StringConstraints, Field, model_validator, field_validator 
 from api.core.lang import detect_lang
-from api.rag.embed import embed_texts
-from api.rag.retrieve import search_similar
+from api.rag.embed import embed_texts, embed_with_status
+from api.rag.retrieve import search_many, _as_text, _rank, _search, _sql_timeout
 from api.rag.router import load_faq
 from api.rag.generate import quote_then_summarize
+from api.rag.store import active_index_name
+from api.rag.lexical import best_sentences, query_terms
+from api.rag import semcache
+from api.core import admission
+from api.core.deadline import Deadline
+from api.core.singleflight import get_flight
+from api.core.tracing import annotate, span
 from api.routers.metrics import REQUESTS, LATENCY, EMB_LAT, DB_LAT, ERRORS
 import asyncio, unicodedata, re, time, os, logging
 
@@ -17,6 +24,7 @@ timeout = int(os.getenv("QUERY_TIMEOUT_SEC", "8"))
 log = logging.getLogger("api.query")
 IDX = os.getenv("DEFAULT_INDEX_NAME", "c300o45")
 ALLOWED_INDEXES = {"c300o45"}
+BATCH_MAX = int(os.getenv("QUERY_BATCH_MAX", "32"))
 
 @asynccontextmanager
 async def lifespan(app: APIRouter):
@@ -61,71 +69,45 @@ def normalize_query(q: str) -> str:
     q = NORM_WS.sub(" ", q).strip()
     return q
 
-def _tokenize(s: str) -> list[str]:
-    return re.findall(r"\w+", (s or "").lower())
+def _select_sentences(query: str, texts: List, max_sentences: int = 3) -> List[str]:
+    # texts: retrieved rows (reuses precomputed sentence term sets) or plain strings
+    return best_sentences(query_terms(query or ""), texts, max_sentences)
 
-def _boost_by_uri_and_text(query: str, sims: list[dict]) -> list[dict]:
-    q_tokens = set(_tokenize(query))
-    def bonus(s):
-        uri = (s.get("source_uri") or s.get("uri") or "").lower()
-        txt = (_as_text(s) or "").lower()
-        score = 0
-        for t in q_tokens:
-            if t and t in uri:
-                score += 2    # URL/title hit = strong
-            if t and t in txt:
-                score += 1    # Body hit = weaker
-        # Keep the original distance score if present
-        base = float(s.get("score") or 0.0)
-        return (score, base)
-    return sorted(sims, key=bonus, reverse=True)
 
-def _as_text(x) -> str:
-    # Accept dict-like rows or ORM objects; fallback to snippet
-    if isinstance(x, Mapping):
-        t = x.get("text")
-        if isinstance(t, str) and t.strip():
-            return t
-        s = x.get("snippet")
-        return s if isinstance(s, str) else ""
-    # object with attributes
-    t = getattr(x, "text", None)
-    if isinstance(t, str) and t.strip():
-        return t
-    s = getattr(x, "snippet", "")
-    return s if isinstance(s, str) else ""
-
-def _select_sentences(query: str, texts: List[str], max_sentences: int = 3) -> List[str]:
-    q_tokens = set(re.findall(r"\w+", (query or "").lower()))
-    candidates = []
-    for t in texts:
-        if not isinstance(t, str) or not t.strip():
-            continue
-        for s in re.split(r"(?<=[.!?])\s+", t):
-            st = (s or "").strip()
-            if not st:
-                continue
-            s_tokens = set(re.findall(r"\w+", st.lower()))
-            score = len(q_tokens & s_tokens)
-            candidates.append((score, st))
-    candidates.sort(key=lambda x: x[0], reverse=True)
-    out = []
-    for _, s in candidates:
-        if all(s not in o and o not in s for o in out):
-            out.append(s)
-        if len(out) >= max_sentences:
-            break
-    return out
+def _citations(sims: list) -> List[dict]:
+    cites = []
+    for s in sims:
+        if isinstance(s, Mapping):
+            cites.append({
+                "uri": s.get("source_uri") or s.get("uri") or "",
+                "snippet": _as_text(s)[:250],
+                "date": s.get("published_at"),
+                "score": s.get("score"),
+            })
+        else:
+            cites.append({
+                "uri": getattr(s, "source_uri", "") or getattr(s, "uri", ""),
+                "snippet": _as_text(s)[:250],
+                "date": getattr(s, "published_at", None),
+                "score": getattr(s, "score", None),
+            })
+    return cites
 
+def _rerank_gate(requested: bool) -> bool:
+    return bool(requested) and os.getenv("RERANK_ENABLED", "0") in ("1", "true", "True")
 
 @router.post("")
 @router.post("/")
 async def ask(payload: Query, request: Request):
     rid = getattr(request.state, "request_id", "na")
+    deadline = Deadline.for_request(timeout)
     q = normalize_query(payload.query) or (payload.query or "").strip()
     index_name = payload.index_name or IDX
-    if index_name not in ALLOWED_INDEXES:
-        log.warning("invalid_index", got=index_name, use=IDX, request_id=rid)
+    # Searches always go to the active variant (alias swap via scripts/reindex_variant.py --activate)
+    active = active_index_name(IDX)
+    annotate(index=active)
+    if index_name not in ALLOWED_INDEXES | {active}:
+        log.warning("invalid_index got=%s use=%s id=%s", index_name, active, rid)
     lang = payload.lang_pref
     target_lang = payload.answer_lang
     if target_lang == "auto":
@@ -145,102 +127,67 @@ async def ask(payload: Query, request: Request):
         sims: List = []
         answer: str = ""
         log.info("req start id=%s q=%r k=%s lang=%s rerank=%s index=%s",
-            rid, q, payload.k, lang, payload.use_reranker, IDX)
-        
+            rid, q, payload.k, lang, payload.use_reranker, active)
+
+        # FAQ routing first: in-memory, so FAQ hits are answered without waiting for admission
         try:
-            # Try FAQ routing first
-            try:
+            with span("faq"):
                 routed = FAQ.route(q, lang) if FAQ else None
-            except Exception:
-                routed = None
-            if routed:
-                REQUESTS.labels(route="faq", index=IDX, topic=str(payload.topic_hint), lang=lang).inc()
-                return {**routed, "request_id": rid}
-            
+        except Exception:
+            routed = None
+        if routed:
+            if REQUESTS:
+                REQUESTS.labels(route="faq", index=active, topic=str(payload.topic_hint), langs=",".join(lang or ())).inc()
+            return {**routed, "request_id": rid}
+
+        # Overloaded propagates (503 from _bounded); a degraded slot skips rerank and the LLM
+        slot = await admission.acquire("query")
+        degraded = slot.degraded
+        try:
             t0 = time.time()     
             # Embed
             e0 = time.time()
-            embs = await embed_texts([q])
+            with span("embed"):
+                embs, fell_back = await embed_with_status([q], cache=True, deadline=deadline)
             EMB_LAT.observe((time.time() - e0) * 1000)
             qvec = embs[0]
             log.debug("embed ok id=%s dim=%s", rid, len(qvec) if embs and qvec else None)
    
-            env_gate = os.getenv("RERANK_ENABLED", "0") in ("1", "true", "True")
-            use_reranker = bool(payload.use_reranker) and env_gate
+            use_reranker = _rerank_gate(payload.use_reranker) and not degraded
+
+            # Near-duplicate of an answered query under the same filters: skip retrieval and generation.
+            # A fallback query vector (embeddings API down) is in another space: no lookup, no store.
+            cache = semcache.get_cache() if not fell_back else None
+            part = (active, tuple(sorted(set(lang or ()))), payload.topic_hint, payload.country_hint, target_lang,
+                    payload.k, use_reranker)
+            if cache is not None:
+                with span("semcache"):
+                    if cache.generation_due():
+                        await asyncio.to_thread(cache.check_generation, semcache.index_generation)
+                    gen0 = cache.generation
+                    hit = cache.get(part, qvec)
+                semcache.count(hit is not None)
+                if hit is not None:
+                    log.info("semcache_hit id=%s", rid)
+                    return {**hit, "request_id": rid}
    
             # Retrieve
             s0 = time.time()
-            try:
-                search_similar.__last_q = payload.query
-            except Exception:
-                pass
-            sims = search_similar(
-                qvec,
-                k=max(payload.k, 8),
-                lang_filter=tuple(lang or ("es", "en")),
-                topic=payload.topic_hint,
-                country=payload.country_hint,
-                index_name=IDX
-            )
-            log.debug("retrieved=%d id=%s", len(sims or []), rid)
-            if sims:
-                first = sims[0]
-                if isinstance(first, dict):
-                    log.debug("sims0: dict keys=%s id=%s", list(first.keys()), rid)
-                else:
-                    log.debug("sims0: type=%s has_text=%s id=%s", type(first).__name__, hasattr(first, "text"), rid)
-
-            # Fallback if empty
-            fallback_note = None
-            if not sims:
-                sims = search_similar(
-                    qvec,
-                    k=max(payload.k, 8),
-                    lang_filter=("es", "en"),
-                    topic=None,
-                    country=payload.country_hint,
-                    index_name=IDX
-                )
-                fallback_note = "fallback_no_topic_or_lang"
-                
-            DB_LAT.observe((time.time() - s0) * 1000)
-            log.debug("retrieved=%d id=%s", len(sims or []), rid)
-        
-            # Guarded reranker
-            sims = [s for s in (sims or []) if _as_text(s)]
-            sims = _boost_by_uri_and_text(q, sims)
-            log.debug("post-filter=%d id=%s", len(sims), rid)
-            if use_reranker and sims:
-                try:
-                    from api.rag.rerank import rerank
-                    log.debug("rerank start id=%s", rid)
-                    # Ensure each item has a string to rank
-                    sims = rerank(q, sims, top_k=payload.k)
-                    log.debug("rerank done n=%d id=%s", len(sims), rid)
-                except Exception:
-                    sims = sims[: payload.k]
-            else:
-                sims = sims[: payload.k]
-            
-            # Build citations safely
-            for s in sims:
-                if isinstance(s, Mapping):
-                    cites.append({
-                        "uri": s.get("source_uri") or s.get("uri") or "",
-                        "snippet": _as_text(s)[:250],
-                        "date": s.get("published_at"),
-                        "score": s.get("score"),
-                    })
-                else:
-                    cites.append({
-                        "uri": getattr(s, "source_uri", "") or getattr(s, "uri", ""),
-                        "snippet": _as_text(s)[:250],
-                        "date": getattr(s, "published_at", None),
-                        "score": getattr(s, "score", None),
-                    })
+            # Off the loop (DB round trips, cross-encoder), as in retrieve(): other requests keep running
+            # and the outer wait_for can still fire
+            sims = await asyncio.to_thread(_search, qvec, k=payload.k, lang=lang, topic=payload.topic_hint,
+                                           country=payload.country_hint, index_name=active, deadline=deadline)
+            if DB_LAT:
+                DB_LAT.observe((time.time() - s0) * 1000)
+            log.debug("retrieved=%d id=%s", len(sims), rid)
+            sims, cut = await asyncio.to_thread(_rank, q, sims, k=payload.k, use_reranker=use_reranker,
+                                                deadline=deadline)
+            cites.extend(_citations(sims))
 
             # Extractive answer (never raises)
-            answer = await quote_then_summarize(q, sims, target_lang)
+            with span("generate"):
+                answer, full = await quote_then_summarize(q, sims, target_lang, extractive_only=degraded,
+                                                          deadline=deadline)
             if not answer or not answer.strip():
                 answer = "Final summary failed to produce an answer."
             
@@ -256,13 +203,19 @@ async def ask(payload: Query, request: Request):
                 if REQUESTS:
                     REQUESTS.labels(
                         route="rag", 
-                        index=IDX, 
+                        index=active, 
                         topic=str(payload.topic_hint), 
-                        lang=lang
+                        langs=",".join(lang or ())
                     ).inc()
             except Exception:
                 pass
 
+            if degraded:
+                return {"route": "rag", "answer": answer, "citations": cites, "degraded": True, "request_id": rid}
+            # Only full answers: reranked if asked (the partition says so) and summarized by the LLM; a
+            # fallback would be served for SEMCACHE_TTL_S. Not if the index moved while this one was built.
+            if cache is not None and full and not cut and cites and cache.generation == gen0:
+                cache.put(part, qvec, {"route": "rag", "answer": answer, "citations": cites})
             return {
                 "route": "rag", 
                 "answer": answer, 
@@ -270,7 +223,9 @@ async def ask(payload: Query, request: Request):
                 "request_id": rid}
         
         except Exception as e:
-            log.exception("query_failed id=%s etype=%s", rid, IDX)
+            if _statement_timeout(e):
+                raise       # out of time, not broken: 504 like the outer timeout
+            log.exception("query_failed id=%s etype=%s", rid, active)
             # Return schema (status 200), not HTTPException/detail
             return {
                 "route": "error",
@@ -283,23 +238,132 @@ async def ask(payload: Query, request: Request):
                     "msg": str(e)[:300]
                 }
             }
+        finally:
+            slot.release()
         
+    # Identical concurrent questions (same filters and answer language) share one computation
+    flight = get_flight("query")
+    flight_key = "|".join(map(str, (q.casefold(), active, ",".join(lang or ()), payload.topic_hint, payload.country_hint,
+                                    target_lang, payload.k, payload.use_reranker)))
+    result = await _bounded(_query_task() if flight is None else flight.do(flight_key, _query_task))
+    return {**result, "request_id": rid}
+
+async def _bounded(aw):
+    # QUERY_TIMEOUT_SEC for the whole request; failures surface as JSON 504/500
     try:
-        result = await asyncio.wait_for(_query_task(), timeout=timeout)
-        return result
+        return await asyncio.wait_for(aw, timeout=timeout)
     except asyncio.TimeoutError as e:
         try:
             if ERRORS: ERRORS.labels("504").inc()
         except Exception:
             pass
         raise HTTPException(status_code=504, detail={"code":"timeout","message":"upstream timeout"})
+    except admission.Overloaded as e:
+        try:
+            if ERRORS: ERRORS.labels("503").inc()
+        except Exception:
+            pass
+        raise HTTPException(status_code=503, detail={"code":"overloaded","message":e.reason},
+                            headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
+        status = 504 if _statement_timeout(e) else 500
         try:
-            if ERRORS: ERRORS.labels("500").inc()
+            if ERRORS: ERRORS.labels(str(status)).inc()
         except Exception:
             pass
+        if status == 504:
+            raise HTTPException(status_code=504, detail={"code":"timeout","message":"statement timeout"})
         raise HTTPException(status_code=500, detail={"code":"internal_error","message":type(e).__name__})
-    
+
+def _statement_timeout(e: BaseException) -> bool:
+    # Postgres query_canceled (57014): the search ran into its deadline-derived statement_timeout
+    return getattr(getattr(e, "orig", None), "pgcode", None) == "57014"
+
+def _results(sims: list) -> List[dict]:
+    # Citations plus the full chunk text, for callers that do their own generation or scoring
+    return [{**c, "text": _as_text(s)} for c, s in zip(_citations(sims), sims)]
+
+def _count(route: str, active: str, p: Query):
+    try:
+        if REQUESTS:
+            REQUESTS.labels(route=route, index=active, topic=str(p.topic_hint), langs=",".join(p.lang_pref or ())).inc()
+    except Exception:
+        pass
+
+@router.post("/retrieve")
+async def retrieve(payload: Query, request: Request):
+    """Embed, search, boost and (optionally) rerank; no generation."""
+    rid = getattr(request.state, "request_id", "na")
+    deadline = Deadline.for_request(timeout)
+    q = normalize_query(payload.query) or (payload.query or "").strip()
+    active = active_index_name(IDX)
+    annotate(index=active)
+
+    async def _task():
+        async with admission.admit("retrieve") as slot:
+            with span("embed"):
+                qvec = (await embed_texts([q], cache=True, deadline=deadline))[0]
+            # DB round trips and the cross-encoder block: off the loop, so _bounded's timeout can still fire
+            sims = await asyncio.to_thread(_search, qvec, k=payload.k, lang=payload.lang_pref, topic=payload.topic_hint,
+                                           country=payload.country_hint, index_name=active, deadline=deadline)
+            ranked, _ = await asyncio.to_thread(_rank, q, sims, k=payload.k, deadline=deadline,
+                                                use_reranker=_rerank_gate(payload.use_reranker) and not slot.degraded)
+            return ranked
+
+    sims = await _bounded(_task())
+    _count("retrieve", active, payload)
+    return {"route": "retrieve", "results": _results(sims), "request_id": rid}
+
+class BatchQuery(BaseModel):
+    queries: list[Query] = Field(..., min_length=1, max_length=BATCH_MAX)
+
+@router.post("/batch")
+async def batch(payload: BatchQuery, request: Request):
+    """/retrieve for many queries: one embeddings call, one search statement per distinct filter set,
+    results in request order."""
+    rid = getattr(request.state, "request_id", "na")
+    deadline = Deadline.for_request(timeout)
+    items = payload.queries
+    qs = [normalize_query(p.query) or (p.query or "").strip() for p in items]
+    active = active_index_name(IDX)
+    annotate(index=active)
+    k = max(max(p.k for p in items), 8)
+
+    async def _search_groups(idx: List[int], vecs, filters) -> Dict[int, list]:
+        groups: Dict[tuple, List[int]] = {}
+        for i in idx:
+            groups.setdefault(filters(items[i]), []).append(i)
+        out: Dict[int, list] = {}
+        for (langs, topic, country), members in groups.items():
+            rows = await asyncio.to_thread(search_many, [vecs[i] for i in members], k=k, lang_filter=langs,
+                                           topic=topic, country=country, index_name=active,
+                                           timeout_ms=_sql_timeout(deadline))
+            out.update(zip(members, rows))
+        return out
+
+    async def _task():
+        async with admission.admit("batch") as slot:
+            with span("embed"):
+                vecs = await embed_texts(qs, cache=True, deadline=deadline)
+            with span("search"):
+                sims = await _search_groups(range(len(items)), vecs,
+                                            lambda p: (tuple(p.lang_pref or ("es", "en")), p.topic_hint, p.country_hint))
+            empty = [i for i in range(len(items)) if not sims[i]]
+            if empty and deadline.timeout() > 0:
+                # Same fallback as single queries: no topic, both languages
+                with span("search_fallback"):
+                    sims.update(await _search_groups(empty, vecs, lambda p: (("es", "en"), None, p.country_hint)))
+            return await asyncio.to_thread(lambda: [
+                _rank(q, sims[i], k=p.k, use_reranker=_rerank_gate(p.use_reranker) and not slot.degraded,
+                      deadline=deadline)[0]
+                for i, (q, p) in enumerate(zip(qs, items))])
+
+    ranked = await _bounded(_task())
+    for p in items:
+        _count("batch", active, p)
+    return {"route": "batch", "request_id": rid,
+            "results": [{"query": p.query, "results": _results(s)} for p, s in zip(items, ranked)]}
+
 @router.post("/echo")
 async def echo(payload: Query):
     return {"ok": True, "received": payload.model_dump()}
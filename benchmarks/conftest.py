@@ -0,0 +1,109 @@
+"""
+Microbenchmarks for the pure-Python hot paths (pytest-benchmark):
+
+  make bench-micro          # run, report ops/sec, save the run under .benchmarks/
+  make bench-micro-check    # run and fail if any min time is >20% slower than the last saved run
+
+Every benchmark also measures the peak traced allocation of one call (tracemalloc) and fails if it
+exceeds its ceiling in benchmarks/budgets.json. Peaks do not depend on the machine, but they do move
+between CPython versions (object layouts, dict/str internals), so the ceilings are measured on the
+Python in budgets.json "_python" (the version CI pins) with ~50% headroom, and only enforced there;
+elsewhere peaks are reported, not gated. Timings are only compared against runs from the same machine.
+
+Fixtures are bilingual and built from data/ (FAQ answers, gold-set queries, catalog URLs), shaped the
+way the serving path sees them: chunk rows carry sent_starts and lex like rows from chunks.
+"""
+import json, os, sys, tracemalloc
+from pathlib import Path
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+ROOT = Path(__file__).resolve().parent.parent
+BUDGETS = Path(__file__).resolve().parent / "budgets.json"
+
+# Filler in both languages around the FAQ answers, so chunks look like encyclopedia/agency pages
+_ES = ["La {t} es una tradición muy extendida en Venezuela, Colombia y Centroamérica.",
+       "Según el IRS, el trámite puede tardar entre 7 y 11 semanas (art. 6109, párr. 3).",
+       "Los CDC recomiendan consultar a un profesional de salud antes de cualquier cambio.",
+       "¿Dónde se originó? Varios países reclaman su origen desde la época precolombina."]
+_EN = ["The {t} is commonly served at breakfast and filled with cheese, beans or meat.",
+       "Applicants must include a federal tax return unless they meet an exception.",
+       "Adults should review their vaccination record every 10 years, e.g. for Td/Tdap.",
+       "Financial aid eligibility depends on enrollment status and U.S. residency."]
+
+def _jsonl(path: Path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(l) for l in f if l.strip()]
+
+@pytest.fixture(scope="session")
+def faq_items():
+    return _jsonl(ROOT / "data" / "faq.jsonl")
+
+@pytest.fixture(scope="session")
+def queries():
+    with open(ROOT / "data" / "gold_set.json", "r", encoding="utf-8") as f:
+        return [r["query"] for r in json.load(f)]
+
+@pytest.fixture(scope="session")
+def uris():
+    with open(ROOT / "data" / "docs_catalog.json", "r", encoding="utf-8") as f:
+        return [d["url"] for d in json.load(f)]
+
+@pytest.fixture(scope="session")
+def page_text(faq_items):
+    # ~4k words, deterministic
+    topics = ["arepa", "pupusa", "tamal", "quinceañera", "mole"]
+    paras = []
+    for n in range(60):
+        t = topics[n % len(topics)]
+        sents = [faq_items[n % len(faq_items)]["a"]]
+        sents += [s.format(t=t) for s in (_ES if n % 2 == 0 else _EN)]
+        paras.append(" ".join(sents))
+    return "\n\n".join(paras)
+
+@pytest.fixture(scope="session")
+def sentences(page_text):
+    from api.rag.chunk import split_unicode
+    return split_unicode(page_text)
+
+@pytest.fixture(scope="session")
+def candidates(page_text, uris):
+    # 8 search hits as returned by retrieve.SQL_TXT
+    from api.rag.chunk import make_chunks
+    from api.rag.lexical import features
+    chunks = make_chunks(page_text, max_tokens=300, overlap=45)
+    return [{"text": text, "sent_starts": starts, "lex": features(text, starts), "source_uri": uris[i % len(uris)],
+             "section": None, "lang": "es" if i % 2 == 0 else "en", "published_at": None, "score": 0.8 - i * 0.05}
+            for i, (text, _, starts) in enumerate(chunks[:8])]
+
+@pytest.fixture(scope="session")
+def faq_router():
+    from api.rag.router import FAQRouter
+    return FAQRouter(str(ROOT / "data" / "faq.jsonl"))
+
+@pytest.fixture(scope="session")
+def budgets():
+    return json.loads(BUDGETS.read_text()) if BUDGETS.exists() else {}
+
+@pytest.fixture
+def hot(benchmark, budgets, request):
+    """hot(fn, *args, **kw): allocation check for one call, then the timed benchmark; returns fn's result."""
+    def run(fn, *args, **kw):
+        fn(*args, **kw)     # lazy imports, lru caches, tokenizer load: not part of the steady state
+        tracemalloc.start()
+        try:
+            fn(*args, **kw)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        kib = round(peak / 1024, 1)
+        benchmark.extra_info["peak_kib"] = kib
+        limit = budgets.get(request.node.name)
+        pinned = budgets.get("_python")
+        if pinned and pinned != "%d.%d" % sys.version_info[:2]:
+            limit = None
+        if limit is not None and not os.getenv("BENCH_IGNORE_BUDGETS"):
+            assert kib <= limit, f"{request.node.name}: peak allocation {kib} KiB > budget {limit} KiB"
+        return benchmark(fn, *args, **kw)
+    return run
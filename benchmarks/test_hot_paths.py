@@ -0,0 +1,47 @@
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+def test_split_unicode(hot, page_text):
+    from api.rag.chunk import split_unicode
+    assert len(hot(split_unicode, page_text)) > 100
+
+def test_chunk_by_tokens(hot, sentences):
+    from api.rag.chunk import chunk_by_tokens
+    assert hot(chunk_by_tokens, sentences, max_tokens=300, overlap=45, with_starts=True)
+
+def test_fallback_embed(hot, queries):
+    from api.rag.embed import _fallback_embed
+    vecs = hot(_fallback_embed, queries[:16])
+    assert len(vecs) == 16 and len(vecs[0]) == 1536
+
+def test_to_pgvector_literal(hot):
+    from api.rag.retrieve import _to_pgvector_literal
+    vec = [((i * 7919) % 1000) / 1000.0 for i in range(1536)]
+    assert hot(_to_pgvector_literal, vec).startswith("[")
+
+def test_faq_route_exact(hot, faq_router):
+    assert hot(faq_router.route, "¿Qué es una arepa?", ["es", "en"])["route"] == "faq"
+
+def test_faq_route_miss(hot, faq_router, queries):
+    # Fuzzy pass over every FAQ entry, no match: the common case for real questions
+    assert hot(faq_router.route, "Ingredientes de un tamal oaxaqueño", ["es", "en"]) is None
+
+def test_boost_by_uri_and_text(hot, candidates):
+    from api.rag.retrieve import _boost_by_uri_and_text
+    assert len(hot(_boost_by_uri_and_text, "¿Qué es una arepa venezolana?", candidates)) == len(candidates)
+
+def test_select_sentences(hot, candidates):
+    from api.routers.query import _select_sentences
+    assert hot(_select_sentences, "¿Qué es una arepa?", candidates, 3)
+
+def test_detect_lang(hot, queries):
+    from api.core.lang import detect_lang
+
+    def all_queries():
+        return [detect_lang(q) for q in queries]
+    assert len(hot(all_queries)) == len(queries)
+
+def test_build_context(hot, candidates):
+    from api.rag.generate import build_context
+    assert hot(build_context, candidates[:5]).startswith("[1]")
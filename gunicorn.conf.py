@@ -0,0 +1,35 @@
+# Multi-worker mode: `gunicorn -c gunicorn.conf.py api.main:app`
+#
+# The app is imported once in the master (preload_app), which then loads the read-only assets
+# (tokenizer + fallback-embed table, FAQ index, reranker weights) and freezes them out of the GC
+# before forking. Workers share those pages copy-on-write, so RSS grows by each worker's private
+# heap rather than by a full copy of the models. Caches that must be coherent across workers
+# (query embeddings, chat memory) live in Redis (REDIS_URL).
+import os, multiprocessing
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY") or multiprocessing.cpu_count())
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+# Recycle workers slowly to cap heap creep; jitter keeps them from restarting together
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "5000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "500"))
+# Heartbeat files on tmpfs: a disk-backed /tmp can stall workers under container IO pressure
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+accesslog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info").lower()
+
+def when_ready(server):
+    # Master, after the app import and before the first fork
+    from api.core.startup import preload
+    preload()
+
+def post_fork(server, worker):
+    # Nothing socket-backed may cross the fork: drop inherited DB pool and Redis clients
+    from api.core.db import dispose_after_fork
+    from api.core.cache import reset_after_fork
+    dispose_after_fork()
+    reset_after_fork()
@@ -0,0 +1,11 @@
+-- Keep extracted page text so index variants can be rebuilt without refetching
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS content TEXT;
+
+-- Named pointers to index variants: 'active' is what /query searches
+CREATE TABLE IF NOT EXISTS index_aliases (
+  alias TEXT PRIMARY KEY,
+  index_name TEXT NOT NULL,
+  updated_at TIMESTAMPTZ DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_documents_index_uri ON documents(index_name, source_uri);
@@ -0,0 +1,18 @@
+-- Persistent crawl frontier, keyed by canonical URL
+CREATE TABLE IF NOT EXISTS crawl_frontier (
+  url TEXT PRIMARY KEY,
+  host TEXT NOT NULL,
+  depth INTEGER DEFAULT 0,
+  lastmod TIMESTAMPTZ,
+  status TEXT DEFAULT 'pending',    -- pending, in_progress, done, failed, skipped
+  attempts INTEGER DEFAULT 0,
+  discovered_at TIMESTAMPTZ DEFAULT now(),
+  fetched_at TIMESTAMPTZ,
+  content_hash TEXT,
+  last_error TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_crawl_frontier_pending
+  ON crawl_frontier (lastmod DESC NULLS LAST, depth)
+  WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS idx_crawl_frontier_hash ON crawl_frontier(content_hash);
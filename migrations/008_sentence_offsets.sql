@@ -0,0 +1,3 @@
+-- Sentence start offsets within chunks.text, computed once at ingest by api/rag/segment.py.
+-- NULL for chunks written before this migration: query time segments those on the fly.
+ALTER TABLE chunks ADD COLUMN IF NOT EXISTS sent_starts INTEGER[];
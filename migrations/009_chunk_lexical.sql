@@ -0,0 +1,3 @@
+-- Per-chunk lexical features from api/rag/lexical.py: {"v": folded terms, "s": per-sentence indexes into v}.
+-- NULL for older chunks: query time tokenizes those on the fly.
+ALTER TABLE chunks ADD COLUMN IF NOT EXISTS lex JSONB;
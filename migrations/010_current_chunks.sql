@@ -0,0 +1,24 @@
+-- Searchable set: only chunks of the latest approved, non-deleted version of a page are current.
+-- Maintained by the writers in api/rag/store.py (insert + retire_versions in one transaction).
+ALTER TABLE chunks ADD COLUMN IF NOT EXISTS is_current BOOLEAN NOT NULL DEFAULT TRUE;
+
+-- Filter columns copied from documents so search can LIMIT before joining
+ALTER TABLE chunks ADD COLUMN IF NOT EXISTS lang TEXT;
+ALTER TABLE chunks ADD COLUMN IF NOT EXISTS topic TEXT;
+ALTER TABLE chunks ADD COLUMN IF NOT EXISTS country TEXT;
+
+-- Backfill rows written before this migration (re-runs only touch rows that still disagree)
+UPDATE chunks c SET lang = d.lang, topic = d.topic, country = d.country
+FROM documents d
+WHERE d.id = c.doc_id AND c.lang IS NULL;
+
+UPDATE chunks c SET is_current = FALSE
+FROM documents d
+WHERE d.id = c.doc_id AND c.is_current
+  AND (d.deleted OR NOT d.approved OR EXISTS (
+    SELECT 1 FROM documents n
+    WHERE n.source_uri = d.source_uri AND n.index_name = d.index_name
+      AND (COALESCE(n.version, 1), n.fetched_at, n.id) > (COALESCE(d.version, 1), d.fetched_at, d.id)
+  ));
+
+-- Indexes for the current set: 012_current_chunk_indexes.sql (built CONCURRENTLY)
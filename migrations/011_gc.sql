@@ -0,0 +1,23 @@
+-- Purge is a soft delete: documents.deleted hides a page at once, api/rag/gc.py removes rows later
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMPTZ;
+-- Set when a newer version of the same page lands in the same index (api/rag/store.py retire_versions)
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS superseded_at TIMESTAMPTZ;
+CREATE INDEX IF NOT EXISTS idx_documents_gc ON documents(superseded_at) WHERE deleted OR superseded_at IS NOT NULL;
+
+-- Single row: churn since the last VACUUM / REINDEX, shared by every worker
+CREATE TABLE IF NOT EXISTS gc_state (
+  id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+  deleted_since_vacuum BIGINT NOT NULL DEFAULT 0,
+  deleted_since_reindex BIGINT NOT NULL DEFAULT 0,
+  last_vacuum_at TIMESTAMPTZ,
+  last_reindex_at TIMESTAMPTZ
+);
+INSERT INTO gc_state (id) VALUES (1) ON CONFLICT (id) DO NOTHING;
+
+-- Versions retired before this migration
+UPDATE documents d SET superseded_at = now()
+WHERE superseded_at IS NULL AND EXISTS (
+  SELECT 1 FROM documents n
+  WHERE n.source_uri = d.source_uri AND n.index_name = d.index_name
+    AND (COALESCE(n.version, 1), n.fetched_at, n.id) > (COALESCE(d.version, 1), d.fetched_at, d.id)
+);
@@ -0,0 +1,7 @@
+-- migrate: no-transaction
+-- Built without blocking writes to chunks. Idempotent, so a failed run can simply be retried.
+-- The l2 index from 001 never served `<=>` (cosine) searches.
+DROP INDEX CONCURRENTLY IF EXISTS idx_chunks_embedding;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chunks_embedding_current ON chunks
+  USING ivfflat (embedding vector_cosine_ops) WITH (lists = 100) WHERE is_current;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chunks_current_filter ON chunks(index_name, lang) WHERE is_current;
@@ -0,0 +1,17 @@
+-- Monotonic counter bumped when a transaction adds, retires or purges documents, so in-process result
+-- caches (api/rag/semcache.py) can tell an index changed with one cheap read instead of a TTL guess.
+-- Deferred constraint trigger: fires at commit time, not mid-transaction; nextval takes no row lock.
+CREATE SEQUENCE IF NOT EXISTS index_generation;
+
+CREATE OR REPLACE FUNCTION bump_index_generation() RETURNS trigger AS $$
+BEGIN
+  PERFORM nextval('index_generation');
+  RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS documents_index_generation ON documents;
+CREATE CONSTRAINT TRIGGER documents_index_generation
+  AFTER INSERT OR UPDATE OF deleted, superseded_at, approved ON documents
+  DEFERRABLE INITIALLY DEFERRED
+  FOR EACH ROW EXECUTE FUNCTION bump_index_generation();
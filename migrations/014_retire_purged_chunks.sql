@@ -0,0 +1,5 @@
+-- Purges before this release only flagged documents.deleted and left their chunks current (search
+-- filtered them after LIMIT). api/rag/gc.py now retires them in the purge transaction; catch up here.
+UPDATE chunks c SET is_current = FALSE
+FROM documents d
+WHERE d.id = c.doc_id AND c.is_current AND d.deleted;
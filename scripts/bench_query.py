@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Offline load benchmark for POST /query.
+
+The full app runs in-process (httpx ASGI transport, lifespan included) against the Postgres in DB_URL.
+OpenAI is replaced by a stub server in a child process (embeddings + chat completions, with injected
+latency), so runs are reproducible and the numbers are our code plus the database, not network noise.
+Embeddings from the stub are the same hashed vectors the no-key fallback ingests with, so retrieval
+over a locally seeded index still finds relevant chunks.
+
+  # closed loop: 16 clients back to back, 500 requests
+  python scripts/bench_query.py --concurrency 16 --requests 500
+  # open loop: Poisson arrivals at 40 rps for 30s (latency counted from the scheduled send time)
+  python scripts/bench_query.py --rate 40 --duration 30 --embed-ms 60 --llm-ms 400
+  # compare against an earlier run
+  python scripts/bench_query.py --requests 500 --compare eval/bench/bench-abc1234-....json
+
+Results (throughput, latency percentiles, per-stage percentiles from Server-Timing, CPU and RSS of
+this process) are written as JSON under eval/bench/. The stub's CPU is not included; the load
+generator's is, since it shares the event loop with the app.
+"""
+import os, sys, json, time, random, socket, asyncio, argparse, resource, subprocess, multiprocessing
+from collections import Counter
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+GOLD_PATH = "data/gold_set.json"
+OUT_DIR = "eval/bench"
+FALLBACK_QUERIES = ["¿Qué es una arepa?", "What is a tamale?", "¿Cómo se vota en Colombia?",
+                    "What vaccines do children need?", "¿Qué es el Día de los Muertos?"]
+
+# --- Stub OpenAI server (child process) ---
+
+def _stub_app(embed_ms: float, llm_ms: float, jitter: float, seed: int):
+    from fastapi import FastAPI, Request
+    from api.rag.embed import _fallback_embed
+
+    app = FastAPI()
+    rng = random.Random(seed)
+
+    async def _delay(ms: float):
+        if ms > 0:
+            await asyncio.sleep(ms * (1 + rng.uniform(-jitter, jitter)) / 1000)
+
+    @app.post("/v1/embeddings")
+    async def embeddings(req: Request):
+        body = await req.json()
+        texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        await _delay(embed_ms)
+        return {"object": "list", "model": body.get("model"),
+                "data": [{"object": "embedding", "index": i, "embedding": v} for i, v in enumerate(_fallback_embed(texts))]}
+
+    @app.post("/v1/chat/completions")
+    async def chat(req: Request):
+        body = await req.json()
+        await _delay(llm_ms)
+        if (body.get("response_format") or {}).get("type") == "json_object":
+            content = json.dumps({"quotes": [{"i": 1, "text": "stub quote"}]})
+        else:
+            content = "Stub answer. [1]"
+        return {"id": "bench", "object": "chat.completion", "created": int(time.time()), "model": body.get("model"),
+                "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}}
+
+    return app
+
+def _run_stub(port: int, embed_ms: float, llm_ms: float, jitter: float, seed: int):
+    import uvicorn
+    uvicorn.run(_stub_app(embed_ms, llm_ms, jitter, seed), host="127.0.0.1", port=port, log_level="warning")
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _wait_port(port: int, timeout: float = 15.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"stub server did not start on :{port}")
+
+# --- Load ---
+
+def _queries() -> List[str]:
+    try:
+        with open(GOLD_PATH, "r", encoding="utf-8") as f:
+            return [row["query"] for row in json.load(f)] or FALLBACK_QUERIES
+    except (OSError, ValueError, KeyError):
+        return FALLBACK_QUERIES
+
+def _stages(header: str) -> Dict[str, float]:
+    # "embed;dur=1.2, search;dur=7.0, total;dur=30.1"
+    out = {}
+    for part in filter(None, (p.strip() for p in header.split(","))):
+        name, _, rest = part.partition(";")
+        for attr in rest.split(";"):
+            if attr.strip().startswith("dur="):
+                out[name] = float(attr.strip()[4:])
+    return out
+
+async def _send(client, payload: Dict, t_start: float, samples: List[Dict], t_zero: float):
+    try:
+        r = await client.post("/query/", json=payload)
+        status, route = r.status_code, (r.json().get("route") if r.status_code == 200 else None)
+        stages = _stages(r.headers.get("server-timing", ""))
+    except Exception as e:
+        status, route, stages = type(e).__name__, None, {}
+    samples.append({"t": round(t_start - t_zero, 4), "ms": round((time.perf_counter() - t_start) * 1000, 2),
+                    "status": status, "route": route, "stages": stages})
+
+async def closed_loop(client, payloads, concurrency: int, requests: Optional[int], duration: Optional[float]):
+    samples: List[Dict] = []
+    t_zero = time.perf_counter()
+    it = iter(range(requests)) if requests else None
+    deadline = t_zero + duration if duration else None
+
+    async def worker():
+        while True:
+            if it is not None:
+                i = next(it, None)
+                if i is None:
+                    return
+            else:
+                i = len(samples)
+            if deadline and time.perf_counter() >= deadline:
+                return
+            await _send(client, payloads[i % len(payloads)], time.perf_counter(), samples, t_zero)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples
+
+async def open_loop(client, payloads, rate: float, duration: float, seed: int):
+    # Arrivals are scheduled up front and not delayed by slow responses (no coordinated omission)
+    samples: List[Dict] = []
+    rng = random.Random(seed)
+    t_zero = time.perf_counter()
+    at, tasks, i = 0.0, [], 0
+    while True:
+        at += rng.expovariate(rate)
+        if at >= duration:
+            break
+        delay = t_zero + at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(_send(client, payloads[i % len(payloads)], t_zero + at, samples, t_zero)))
+        i += 1
+    await asyncio.gather(*tasks)
+    return samples
+
+# --- Report ---
+
+def _pct(values: List[float]) -> Dict[str, float]:
+    import numpy as np
+    if not values:
+        return {}
+    a = np.asarray(values, dtype=np.float64)
+    p = np.percentile(a, [50, 90, 95, 99])
+    return {"p50": round(float(p[0]), 2), "p90": round(float(p[1]), 2), "p95": round(float(p[2]), 2),
+            "p99": round(float(p[3]), 2), "max": round(float(a.max()), 2), "mean": round(float(a.mean()), 2)}
+
+def _rss_mb() -> Optional[float]:
+    try:
+        with open("/proc/self/statm") as f:
+            return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20, 1)
+    except (OSError, ValueError):
+        return None
+
+def _git_sha() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+def summarize(samples: List[Dict], wall_s: float, cpu_s: float) -> Dict:
+    ok = [s for s in samples if s["status"] == 200 and s["route"] != "error"]
+    stage_names = sorted({k for s in ok for k in s["stages"] if k != "total"})
+    return {
+        "requests": len(samples),
+        "ok": len(ok),
+        "errors": len(samples) - len(ok),
+        "wall_s": round(wall_s, 3),
+        "throughput_rps": round(len(ok) / wall_s, 2) if wall_s else 0.0,
+        "latency_ms": _pct([s["ms"] for s in ok]),
+        "stages_ms": {n: _pct([s["stages"][n] for s in ok if n in s["stages"]]) for n in stage_names},
+        "routes": dict(Counter(str(s["route"] or s["status"]) for s in samples)),
+        "cpu_s": round(cpu_s, 3),
+        "cpu_util": round(cpu_s / wall_s, 3) if wall_s else 0.0,
+        "rss_mb": _rss_mb(),
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+def compare(cur: Dict, base: Dict):
+    def row(name, a, b):
+        if a is None or b is None:
+            return
+        d = (a - b) / b * 100 if b else 0.0
+        print(f"  {name:<28} {b:>10.2f} -> {a:>10.2f}  ({d:+.1f}%)")
+    c, b = cur["summary"], base["summary"]
+    print(f"vs {base['meta'].get('git_sha')} ({base['meta'].get('created_at')}):")
+    row("throughput_rps", c.get("throughput_rps"), b.get("throughput_rps"))
+    for p in ("p50", "p95", "p99"):
+        row(f"latency {p}", c["latency_ms"].get(p), b["latency_ms"].get(p))
+    for stage in sorted(set(c["stages_ms"]) & set(b["stages_ms"])):
+        row(f"{stage} p95", c["stages_ms"][stage].get("p95"), b["stages_ms"][stage].get("p95"))
+    row("cpu_s", c.get("cpu_s"), b.get("cpu_s"))
+    row("max_rss_mb", c.get("max_rss_mb"), b.get("max_rss_mb"))
+
+async def run(args) -> Dict:
+    import httpx
+    from api.main import app
+    from api.core import startup
+
+    queries = _queries()
+    payloads = [{"query": q, "k": args.k, "lang_pref": ["es", "en"], "use_reranker": args.rerank,
+                 "index_name": args.index} for q in queries]
+    async with app.router.lifespan_context(app):
+        while not startup.is_ready():
+            if startup.status()["status"] == "failed":
+                raise RuntimeError(f"app warm-up failed: {startup.status()}")
+            await asyncio.sleep(0.1)
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench",
+                                     timeout=60, limits=limits) as client:
+            if args.warmup:
+                await closed_loop(client, payloads, min(args.concurrency, args.warmup), args.warmup, None)
+            r0, t0 = resource.getrusage(resource.RUSAGE_SELF), time.perf_counter()
+            if args.rate:
+                samples = await open_loop(client, payloads, args.rate, args.duration or 30.0, args.seed)
+            else:
+                samples = await closed_loop(client, payloads, args.concurrency,
+                                            None if args.duration else args.requests, args.duration)
+            wall = time.perf_counter() - t0
+            r1 = resource.getrusage(resource.RUSAGE_SELF)
+    cpu = (r1.ru_utime - r0.ru_utime) + (r1.ru_stime - r0.ru_stime)
+    out = {"meta": {"git_sha": _git_sha(), "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                    "python": sys.version.split()[0], "mode": "open" if args.rate else "closed",
+                    "args": {k: v for k, v in vars(args).items() if k not in ("out", "compare")}},
+           "summary": summarize(samples, wall, cpu)}
+    if args.samples:
+        out["samples"] = samples
+    return out
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--concurrency", type=int, default=8, help="closed loop: concurrent clients")
+    ap.add_argument("--requests", type=int, default=200, help="closed loop: total requests")
+    ap.add_argument("--rate", type=float, default=0.0, help="open loop: arrivals per second (Poisson)")
+    ap.add_argument("--duration", type=float, default=None, help="seconds (open loop default 30; closed loop overrides --requests)")
+    ap.add_argument("--warmup", type=int, default=20, help="requests before measuring")
+    ap.add_argument("--embed-ms", type=float, default=40.0, help="stub embedding latency")
+    ap.add_argument("--llm-ms", type=float, default=300.0, help="stub chat completion latency (two calls per query)")
+    ap.add_argument("--jitter", type=float, default=0.2, help="stub latency jitter, fraction of the mean")
+    ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--rerank", action="store_true", help="enable the cross-encoder (RERANK_ENABLED=1)")
+    ap.add_argument("--index", default=os.getenv("DEFAULT_INDEX_NAME", "c300o45"))
+    ap.add_argument("--cache", action="store_true", help="keep the semantic cache and single-flight on")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--samples", action="store_true", help="include per-request samples in the output")
+    ap.add_argument("--out", default=None, help=f"output JSON (default {OUT_DIR}/bench-<sha>-<time>.json)")
+    ap.add_argument("--compare", default=None, help="earlier result JSON to diff against")
+    args = ap.parse_args()
+
+    port = _free_port()
+    stub = multiprocessing.Process(target=_run_stub, args=(port, args.embed_ms, args.llm_ms, args.jitter, args.seed),
+                                   daemon=True)
+    stub.start()
+    try:
+        _wait_port(port)
+        # Before the app is imported: these are read at import time
+        os.environ.pop("TEST_MODE", None)
+        os.environ.update({"OPENAI_BASE": f"http://127.0.0.1:{port}/v1", "OPENAI_API_KEY": "bench",
+                           "RERANK_ENABLED": "1" if args.rerank else "0", "GC_ENABLED": "0"})
+        os.environ.setdefault("LOG_LEVEL", "WARNING")
+        if not args.cache:
+            os.environ.update({"SEMCACHE_ENABLED": "0", "SINGLEFLIGHT_ENABLED": "0"})
+        result = asyncio.run(run(args))
+    finally:
+        stub.terminate()
+        stub.join(5)
+
+    out = args.out or os.path.join(OUT_DIR, f"bench-{result['meta']['git_sha'] or 'nogit'}-{int(time.time())}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(json.dumps(result["summary"], ensure_ascii=False, indent=2))
+    print(f"wrote {out}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(result, json.load(f))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Incremental crawl of ALLOWED_DOMAINS: sitemaps + in-scope links -> crawl_frontier -> ingest.
+
+  python3 scripts/crawl.py --seeds data/crawl_seeds.json --index_name c300o45 --max_pages 300
+"""
+import argparse, asyncio, json, os, pathlib, sys
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--seeds", default="data/crawl_seeds.json")
+    ap.add_argument("--index_name", default=os.getenv("DEFAULT_INDEX_NAME", "c300o45"))
+    ap.add_argument("--max_tokens", type=int, default=300)
+    ap.add_argument("--overlap", type=int, default=45)
+    ap.add_argument("--embedding_model", default=None)
+    ap.add_argument("--max_pages", type=int, default=200, help="Pages fetched this run")
+    ap.add_argument("--max_depth", type=int, default=None, help="Link hops from sitemap/start URLs")
+    ap.add_argument("--concurrency", type=int, default=None)
+    ap.add_argument("--no_discover", action="store_true", help="Skip sitemap discovery; drain the existing frontier")
+    ap.add_argument("--recrawl_after_days", type=float, default=None,
+                    help="Requeue pages without sitemap lastmod that were fetched longer ago than this")
+    args = ap.parse_args()
+
+    from api.rag.crawl import Crawler, Frontier, load_sites, CRAWL_CONCURRENCY, CRAWL_MAX_DEPTH
+    from api.rag.fetch import close_scheduler
+
+    async def run():
+        frontier = Frontier()
+        requeued = frontier.requeue_stale(args.recrawl_after_days)
+        crawler = Crawler(
+            load_sites(args.seeds), index_name=args.index_name,
+            max_tokens=args.max_tokens, overlap=args.overlap,
+            max_depth=CRAWL_MAX_DEPTH if args.max_depth is None else args.max_depth,
+            embedding_model=args.embedding_model, frontier=frontier,
+        )
+        discovered = 0 if args.no_discover else await crawler.discover()
+        try:
+            stats = await crawler.run(max_pages=args.max_pages, concurrency=args.concurrency or CRAWL_CONCURRENCY)
+        finally:
+            await close_scheduler()
+        return {"requeued": requeued, "discovered": discovered, **stats}
+
+    print(json.dumps(asyncio.run(run()), indent=2))
+
+if __name__ == "__main__":
+    main()
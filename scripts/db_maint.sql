@@ -1,4 +1,3 @@
--- rebuild IVF index (safe online)
-DROP INDEX IF EXISTS idx_chunks_embedding;
-CREATE INDEX idx_chunks_embedding ON chunks USING ivfflat (embedding vector_l2_ops) WITH (lists = 100);
+-- rebuild IVF index on current chunks (re-trains lists on today's data, no write lock). Run with psql, outside a transaction.
+REINDEX INDEX CONCURRENTLY idx_chunks_embedding_current;
 VACUUM (ANALYZE) chunks;
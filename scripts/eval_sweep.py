@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Retrieval quality vs latency sweep over index variants, reranker on/off and ivfflat probes.
+
+Runs in-process against DB_URL (no API server, no LLM calls): the gold queries are embedded once,
+each configuration retrieves concurrently at max(k), and recall@k, MRR and nDCG come from that
+single ranking. Writes eval/sweeps/sweep-<time>.md (comparison table) and .json (per-query rows).
+
+  python scripts/eval_sweep.py --indexes default,c300,c300o45,c900 --rerank off,on --probes 1,10
+"""
+import os, sys, json, time, asyncio, argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from api.rag.evaluate import load_gold, markdown_table, sweep
+
+def _bools(s: str):
+    return [v.strip().lower() in ("on", "1", "true", "yes") for v in s.split(",") if v.strip()]
+
+def _probes(s: str):
+    return [int(v) if v.strip() not in ("", "default", "0") else None for v in s.split(",")]
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--indexes", default=os.getenv("DEFAULT_INDEX_NAME", "c300o45"), help="comma-separated index_name values")
+    ap.add_argument("--rerank", default="off", help="off | on | off,on")
+    ap.add_argument("--probes", default="default", help="ivfflat.probes values, e.g. 1,5,10 (default = server setting)")
+    ap.add_argument("--k_list", default="1,3,5")
+    ap.add_argument("--lang", default="es,en")
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--embedding_model", default=None)
+    ap.add_argument("--no_topic_hint", action="store_true", help="do not pass the gold doc's topic as topic_hint")
+    ap.add_argument("--gold", default="data/gold_set.json")
+    ap.add_argument("--catalog", default="data/docs_catalog.json")
+    ap.add_argument("--out_dir", default="eval/sweeps")
+    args = ap.parse_args()
+
+    gold = load_gold(args.gold, args.catalog, topic_hints=not args.no_topic_hint)
+    t0 = time.time()
+    report = asyncio.run(sweep(
+        gold,
+        indexes=[i.strip() for i in args.indexes.split(",") if i.strip()],
+        rerank=_bools(args.rerank),
+        probes=_probes(args.probes),
+        ks=[int(k) for k in args.k_list.split(",")],
+        langs=[l.strip() for l in args.lang.split(",") if l.strip()],
+        concurrency=args.concurrency,
+        model=args.embedding_model,
+    ))
+    report["secs"] = round(time.time() - t0, 1)
+    report["created_at"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    base = os.path.join(args.out_dir, f"sweep-{time.strftime('%Y%m%d-%H%M%S')}")
+    table = markdown_table(report)
+    with open(base + ".md", "w", encoding="utf-8") as f:
+        f.write(f"# Retrieval sweep {report['created_at']}\n\n{report['queries']} gold queries, "
+                f"embedding {report['embed_s']}s (once), total {report['secs']}s.\n\n{table}\n")
+    with open(base + ".json", "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+    print(table)
+    print(f"wrote {base}.md and {base}.json")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+"""
+Export the current chunks of an index to a memory-mapped local index (RETRIEVAL_BACKEND=local).
+
+  python3 scripts/export_local_index.py --index_name c300o45
+  python3 scripts/export_local_index.py --index_name c300o45 --out /srv/rag/local_index --hnsw
+"""
+import argparse, json, pathlib, sys
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+def main():
+    from api.rag.local_index import LOCAL_INDEX_DIR, export
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--index_name", required=True)
+    ap.add_argument("--out", default=LOCAL_INDEX_DIR)
+    ap.add_argument("--batch", type=int, default=2000)
+    ap.add_argument("--hnsw", action="store_true", help="also build an hnswlib graph (pip install hnswlib)")
+    args = ap.parse_args()
+    print(json.dumps(export(args.index_name, root=args.out, batch=args.batch, hnsw=args.hnsw), indent=2))
+
+if __name__ == "__main__":
+    main()
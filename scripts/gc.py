@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Run garbage collection once (cron / after a big purge) instead of waiting for the API's background loop.
+
+  python3 scripts/gc.py                      # purged + superseded rows, bounded by GC_MAX_SECONDS
+  python3 scripts/gc.py --purge_domain www.cdc.gov --max_seconds 600
+  python3 scripts/gc.py --maintenance        # force VACUUM + REINDEX CONCURRENTLY of the vector index
+"""
+import argparse, json, pathlib, sys
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--purge_url", default=None)
+    ap.add_argument("--purge_domain", default=None)
+    ap.add_argument("--index_name", default=None)
+    ap.add_argument("--max_seconds", type=float, default=None)
+    ap.add_argument("--maintenance", action="store_true")
+    args = ap.parse_args()
+
+    from api.rag.gc import GC_MAX_SECONDS, collect, maintenance, purge
+
+    out = {}
+    if args.purge_url or args.purge_domain:
+        out["soft_deleted"] = purge(url=args.purge_url, domain=args.purge_domain, index_name=args.index_name)
+    out.update(collect(max_seconds=args.max_seconds or GC_MAX_SECONDS))
+    if args.maintenance:
+        out.update(maintenance(force=True))
+    print(json.dumps(out, indent=2))
+
+if __name__ == "__main__":
+    main()
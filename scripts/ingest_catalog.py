@@ -3,6 +3,9 @@ import argparse, json, pathlib, time, sys
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import httpx
 
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+from api.rag.fetch import interleave_by_host
+
 def post_ingest(api, item, index_name, max_tokens, overlap, embedding_model, timeout):
     payload = {
         "url": item["url"],
@@ -75,6 +78,9 @@ def main():
                 pass
 
     todo = [d for d in docs if d["id"] not in already]
+    # Spread hosts across the worker threads; the API enforces per-host caps (FETCH_HOST_*)
+    by_url = {d["url"]: d for d in todo}
+    todo = [by_url[u] for u in interleave_by_host(by_url)]
 
     print(f"→ Seeding catalog: {path} → index={args.index_name} tokens={args.max_tokens} overlap={args.overlap}")
     print(f"→ Skipping {len(already)} already-ingested; processing {len(todo)}")
@@ -1,37 +1,55 @@
 #!/usr/bin/env python3
-import json, argparse, httpx, sys, pathlib
+"""
+Rebuild an index variant from document text already stored in Postgres.
+No pages are refetched; only the new chunks are embedded.
 
-CAT = pathlib.Path("data/docs_catalog.json")
-API = "http://localhost:8000/ingest/url"
+  python3 scripts/reindex_variant.py --index_name c900 --max_tokens 900 --overlap 90 --activate
+"""
+import argparse, asyncio, json, os, pathlib, sys
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
 
 def main():
     ap = argparse.ArgumentParser()
-    ap.add_argument("--index_name", required=True)
+    ap.add_argument("--index_name", required=True, help="Variant to build")
+    ap.add_argument("--from_index", default=None, help="Variant whose stored text is rechunked (default: active index)")
     ap.add_argument("--max_tokens", type=int, default=600)
     ap.add_argument("--overlap", type=int, default=60)
     ap.add_argument("--embedding_model", default=None)
-    ap.add_argument("--lang_default", default="es")
+    ap.add_argument("--workers", type=int, default=None, help="Chunking processes (default: CPU count)")
+    ap.add_argument("--doc_batch", type=int, default=32)
+    ap.add_argument("--activate", action="store_true", help="Point the 'active' alias at the new variant when done")
+    ap.add_argument("--backfill_missing", action="store_true",
+                    help="Fetch and store text for docs ingested before content was kept (one-time)")
     args = ap.parse_args()
 
-    docs = json.loads(CAT.read_text())
-    with httpx.Client(timeout=60) as client:
-        for d in docs:
-            payload = {
-                "url": d["url"],
-                "lang": d.get("lang", args.lang_default),
-                "topic": d.get("topic"),
-                "country": d.get("country"),
-                "index_name": args.index_name,
-                "max_tokens": args.max_tokens,
-                "overlap": args.overlap,
-                "embedding_model": args.embedding_model
-            }
-            try:
-                r = client.post(API, json=payload)
-                r.raise_for_status()
-                print(f"[ok] {d['id']} -> {args.index_name}")
-            except Exception as e:
-                print(f"[warn] {d['id']} -> {e}", file=sys.stderr)
+    from api.rag.fetch import close_scheduler
+    from api.rag.reindex import reindex_variant
+    from api.rag.store import active_index_name
+
+    source = args.from_index or active_index_name(os.getenv("DEFAULT_INDEX_NAME", "c300o45"))
+
+    async def run():
+        try:
+            return await reindex_variant(
+                args.index_name,
+                source=source,
+                max_tokens=args.max_tokens,
+                overlap=args.overlap,
+                embedding_model=args.embedding_model,
+                workers=args.workers,
+                doc_batch=args.doc_batch,
+                activate=args.activate,
+                backfill_missing=args.backfill_missing,
+            )
+        finally:
+            # --backfill_missing fetches through this loop's scheduler
+            await close_scheduler()
+
+    out = asyncio.run(run())
+    print(json.dumps(out, ensure_ascii=False, indent=2, default=str))
+    if out["missing_text"]:
+        print(f"[warn] {len(out['missing_text'])} docs have no stored text; rerun with --backfill_missing", file=sys.stderr)
 
 if __name__ == "__main__":
     main()
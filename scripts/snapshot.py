@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Export / import an index snapshot (Parquet: documents, chunks, embeddings). Needs pyarrow.
+
+  python3 scripts/snapshot.py export --index_name c300o45 --out snapshots/c300o45 [--dtype float16]
+  python3 scripts/snapshot.py import --src snapshots/c300o45 [--index_name c300o45_restored] [--replace] [--activate]
+"""
+import argparse, json, pathlib, sys
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    ex = sub.add_parser("export")
+    ex.add_argument("--index_name", required=True)
+    ex.add_argument("--out", required=True)
+    ex.add_argument("--dtype", choices=["float32", "float16"], default="float32")
+    im = sub.add_parser("import")
+    im.add_argument("--src", required=True)
+    im.add_argument("--index_name", default=None, help="load under another name (default: the exported one)")
+    im.add_argument("--replace", action="store_true", help="soft-delete the live index of the same name")
+    im.add_argument("--activate", action="store_true", help="point the 'active' alias at it after loading")
+    im.add_argument("--no_reindex", action="store_true", help="skip REINDEX CONCURRENTLY of the vector index")
+    args = ap.parse_args()
+
+    from api.rag.snapshot import SnapshotError, export, import_snapshot
+    try:
+        if args.cmd == "export":
+            out = export(args.index_name, args.out, dtype=args.dtype)
+        else:
+            out = import_snapshot(args.src, index_name=args.index_name, replace=args.replace,
+                                  activate=args.activate, reindex=not args.no_reindex)
+    except SnapshotError as e:
+        print(f"snapshot error: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps(out, indent=2))
+
+if __name__ == "__main__":
+    main()
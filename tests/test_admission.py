@@ -0,0 +1,88 @@
+import asyncio, pytest
+from api.core.admission import AdmissionController, Overloaded
+
+def _ctrl(limit=2, queue=2, max_wait_s=0.5, **kw):
+    return AdmissionController("t", limit, queue, max_wait_s=max_wait_s, degrade_wait_s=kw.pop("degrade_wait_s", 0.05),
+                               budget_s=kw.pop("budget_s", 10.0))
+
+def test_limit_queue_fifo_handoff_and_fast_rejection():
+    async def main():
+        c = _ctrl()
+        a, b = await c.acquire(), await c.acquire()
+        assert c.active == 2 and not a.degraded
+        order = []
+
+        async def waiter(name):
+            s = await c.acquire()
+            order.append(name)
+            return s
+
+        w = [asyncio.create_task(waiter(n)) for n in ("x", "y")]
+        await asyncio.sleep(0.01)
+        assert c.waiting() == 2
+        with pytest.raises(Overloaded) as e:
+            await c.acquire()                  # queue full: refused immediately
+        assert e.value.reason == "queue_full" and e.value.retry_after >= 1
+        await asyncio.sleep(0.06)
+        a.release()
+        b.release()
+        x, y = await asyncio.gather(*w)
+        assert order == ["x", "y"] and c.active == 2        # slots handed over, not freed
+        assert x.degraded                                   # queued past degrade_wait_s
+        x.release(); y.release()
+        assert c.active == 0 and c.waiting() == 0
+
+    asyncio.run(main())
+
+def test_wait_timeout_and_expected_wait_rejection():
+    async def main():
+        c = _ctrl(limit=1, queue=4, max_wait_s=0.05)
+        s = await c.acquire()
+        with pytest.raises(Overloaded) as e:
+            await c.acquire()
+        assert e.value.reason == "wait_timeout" and c.waiting() == 0
+        c.service_s = 1.0                     # one slot, 1s per request: the next wait is ~1s > 50ms
+        with pytest.raises(Overloaded) as e:
+            await c.acquire()
+        assert e.value.reason == "expected_wait"
+        s.release()
+        assert c.active == 0
+
+    asyncio.run(main())
+
+def test_cancelled_waiter_passes_its_slot_on():
+    async def main():
+        c = _ctrl(limit=1, queue=4)
+        s = await c.acquire()
+        first = asyncio.create_task(c.acquire())
+        second = asyncio.create_task(c.acquire())
+        await asyncio.sleep(0.01)
+        s.release()                 # hands the slot to `first`...
+        first.cancel()              # ...which is cancelled before it runs
+        got = await second
+        assert c.active == 1
+        got.release()
+        assert c.active == 0
+
+    asyncio.run(main())
+
+def test_degraded_when_recent_service_would_blow_the_budget():
+    async def main():
+        c = _ctrl(budget_s=1.0)
+        c.full_service_s = 2.0
+        s = await c.acquire()
+        assert s.degraded
+        s.release()
+        assert c.full_service_s == 2.0          # degraded runs do not teach the full-mode estimate
+
+    asyncio.run(main())
+
+def test_extractive_only_skips_the_llm(monkeypatch):
+    from api.rag import generate
+
+    def boom(*a, **kw):
+        raise AssertionError("LLM called in degraded mode")
+    monkeypatch.setattr(generate, "openai_chat", boom)
+    cands = [{"text": "La arepa es un pan de maíz. Se come en Venezuela.", "source_uri": "u"}]
+    ans, full = asyncio.run(generate.quote_then_summarize("¿Qué es una arepa?", cands, "es", extractive_only=True))
+    assert "arepa" in ans and ans.endswith("[1]") and not full
@@ -8,3 +8,24 @@ def test_chunk_overlap():
     sents = [f"sent {i}" for i in range(50)]
     chunks = chunk_by_tokens(sents, max_tokens=10, overlap=2, count_tokens=lambda x:1)
     assert all(t <= 10 for _,t in chunks)
+
+def test_segment_abbreviations_and_decimals():
+    from api.rag.segment import split
+    s = "El Dr. Pérez vive en EE. UU. desde 2010. La tasa es 3.5 por ciento. ¿Cuánto cuesta? Cuesta $1.200, etc. Mr. Smith agreed."
+    assert split(s) == [
+        "El Dr. Pérez vive en EE. UU. desde 2010.",
+        "La tasa es 3.5 por ciento.",
+        "¿Cuánto cuesta?",
+        "Cuesta $1.200, etc.",
+        "Mr. Smith agreed.",
+    ]
+
+def test_make_chunks_keeps_short_sentences_and_offsets():
+    from api.rag.chunk import make_chunks
+    from api.rag.segment import from_starts
+    text = "Plazo: 90 días. " + "Debe presentar el formulario I-90 con la tarifa correspondiente en línea. " * 3
+    (chunk, tokens, starts), = make_chunks(text, max_tokens=200, overlap=0)
+    assert tokens > 0
+    sents = from_starts(chunk, starts)
+    assert sents[0] == "Plazo: 90 días."
+    assert len(sents) == 4
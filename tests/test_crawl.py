@@ -0,0 +1,29 @@
+from api.rag.crawl import canonicalize, parse_sitemap, in_scope
+
+SITES = {"www.usa.gov": {"host": "www.usa.gov", "prefixes": ["/es/"]}}
+
+def test_canonicalize():
+    assert canonicalize("HTTP://WWW.USA.GOV/es/ciudadania/?utm_source=x#top") == "https://www.usa.gov/es/ciudadania"
+    assert canonicalize("../pasaporte", base="https://www.usa.gov/es/ciudadania/") == "https://www.usa.gov/es/pasaporte"
+    assert canonicalize("https://es.m.wikipedia.org/wiki/Fiesta_de_quince_a%C3%B1os") == \
+        canonicalize("https://es.wikipedia.org/wiki/Fiesta_de_quince_años")
+    assert canonicalize("mailto:a@b.c") is None
+
+def test_scope():
+    assert in_scope("https://www.usa.gov/es/ciudadania", SITES)
+    assert not in_scope("https://www.usa.gov/citizenship", SITES)
+    assert not in_scope("https://www.usa.gov/es/formulario.pdf", SITES)
+    assert not in_scope("https://www.irs.gov/es/itin", SITES)
+
+def test_parse_sitemap():
+    body = b"""<?xml version="1.0"?>
+    <urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+      <url><loc>https://www.usa.gov/es/ciudadania</loc><lastmod>2024-05-01</lastmod></url>
+      <url><loc>https://www.usa.gov/es/votar</loc></url>
+    </urlset>"""
+    pages, children = parse_sitemap(body)
+    assert [p[0] for p in pages] == ["https://www.usa.gov/es/ciudadania", "https://www.usa.gov/es/votar"]
+    assert pages[0][1].year == 2024 and pages[1][1] is None and children == []
+    idx = b"""<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+      <sitemap><loc>https://www.usa.gov/sitemap-1.xml</loc></sitemap></sitemapindex>"""
+    assert parse_sitemap(idx) == ([], [("https://www.usa.gov/sitemap-1.xml", None)])
@@ -0,0 +1,73 @@
+import asyncio, time, pytest
+from api.core.deadline import Deadline
+
+def test_stage_timeouts_come_from_what_is_left():
+    d = Deadline(2.0)
+    assert 1.6 < d.timeout() <= 1.7                  # minus the tail reserve
+    assert d.timeout(cap=0.5) == 0.5
+    assert 1600 < d.timeout_ms() <= 1700 and d.timeout_ms(cap_ms=300) == 300
+    assert d.allows(1200) and not d.allows(1800)
+    gone = Deadline(0.1)
+    assert gone.timeout() == 0.0 and not gone.allows(1)
+
+def test_generation_steps_fit_the_deadline(monkeypatch):
+    from api.rag import generate
+    calls = []
+
+    def fake_chat(system, user, *, json_mode=False, deadline=None, **kw):
+        calls.append(deadline.timeout(cap=8.0))
+        time.sleep(0.5)
+        return {"quotes": [{"i": 1, "text": "La arepa es un pan de maíz"}]} if json_mode else "resumen"
+    monkeypatch.setattr(generate, "openai_chat", fake_chat)
+    cands = [{"text": "La arepa es un pan de maíz. Se come en Venezuela.", "source_uri": "u"}]
+
+    # Enough for the extract call, not for the summary after it: the extracted quotes are the answer
+    ans, full = asyncio.run(generate.quote_then_summarize("¿Qué es una arepa?", cands, "es", deadline=Deadline(1.8)))
+    assert ans == "La arepa es un pan de maíz [1]" and not full and len(calls) == 1 and calls[0] < 1.8
+    # Too little for any LLM call: extractive, nothing called
+    calls.clear()
+    ans, full = asyncio.run(generate.quote_then_summarize("¿Qué es una arepa?", cands, "es", deadline=Deadline(1.0)))
+    assert ans.endswith("[1]") and not full and calls == []
+    # Plenty: both calls
+    ans, full = asyncio.run(generate.quote_then_summarize("¿Qué es una arepa?", cands, "es", deadline=Deadline(5.0)))
+    assert ans == "resumen" and full and len(calls) == 2
+
+def test_slow_embedding_falls_back_within_the_deadline(monkeypatch):
+    from api.rag import embed
+
+    async def slow(batch, model):
+        await asyncio.sleep(2)
+    monkeypatch.setattr(embed, "API_KEY", "sk-test")
+    monkeypatch.setattr(embed, "_embed_batch", slow)
+    t0 = time.monotonic()
+    vecs, fell_back = asyncio.run(embed._embed_uncached(["arepa"], "m", Deadline(0.6)))
+    assert fell_back and len(vecs[0]) == embed.EMBED_DIM
+    assert time.monotonic() - t0 < 1.0
+
+def test_search_statement_timeout():
+    from sqlalchemy import text
+    from sqlalchemy.exc import OperationalError
+    from api.rag.retrieve import PgVectorBackend
+    from api.routers.query import _statement_timeout
+    backend = PgVectorBackend()
+    try:
+        backend._run(text("SELECT 1 AS x"), {}, None, timeout_ms=1000)
+    except Exception:
+        return  # no DB in unit-only mode
+    with pytest.raises(OperationalError) as e:
+        backend._run(text("SELECT pg_sleep(0.5)"), {}, None, timeout_ms=50)
+    assert _statement_timeout(e.value)
+
+def test_rank_reports_a_skipped_rerank(monkeypatch):
+    from api.rag import rerank
+    from api.rag.retrieve import _rank
+    sims = [{"text": "La arepa es un pan de maíz.", "source_uri": "https://es.wikipedia.org/wiki/Arepa", "score": 0.8},
+            {"text": "El tamal se envuelve en hojas.", "source_uri": "https://es.wikipedia.org/wiki/Tamal", "score": 0.9}]
+    rows, cut = _rank("arepa", sims, k=1, use_reranker=True, deadline=Deadline(1.0))   # < DEADLINE_RERANK_MIN_MS
+    assert cut and rows[0]["source_uri"].endswith("/Arepa")
+    assert _rank("arepa", sims, k=1, use_reranker=False, deadline=Deadline(1.0))[1] is False
+
+    def broken(*a, **kw):
+        raise RuntimeError("cross-encoder failed")
+    monkeypatch.setattr(rerank, "rerank", broken)
+    assert _rank("arepa", sims, k=1, use_reranker=True, deadline=Deadline(10.0))[1] is True
@@ -18,3 +18,49 @@ def test_embedding_shape_and_stability():
     for i in range(2):
         cos = _cosine(v1[i], v2[i])
         assert round(cos, 5) >= 0.99999, f"cosine too low for item {i}: {cos}"
+
+def test_fallback_bucket_table_matches_hashing():
+    from api.rag.embed import EMBED_DIM, _bucket, _fallback_embed, bucket_table
+    table = bucket_table()
+    assert all(table[t] == _bucket(t, EMBED_DIM) for t in (0, 1, 500, len(table) - 1))
+    # Other dims bypass the table
+    assert len(_fallback_embed(["hola"], dim=64)[0]) == 64
+
+class _FakeRedis:
+    def __init__(self):
+        self.store = {}
+
+    async def mget(self, keys):
+        return [self.store.get(k) for k in keys]
+
+    def pipeline(self, transaction=False):
+        return _FakePipe(self.store)
+
+class _FakePipe:
+    def __init__(self, store):
+        self.store, self.ops = store, []
+
+    def set(self, key, value, ex=None):
+        self.ops.append((key, value))
+
+    async def execute(self):
+        self.store.update(self.ops)
+
+def test_cached_embeddings_skip_fallback_vectors(monkeypatch):
+    from api.core import cache
+    from api.rag import embed
+    rds = _FakeRedis()
+    monkeypatch.setattr(cache, "redis_async", lambda: rds)
+    monkeypatch.setattr(embed, "API_KEY", "sk-test")
+
+    async def failing(batch, model):
+        raise RuntimeError("openai_embed_error:500")
+    monkeypatch.setattr(embed, "_embed_batch", failing)
+    vec = asyncio.run(embed_texts(["arepa"], cache=True))[0]
+    assert len(vec) == embed.EMBED_DIM and rds.store == {}   # API error: answered, but not cached
+
+    async def ok(batch, model):
+        return [[0.5] * 4 for _ in batch]
+    monkeypatch.setattr(embed, "_embed_batch", ok)
+    asyncio.run(embed_texts(["arepa"], cache=True))
+    assert list(rds.store) == [embed._cache_key(embed.MODEL, "arepa")]
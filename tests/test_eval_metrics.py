@@ -0,0 +1,28 @@
+import math
+from api.rag.evaluate import markdown_table, relevant_flags, score
+
+AREPA = "https://es.wikipedia.org/wiki/Arepa"
+TAMAL = "https://es.wikipedia.org/wiki/Tamal"
+
+def test_chunks_of_an_already_found_doc_do_not_count_twice():
+    uris = [f"{AREPA}#s1", f"{AREPA}#s2", "https://x.org/other", f"{TAMAL}"]
+    assert relevant_flags(uris, [AREPA, TAMAL]) == [True, False, False, True]
+
+def test_metrics_from_one_ranking():
+    uris = ["https://x.org/a", AREPA, "https://x.org/b", TAMAL, "https://x.org/c"]
+    m = score(uris, [AREPA, TAMAL], ks=(1, 3, 5))
+    assert m["recall@1"] == 0.0 and m["recall@3"] == 0.5 and m["recall@5"] == 1.0
+    assert m["mrr"] == 0.5
+    ideal = 1 + 1 / math.log2(3)
+    assert math.isclose(m["ndcg@5"], (1 / math.log2(3) + 1 / math.log2(5)) / ideal)
+
+def test_no_relevant_docs_scores_zero():
+    m = score(["https://x.org/a"], [], ks=(1, 5))
+    assert m == {"recall@1": 0.0, "recall@5": 0.0, "mrr": 0.0, "ndcg@1": 0.0, "ndcg@5": 0.0}
+
+def test_table_orders_by_quality_then_p95():
+    cfg = lambda idx, nd, p95: {"index_name": idx, "rerank": False, "probes": None, "recall@1": 0, "recall@5": 0,
+                                "mrr": 0, "ndcg@5": nd, "p50_ms": 1, "p95_ms": p95, "errors": 0}
+    table = markdown_table({"ks": [1, 5], "configs": [cfg("slow", 0.8, 90), cfg("weak", 0.5, 5), cfg("fast", 0.8, 10)]})
+    rows = [l.split("|")[1].strip() for l in table.splitlines()[2:]]
+    assert rows == ["fast", "slow", "weak"]
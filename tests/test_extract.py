@@ -0,0 +1,61 @@
+import asyncio
+from api.rag.extract import extract_site_text, run_extract
+
+HTML = """<html><body><nav>Menu</nav>
+<div id="mw-content-text"><p>La arepa es   un pan de maíz.</p></div>
+<footer>pie</footer></body></html>"""
+
+def test_site_selectors():
+    assert extract_site_text(HTML, "es.wikipedia.org") == "La arepa es un pan de maíz."
+    assert "Menu" in extract_site_text(HTML, "example.org")
+
+def test_extract_in_pool():
+    out = asyncio.run(run_extract(extract_site_text, HTML, "es.wikipedia.org"))
+    assert out == "La arepa es un pan de maíz."
+
+def _sleepy(html, seconds):
+    import time
+    time.sleep(seconds)
+    return html
+
+def _die(html):
+    import os
+    os._exit(1)
+
+def test_timeout_spares_concurrent_extractions(monkeypatch):
+    from api.rag import extract
+    monkeypatch.setattr(extract, "EXTRACT_TIMEOUT_S", 2.0)
+
+    async def go():
+        await run_extract(_sleepy, "warm", 0)              # workers spawned before timing starts
+        stuck = asyncio.create_task(run_extract(_sleepy, "stuck", 30))
+        await asyncio.sleep(1.0)
+        other = asyncio.create_task(run_extract(_sleepy, "other", 1.5))   # still running when `stuck` times out
+        done = await asyncio.gather(stuck, other, return_exceptions=True)
+        after = await run_extract(_sleepy, "after", 0)     # fresh pool
+        return done, after
+    try:
+        (stuck, other), after = asyncio.run(go())
+        assert isinstance(stuck, extract.ExtractTimeout)
+        assert other == "other" and after == "after"
+        assert extract._retired == []                      # the stuck worker's pool was closed once drained
+    finally:
+        extract.shutdown_pool()
+
+def test_dead_worker_is_an_extract_error():
+    from api.rag import extract
+    try:
+        try:
+            asyncio.run(run_extract(_die, "x"))
+            assert False, "expected ExtractTimeout"
+        except extract.ExtractTimeout:
+            pass
+        assert asyncio.run(run_extract(_sleepy, "ok", 0)) == "ok"
+    finally:
+        extract.shutdown_pool()
+
+def test_size_cap_counts_bytes(monkeypatch):
+    from api.rag import extract
+    monkeypatch.setattr(extract, "EXTRACT_MAX_BYTES", 8)
+    assert extract._cap("ñññññ") == "ññññ"     # 10 bytes in UTF-8, 5 characters
+    assert extract._cap("abc") == "abc"
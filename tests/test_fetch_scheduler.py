@@ -0,0 +1,51 @@
+import asyncio, httpx
+from api.rag.fetch import FetchScheduler, interleave_by_host
+
+def test_interleave_by_host():
+    urls = ["https://a.org/1", "https://a.org/2", "https://a.org/3", "https://b.org/1"]
+    assert interleave_by_host(urls) == ["https://a.org/1", "https://b.org/1", "https://a.org/2", "https://a.org/3"]
+
+def test_host_concurrency_and_retry_after():
+    state = {"inflight": 0, "peak": 0, "calls": 0}
+
+    async def handler(request):
+        state["calls"] += 1
+        if request.url.path == "/throttled" and state["calls"] == 1:
+            return httpx.Response(429, headers={"Retry-After": "0"})
+        state["inflight"] += 1
+        state["peak"] = max(state["peak"], state["inflight"])
+        await asyncio.sleep(0.01)
+        state["inflight"] -= 1
+        return httpx.Response(200, text="ok")
+
+    async def run():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        sched = FetchScheduler(host_concurrency=1, host_rps=0, max_concurrency=4, retries=2,
+                               host_limits={}, client=client)
+        first = await sched.get("https://a.org/throttled")
+        rs = await asyncio.gather(*(sched.get(f"https://a.org/{i}") for i in range(4)))
+        await sched.aclose()
+        return first, rs
+
+    first, rs = asyncio.run(run())
+    assert first.status_code == 200
+    assert all(r.status_code == 200 for r in rs)
+    assert state["peak"] == 1
+
+def test_one_scheduler_per_loop_closed_on_its_loop():
+    from api.rag import fetch
+
+    async def use(close: bool):
+        sched = fetch.get_scheduler()
+        assert fetch.get_scheduler() is sched
+        client = sched._get_client()
+        if close:
+            await fetch.close_scheduler()
+            assert client.is_closed
+        return sched
+
+    a = asyncio.run(use(close=True))
+    assert fetch._schedulers == {}
+    b = asyncio.run(use(close=False))       # loop ends without close_scheduler
+    c = asyncio.run(use(close=True))        # a new loop drops the dead one's entry
+    assert a is not b is not c and fetch._schedulers == {}
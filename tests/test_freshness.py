@@ -30,4 +30,115 @@ def test_newer_version_pref():
     if not rows:
         # environment not seeded; avoid hard failure in CI
         import pytest; pytest.skip("no versions found for Arepa URL")
-    assert rows[0][2] is True  # approved flag
\ No newline at end of file
+    assert rows[0][2] is True  # approved flag
+def test_reingest_retires_old_chunks(client):
+    uri = "https://www.usa.gov/es/test-reingest"
+    body = {"source_uri": uri, "lang": "es", "topic": "civics", "index_name": "test_versions"}
+    for fee in ("$415", "$465"):
+        r = client.post("/ingest/raw", json={**body, "text": f"La tarifa del formulario es {fee}. Plazo: 90 días."})
+        assert r.status_code == 200, r.text
+    with engine.begin() as conn:
+        rows = conn.execute(text("""
+            SELECT d.version, bool_and(c.is_current), min(c.text)
+            FROM chunks c JOIN documents d ON d.id = c.doc_id
+            WHERE d.source_uri = :u AND d.index_name = 'test_versions'
+            GROUP BY d.version ORDER BY d.version
+        """), {"u": uri}).all()
+        conn.execute(text("DELETE FROM documents WHERE index_name = 'test_versions'"))
+    assert [v for v, _, _ in rows] == [1, 2]
+    assert rows[0][1] is False and rows[1][1] is True
+    assert "$465" in rows[1][2]
+
+def test_purge_is_soft_and_validated(client):
+    uri = "https://www.usa.gov/es/test-purge"
+    r = client.post("/ingest/raw", json={"source_uri": uri, "lang": "es", "index_name": "test_purge",
+                                          "text": "Este trámite se eliminó. Ya no aplica."})
+    assert r.status_code == 200, r.text
+    assert client.post("/ingest/purge", json={"url": uri, "domain": "www.usa.gov"}).status_code == 422
+    r = client.post("/ingest/purge", json={"url": uri, "index_name": "test_purge"})
+    assert r.status_code == 200 and r.json()["deleted"] == 1
+    with engine.begin() as conn:
+        deleted = conn.execute(text("SELECT bool_and(deleted) FROM documents WHERE source_uri = :u"), {"u": uri}).scalar()
+        current = conn.execute(text("""
+            SELECT count(*) FROM chunks c JOIN documents d ON d.id = c.doc_id
+            WHERE d.source_uri = :u AND c.is_current
+        """), {"u": uri}).scalar()
+        conn.execute(text("DELETE FROM documents WHERE index_name = 'test_purge'"))
+    assert deleted in (True, None)   # None: the background GC already removed it
+    assert current == 0              # out of the searchable set before GC runs
+
+def test_concurrent_ingests_get_distinct_versions():
+    import threading, time
+    from api.rag.store import upsert_document
+    uri = "https://www.usa.gov/es/test-concurrent-versions"
+    first_in = threading.Event()
+
+    def ingest(hold: float):
+        with engine.begin() as conn:
+            upsert_document(conn, uri, "raw", "es", index_name="test_versions")
+            first_in.set()
+            time.sleep(hold)    # the second ingest starts while this transaction is still open
+
+    t = threading.Thread(target=ingest, args=(0.5,))
+    t.start()
+    first_in.wait(5)
+    ingest(0)
+    t.join()
+    with engine.begin() as conn:
+        rows = conn.execute(text("""
+            SELECT version, superseded_at IS NOT NULL FROM documents
+            WHERE source_uri = :u AND index_name = 'test_versions' ORDER BY version
+        """), {"u": uri}).all()
+        conn.execute(text("DELETE FROM documents WHERE source_uri = :u"), {"u": uri})
+    assert [v for v, _ in rows] == [1, 2]
+    assert [s for _, s in rows] == [True, False]
+
+def test_purge_retires_chunks_in_batches(client, monkeypatch):
+    from api.rag import gc
+    uri = "https://www.usa.gov/es/test-purge-batches"
+    body = " ".join(f"El paso {i} del trámite requiere un formulario distinto y una cita previa." for i in range(40))
+    r = client.post("/ingest/raw", json={"source_uri": uri, "lang": "es", "index_name": "test_purge",
+                                          "text": body, "max_tokens": 40, "overlap": 0})
+    assert r.status_code == 200, r.text
+    monkeypatch.setattr(gc, "GC_CHUNK_BATCH", 2)
+    monkeypatch.setattr(gc, "GC_PAUSE_S", 0)
+    txs = []
+
+    class Counting:
+        def begin(self):
+            txs.append(1)
+            return engine.begin()
+
+    monkeypatch.setattr(gc, "engine", Counting())
+    try:
+        assert gc.purge(url=uri, index_name="test_purge") == 1
+        with engine.begin() as conn:
+            total, current = conn.execute(text("""
+                SELECT count(*), count(*) FILTER (WHERE c.is_current) FROM chunks c JOIN documents d ON d.id = c.doc_id
+                WHERE d.source_uri = :u
+            """), {"u": uri}).one()
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text("DELETE FROM documents WHERE source_uri = :u"), {"u": uri})
+    assert total > 2 and current == 0
+    assert len(txs) >= 1 + total // 2     # the soft delete, then one transaction per GC_CHUNK_BATCH chunks
+
+def test_unapproved_version_does_not_retire_the_approved_one(client):
+    from api.rag.store import upsert_document
+    uri = "https://www.usa.gov/es/test-unapproved-version"
+    r = client.post("/ingest/raw", json={"source_uri": uri, "lang": "es", "index_name": "test_versions",
+                                          "text": "La cita se pide en línea. Lleve su pasaporte."})
+    assert r.status_code == 200, r.text
+    try:
+        with engine.begin() as conn:
+            upsert_document(conn, uri, "raw", "es", index_name="test_versions", approved=False)
+        with engine.begin() as conn:
+            superseded, current = conn.execute(text("""
+                SELECT bool_or(d.superseded_at IS NOT NULL), count(c.id) FILTER (WHERE c.is_current)
+                FROM documents d LEFT JOIN chunks c ON c.doc_id = d.id
+                WHERE d.source_uri = :u AND d.approved
+            """), {"u": uri}).one()
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text("DELETE FROM documents WHERE source_uri = :u"), {"u": uri})
+    assert superseded is False and current > 0
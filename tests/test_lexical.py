@@ -0,0 +1,17 @@
+from api.rag.lexical import features, query_terms, sentence_terms, terms
+from api.rag.segment import sentence_starts
+
+def test_terms_fold_accents_and_plurals():
+    assert terms("Ciudades Información taxes Forms") == ["ciudad", "informacion", "tax", "form"]
+
+def test_features_match_on_the_fly_terms():
+    text = "La ciudadanía requiere 5 años. Los formularios están en línea."
+    lex = features(text, sentence_starts(text))
+    row = {"text": text, "sent_starts": sentence_starts(text), "lex": lex}
+    stored = sentence_terms(row)
+    assert stored == sentence_terms(text)
+    assert "ciudadania" in stored[0][1] and "formulario" in stored[1][1]
+
+def test_query_terms_drop_stopwords():
+    assert query_terms("¿Qué es la ciudadanía?") == {"ciudadania"}
+    assert query_terms("the") == {"the"}
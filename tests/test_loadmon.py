@@ -0,0 +1,46 @@
+import asyncio, time
+from api.core import loadmon
+
+def test_blocked_loop_shows_up_as_lag():
+    async def main():
+        task = asyncio.create_task(loadmon.monitor_loop(interval_s=0.05))
+        await asyncio.sleep(0)
+        time.sleep(0.2)             # sync work on the loop, like a DB call in a handler
+        await asyncio.sleep(0.01)   # the overdue wake-up runs first and samples
+        snap = loadmon.snapshot()
+        loadmon.stop_monitor()
+        await asyncio.wait_for(task, 1)
+        return snap
+
+    snap = asyncio.run(main())
+    assert snap["loop_lag_ms"] >= 100
+    assert snap["anyio"]["limit"] > 0 and snap["anyio"]["busy"] == 0
+
+def test_thread_pool_saturation_is_visible():
+    from anyio import to_thread
+
+    async def main():
+        to_thread.current_default_thread_limiter().total_tokens = 2
+        work = [asyncio.create_task(to_thread.run_sync(time.sleep, 0.15)) for _ in range(4)]
+        await asyncio.sleep(0.02)
+        stats = loadmon.anyio_stats()
+        waits = {}
+        await loadmon._probe("anyio", waits)     # queues behind both rounds of sleeps
+        await asyncio.gather(*work)
+        return stats, waits
+
+    stats, waits = asyncio.run(main())
+    assert stats == {"busy": 2, "limit": 2, "waiting": 2}
+    assert waits["anyio"] >= 200
+
+def test_inflight_counter_and_pool_stats_without_engine():
+    from api.core import db
+    n = loadmon.inflight()
+    loadmon.request_started()
+    loadmon.request_started()
+    loadmon.request_finished()
+    assert loadmon.inflight() == n + 1
+    loadmon.request_finished()
+    assert loadmon.inflight() == n
+    if db._engine is None:
+        assert loadmon.pool_stats() is None
@@ -0,0 +1,32 @@
+import numpy as np, pytest
+from api.rag.local_index import LocalBackend, export
+from api.rag.retrieve import get_backend
+
+INDEX = "c300o45"
+
+def test_local_backend_matches_pgvector(tmp_path):
+    out = export(INDEX, root=str(tmp_path))
+    if not out["rows"]:
+        pytest.skip("no chunks to export")
+    local = LocalBackend(str(tmp_path))
+    idx = local.index(INDEX)
+    q = np.asarray(idx.vecs[0]).tolist()
+    lang = idx.row(0)["lang"]
+    got = local.search(q, k=3, lang_filter=(lang,), index_name=INDEX)
+    want = get_backend("pgvector").search(q, k=3, lang_filter=(lang,), index_name=INDEX)
+    assert got[0]["score"] == pytest.approx(1.0, abs=1e-4)
+    assert {r["doc_id"] for r in got} == {str(r["doc_id"]) for r in want}
+    assert set(got[0]) >= {"text", "sent_starts", "lex", "source_uri", "lang", "score"}
+    # Unknown filter values match nothing instead of everything
+    assert local.search(q, k=3, lang_filter=(lang,), index_name=INDEX, topic="no-such-topic") == []
+
+def test_open_index_survives_the_export_swap(tmp_path):
+    import os
+    out = export(INDEX, root=str(tmp_path))
+    local = LocalBackend(str(tmp_path))
+    idx = local.index(INDEX)
+    # The moment between export's two renames: no directory under the index name
+    os.replace(out["path"], out["path"] + ".old-test")
+    assert local.index(INDEX) is idx
+    with pytest.raises(FileNotFoundError):
+        LocalBackend(str(tmp_path)).index(INDEX)      # nothing open yet: still an error
@@ -0,0 +1,64 @@
+import pytest
+from sqlalchemy import text
+from api.core.db import engine
+from api.core.migrate import MigrationError, migrate, split_sql
+
+def test_split_sql_respects_quotes_comments_and_dollar_bodies():
+    sql = """
+    -- leading comment; not a statement
+    CREATE TABLE t (a TEXT DEFAULT 'x;y');
+    /* block ; comment */
+    CREATE FUNCTION f() RETURNS int AS $body$ BEGIN RETURN 1; END $body$ LANGUAGE plpgsql;
+    SELECT $$a;b$$, "odd;name" FROM t
+    -- trailing comment only
+    """
+    stmts = split_sql(sql)
+    assert len(stmts) == 3
+    assert stmts[0].endswith("DEFAULT 'x;y')")
+    assert "RETURN 1; END $body$" in stmts[1]
+    assert stmts[2].startswith("SELECT $$a;b$$")
+
+def test_migrations_apply_once_and_detect_edits(tmp_path):
+    d = tmp_path / "m"
+    d.mkdir()
+    (d / "900_test_tmp.sql").write_text("CREATE TABLE IF NOT EXISTS _migrate_test (n INT);\nINSERT INTO _migrate_test VALUES (1);\n")
+    try:
+        assert migrate(engine, path=str(d)) == ["900_test_tmp.sql"]
+        assert migrate(engine, path=str(d)) == []
+        with engine.connect() as conn:
+            assert conn.execute(text("SELECT count(*) FROM _migrate_test")).scalar_one() == 1
+        (d / "900_test_tmp.sql").write_text("SELECT 1;\n")
+        with pytest.raises(MigrationError):
+            migrate(engine, path=str(d))
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text("DROP TABLE IF EXISTS _migrate_test"))
+            conn.execute(text("DELETE FROM schema_migrations WHERE version = '900_test_tmp.sql'"))
+
+def test_failed_concurrent_index_is_rebuilt_and_lock_timeout_reset(tmp_path):
+    from sqlalchemy import create_engine
+    # Two connections: the advisory-lock session and the one applying; both must come back clean
+    eng = create_engine(engine.url.render_as_string(hide_password=False), pool_size=2, max_overflow=0)
+    d = tmp_path / "m"
+    d.mkdir()
+    (d / "901_test_cic.sql").write_text("-- migrate: no-transaction\n"
+                                        "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS _migrate_test_cic_u ON _migrate_test_cic(n);\n")
+    valid = "SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass('_migrate_test_cic_u')"
+    try:
+        with eng.begin() as conn:
+            conn.execute(text("CREATE TABLE IF NOT EXISTS _migrate_test_cic (n INT)"))
+            conn.execute(text("INSERT INTO _migrate_test_cic VALUES (1), (1)"))
+        with pytest.raises(MigrationError):
+            migrate(eng, path=str(d))       # duplicate keys: the build fails and leaves an INVALID index
+        with eng.begin() as conn:
+            assert conn.execute(text(valid)).scalar() is False
+            conn.execute(text("DELETE FROM _migrate_test_cic"))
+        assert migrate(eng, path=str(d)) == ["901_test_cic.sql"]
+        with eng.connect() as a, eng.connect() as b:
+            assert a.execute(text(valid)).scalar() is True
+            assert {c.execute(text("SHOW lock_timeout")).scalar() for c in (a, b)} == {"0"}
+    finally:
+        with eng.begin() as conn:
+            conn.execute(text("DROP TABLE IF EXISTS _migrate_test_cic"))
+            conn.execute(text("DELETE FROM schema_migrations WHERE version = '901_test_cic.sql'"))
+        eng.dispose()
@@ -0,0 +1,47 @@
+import threading, time
+from api.core.profiler import Sampler
+
+def _busy_loop(stop):
+    while not stop.is_set():
+        sum(i * i for i in range(1000))
+
+def test_sampler_sees_a_busy_thread_and_exports_speedscope():
+    stop = threading.Event()
+    t = threading.Thread(target=_busy_loop, args=(stop,), name="busy")
+    t.start()
+    try:
+        s = Sampler(interval_ms=1).run(0.2)
+    finally:
+        stop.set()
+        t.join()
+    assert s.samples > 10
+    doc = s.speedscope("t")
+    busy = [p for p in doc["profiles"] if p["name"] == "busy"]
+    assert busy and busy[0]["endValue"] > 0
+    frames = doc["shared"]["frames"]
+    names = {frames[i]["name"] for stack in busy[0]["samples"] for i in stack}
+    assert "_busy_loop" in names
+    assert all(len(w) == len(p["samples"]) for p in doc["profiles"] for w in [p["weights"]])
+    assert any(line.startswith("busy;") for line in s.collapsed().splitlines())
+
+def test_parked_threads_are_dropped_unless_asked():
+    ev = threading.Event()
+    t = threading.Thread(target=ev.wait, name="parked")
+    t.start()
+    try:
+        quiet = Sampler(interval_ms=1).run(0.05)
+        full = Sampler(interval_ms=1, idle=True).run(0.05)
+    finally:
+        ev.set()
+        t.join()
+    assert "parked" not in quiet.names.values()
+    assert "parked" in full.names.values()
+
+def test_profile_endpoint_requires_token(client):
+    r = client.get("/debug/profile", params={"seconds": 0.1})
+    assert r.status_code in (403, 404)
+    assert r.json()["code"] in ("forbidden", "disabled")
+
+def test_debug_router_is_mounted_once(client):
+    assert client.get("/debug/counts").status_code == 200
+    assert client.get("/debug/debug/counts").status_code == 404
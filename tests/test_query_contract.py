@@ -14,3 +14,20 @@ def test_query_limits(client):
     big = {"query": "x"*600, "k": 9}
     r = client.post("/query/", json=big)
     assert r.status_code in (400, 422)
+
+def test_retrieve_skips_generation(client):
+    r = client.post("/query/retrieve", json={"query": "¿Qué es una arepa?", "k": 3})
+    assert r.status_code == 200
+    data = r.json()
+    assert data["route"] == "retrieve" and "answer" not in data
+    assert len(data["results"]) <= 3
+    assert all({"uri", "snippet", "score", "text"} <= set(x) for x in data["results"])
+
+def test_batch_keeps_request_order(client):
+    qs = ["¿Qué es una arepa?", "What is a tamale?", "arepa"]
+    r = client.post("/query/batch", json={"queries": [{"query": q, "k": 2} for q in qs]})
+    assert r.status_code == 200
+    data = r.json()
+    assert [x["query"] for x in data["results"]] == qs
+    assert all(len(x["results"]) <= 2 for x in data["results"])
+    assert client.post("/query/batch", json={"queries": []}).status_code == 422
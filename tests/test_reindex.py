@@ -0,0 +1,11 @@
+import asyncio, pytest
+from api.rag.reindex import reindex_variant, served_index
+
+def test_reindex_refuses_the_active_index():
+    try:
+        live = served_index()
+    except Exception:
+        pytest.skip("no DB")
+    # Rebuilding in place would clear the served chunks until the rebuild finished
+    with pytest.raises(ValueError, match="active index"):
+        asyncio.run(reindex_variant(live, source=live + "_src"))
@@ -9,3 +9,20 @@ def test_retrieval_shape(monkeypatch):
     except Exception:
         # DB might not be up in unit-only mode; acceptable in CI if marked xfail
         pass
+
+def test_search_many_matches_single_searches():
+    import asyncio, os
+    from api.rag.embed import embed_texts
+    from api.rag.retrieve import search_many
+    idx = os.getenv("DEFAULT_INDEX_NAME", "c300o45")
+    vecs = asyncio.run(embed_texts(["¿Qué es una arepa?", "voting rules", "tamales"]))
+    try:
+        many = search_many(vecs, k=4, lang_filter=("es", "en"), index_name=idx)
+    except Exception:
+        return  # no DB in unit-only mode
+    assert len(many) == len(vecs)
+    for v, rows in zip(vecs, many):
+        one = search_similar(v, k=4, lang_filter=("es", "en"), index_name=idx)
+        # Ties may come back in either order
+        key = lambda r: (round(r["score"], 9), r["text"])
+        assert sorted(map(key, rows)) == sorted(map(key, one))
@@ -0,0 +1,48 @@
+import numpy as np
+from api.rag.semcache import SemanticCache
+
+def _v(*hot, dim=8):
+    v = np.zeros(dim, dtype=np.float32)
+    for i in hot:
+        v[i] = 1.0
+    return v
+
+def test_near_duplicates_hit_within_partition():
+    c = SemanticCache(dim=8, max_entries=4, threshold=0.9, ttl_s=60)
+    c.put("es", _v(0, 1, 2, 3, 4, 5, 6), {"answer": "a"})
+    assert c.get("es", _v(0, 1, 2, 3, 4, 5, 6, 7)) == {"answer": "a"}   # cos ~0.94
+    assert c.get("es", _v(0, 1, 7)) is None                             # below threshold
+    assert c.get("en", _v(0, 1, 2, 3, 4, 5, 6)) is None                 # other filters
+
+def test_lru_ttl_and_invalidation():
+    c = SemanticCache(dim=8, max_entries=2, threshold=0.99, ttl_s=60)
+    c.put("p", _v(0), 0)
+    c.put("p", _v(1), 1)
+    assert c.get("p", _v(0)) == 0          # touch 0: slot of 1 is now the LRU one
+    c.put("p", _v(2), 2)
+    assert c.get("p", _v(1)) is None and c.get("p", _v(0)) == 0 and c.get("p", _v(2)) == 2
+    c.ttl_s = 0
+    assert c.get("p", _v(0)) is None
+    c.ttl_s = 60
+    gens = iter([1, 1, 2])
+    assert not c.check_generation(lambda: next(gens))
+    assert not c.check_generation(lambda: next(gens)) and len(c) == 2
+    assert c.check_generation(lambda: next(gens)) and len(c) == 0
+
+def test_partition_map_stays_bounded():
+    c = SemanticCache(dim=8, max_entries=4, threshold=0.99, ttl_s=60)
+    for i in range(50):
+        c.put(("idx", f"country-{i}"), _v(i % 8), i)    # free-form hints: a new partition each time
+    assert len(c._parts) <= c.max + 1
+    assert c.get(("idx", "country-49"), _v(49 % 8)) == 49
+
+def test_only_full_llm_answers_are_cacheable(monkeypatch):
+    import asyncio
+    from api.rag import generate
+
+    def failing(*a, **kw):
+        raise RuntimeError("llm down")
+    monkeypatch.setattr(generate, "openai_chat", failing)
+    cands = [{"text": "La arepa es un pan de maíz. Se come en Venezuela.", "source_uri": "u"}]
+    ans, full = asyncio.run(generate.quote_then_summarize("¿Qué es una arepa?", cands, "es"))
+    assert ans.endswith("[1]") and not full
@@ -0,0 +1,39 @@
+import asyncio, pytest
+from api.core.singleflight import SingleFlight
+
+def test_concurrent_calls_share_one_computation():
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"answer": len(calls)}
+
+    async def main():
+        sf = SingleFlight("t", use_redis=False)
+        res = await asyncio.gather(*(sf.do("k", work) for _ in range(20)), sf.do("other", work))
+        assert sf.inflight() == 0
+        return res
+
+    res = asyncio.run(main())
+    assert len(calls) == 2
+    assert all(r == res[0] for r in res[:20])
+
+def test_errors_propagate_and_waiter_timeout_does_not_cancel():
+    async def boom():
+        await asyncio.sleep(0.01)
+        raise ValueError("x")
+
+    async def slow():
+        await asyncio.sleep(0.1)
+        return "ok"
+
+    async def main():
+        sf = SingleFlight("t", use_redis=False)
+        with pytest.raises(ValueError):
+            await asyncio.gather(sf.do("e", boom), sf.do("e", boom))
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(sf.do("s", slow), 0.01)
+        return await sf.do("s", slow)     # joins the still-running flight
+
+    assert asyncio.run(main()) == "ok"
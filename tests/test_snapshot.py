@@ -0,0 +1,35 @@
+import pytest
+from sqlalchemy import text
+from api.core.db import engine
+
+pytest.importorskip("pyarrow")
+from api.rag.snapshot import SnapshotError, export, import_snapshot
+
+SRC, DST = "c300o45", "_snapshot_test"
+
+def _texts(conn, idx):
+    return sorted(conn.execute(text("SELECT text FROM chunks WHERE index_name = :i AND is_current"), {"i": idx}).scalars())
+
+def test_snapshot_roundtrip(tmp_path):
+    out = export(SRC, str(tmp_path), dtype="float16")
+    if not out["chunks"]:
+        pytest.skip("no chunks to export")
+    try:
+        res = import_snapshot(str(tmp_path), index_name=DST, reindex=False)
+        assert (res["documents"], res["chunks"]) == (out["documents"], out["chunks"])
+        with pytest.raises(SnapshotError):
+            import_snapshot(str(tmp_path), index_name=DST, reindex=False)
+        assert import_snapshot(str(tmp_path), index_name=DST, replace=True, reindex=False)["replaced"] == out["documents"]
+        with engine.connect() as conn:
+            assert _texts(conn, DST) == _texts(conn, SRC)
+            # Embeddings survive float16 up to rounding; filter columns come from the parent document
+            d = conn.execute(text("""
+                SELECT max(a.embedding <=> b.embedding), bool_and(a.lang = b.lang AND a.sent_starts IS NOT DISTINCT FROM b.sent_starts
+                                                            AND a.lex IS NOT DISTINCT FROM b.lex)
+                FROM chunks a JOIN chunks b ON a.text = b.text AND a.chunk_index = b.chunk_index
+                WHERE a.index_name = :s AND b.index_name = :d AND a.is_current AND b.is_current
+            """), {"s": SRC, "d": DST}).one()
+            assert d[0] < 1e-3 and d[1]
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text("DELETE FROM documents WHERE index_name = :d"), {"d": DST})
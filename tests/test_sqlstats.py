@@ -0,0 +1,116 @@
+from api.core import sqlstats
+
+def _scan(rel, rows, removed=0):
+    return {"Node Type": "Seq Scan", "Relation Name": rel, "Actual Rows": rows, "Actual Loops": 1,
+            "Rows Removed by Filter": removed}
+
+def test_findings_flag_large_seq_scans_and_exact_vector_sorts():
+    # The plan of the ANN search when the ivfflat index is not used: scan everything, sort by distance
+    bad = {"Plan": {"Node Type": "Limit", "Plans": [
+        {"Node Type": "Sort", "Sort Key": ["((chunks.embedding <=> '[0.1,0.2]'::vector))"], "Actual Rows": 8,
+         "Actual Loops": 1, "Plans": [_scan("chunks", 9000, removed=3000)]}]}}
+    found = sqlstats.findings(bad, tables={"chunks"}, min_rows=5000)
+    assert {(f["kind"], f["relation"], f["rows"]) for f in found} == {("seq_scan", "chunks", 12000),
+                                                                   ("ann_not_used", "chunks", 12000)}
+    good = {"Plan": {"Node Type": "Limit", "Plans": [
+        {"Node Type": "Index Scan", "Index Name": "idx_chunks_embedding_current", "Relation Name": "chunks",
+         "Order By": "(embedding <=> '[0.1,0.2]'::vector)", "Actual Rows": 8, "Actual Loops": 1}]}}
+    assert sqlstats.findings(good, tables={"chunks"}, min_rows=5000) == []
+    # Small tables are scanned whatever the indexes; and a failed EXPLAIN has no plan
+    assert sqlstats.findings(bad, tables={"chunks"}, min_rows=50000) == []
+    assert sqlstats.findings({"error": "x"}) == []
+
+def test_labels_nest_and_fall_back_to_the_verb():
+    assert sqlstats.current_label("  -- note\nSELECT 1") == "sql_select"
+    assert sqlstats.current_label("/* x */ with q as (select 1) select * from q") == "sql_with"
+    assert sqlstats.current_label("FETCH 10") == "sql_other"
+
+    @sqlstats.label("upsert_document")
+    def inner():
+        return sqlstats.current_label("UPDATE documents SET x = 1")
+
+    with sqlstats.label("purge"):
+        assert sqlstats.current_label("DELETE FROM chunks") == "purge"
+        assert inner() == "upsert_document"
+        assert sqlstats.current_label("SELECT 1") == "purge"
+    assert sqlstats.current_label("SELECT 1") == "sql_select"
+
+def test_explain_of_a_write_inside_a_transaction_leaves_it_usable():
+    from sqlalchemy import text
+    from api.core.db import engine
+    try:
+        conn = engine.connect()
+    except Exception:
+        return  # no DB in unit-only mode
+    with conn:
+        tx = conn.begin()
+        raw = conn.connection.dbapi_connection
+        plan = sqlstats.explain(raw, "UPDATE documents SET topic = topic WHERE id IS NULL", analyze=False)
+        assert plan["Plan"]["Node Type"] == "ModifyTable" and "Actual Rows" not in plan["Plan"]
+        err = sqlstats.explain(raw, "SELECT * FROM no_such_table")
+        assert "error" in err
+        # The failed EXPLAIN was rolled back to its savepoint, not the whole transaction
+        assert conn.execute(text("SELECT 1")).scalar_one() == 1
+        tx.rollback()
+
+def test_slow_statements_are_explained_off_the_request_connection(monkeypatch):
+    from sqlalchemy import create_engine, text
+    from api.core.db import coalesce_db_url
+    url = coalesce_db_url()
+    if not url:
+        return  # no DB in unit-only mode
+    eng = create_engine(url, pool_size=2)
+    sqlstats.instrument(eng)
+    monkeypatch.setattr(sqlstats, "SLOW_SQL_MS", 0.0)
+    monkeypatch.setattr(sqlstats, "_explained", {})
+    seen = []
+    real = sqlstats.explain
+
+    def spy(raw, *a, **kw):
+        cur = raw.cursor()
+        cur.execute("SHOW ivfflat.probes")
+        seen.append((raw, cur.fetchone()[0]))
+        cur.close()
+        return real(raw, *a, **kw)
+
+    monkeypatch.setattr(sqlstats, "explain", spy)
+    try:
+        with eng.connect() as conn:
+            tx = conn.begin()
+            conn.exec_driver_sql("SET LOCAL ivfflat.probes = 7")
+            with sqlstats.label("slowtest"):
+                assert conn.execute(text("SELECT current_setting('ivfflat.probes')")).scalar_one() == "7"
+            mine = conn.connection.dbapi_connection
+            assert conn.info["sqlstats_local"] == {"ivfflat.probes": "7"}
+            sqlstats._jobs.join()       # while this connection is still checked out
+            tx.commit()
+            # SET LOCAL ended with the transaction, and so does what was recorded of it
+            assert "sqlstats_local" not in conn.info
+    finally:
+        eng.dispose()
+    # Explained on another connection, with the request transaction's probes replayed
+    assert seen and all(raw.dbapi_connection is not mine and probes == "7" for raw, probes in seen)
+    sample = next(s for s in sqlstats.samples() if s["statement"] == "slowtest")
+    assert sample["analyzed"] and sample["plan"]["Plan"]["Node Type"] == "Result"
+
+def test_failed_statements_leave_nothing_on_the_connection():
+    from sqlalchemy import create_engine, text
+    from api.core.db import coalesce_db_url
+    url = coalesce_db_url()
+    if not url:
+        return  # no DB in unit-only mode
+    eng = create_engine(url, pool_size=1)
+    sqlstats.instrument(eng)
+    try:
+        with eng.connect() as conn:
+            for _ in range(3):
+                tx = conn.begin()
+                conn.exec_driver_sql("SET LOCAL statement_timeout = 1")
+                try:
+                    conn.execute(text("SELECT pg_sleep(0.05)"))
+                except Exception:
+                    tx.rollback()
+            info = dict(conn.info)
+    finally:
+        eng.dispose()
+    assert not any(k.startswith("sqlstats") for k in info)
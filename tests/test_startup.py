@@ -0,0 +1,20 @@
+import os, sys, subprocess
+from api.core import startup
+
+def test_import_without_db_url():
+    # Module graph must import (and stay light) with no database configured
+    env = {k: v for k, v in os.environ.items() if k not in ("DB_URL", "DATABASE_URL", "POSTGRES_URL", "PG_CONNECTION_STRING")}
+    code = "import sys, api.main; print(','.join(m for m in ('openai', 'tiktoken', 'trafilatura') if m in sys.modules))"
+    out = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, timeout=60)
+    assert out.returncode == 0, out.stderr
+    assert out.stdout.strip() == ""
+
+def test_warm_up_gates_readiness():
+    def boom():
+        raise RuntimeError("x")
+    st = startup.warm_up([("optional", boom, False), ("required", boom, True)])
+    assert st["status"] == "failed" and "required" in st["error"]
+    assert not startup.is_ready()
+    st = startup.warm_up([("optional", boom, False), ("ok", lambda: None, True)])
+    assert st["status"] == "ok" and startup.is_ready()
+    assert "warm_ok" in st["phases"]
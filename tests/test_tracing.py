@@ -0,0 +1,39 @@
+import asyncio, anyio
+from api.core import tracing
+
+def test_spans_follow_the_request_into_threads():
+    async def handler():
+        tr = tracing.start("rid-1", "/query/")
+        tracing.annotate(index="c300o45")
+        with tracing.span("embed"):
+            await asyncio.sleep(0.01)
+
+        def work():
+            with tracing.span("llm_extract"):
+                pass
+        await asyncio.to_thread(work)
+        await anyio.to_thread.run_sync(work)
+        return tr
+
+    tr = asyncio.run(handler())
+    stages = tr.stages()
+    assert tr.index == "c300o45"
+    assert set(stages) == {"embed", "llm_extract"}
+    assert stages["embed"] >= 10
+    assert [n for n, _ in tr.spans].count("llm_extract") == 2
+
+def test_server_timing_header_format():
+    tr = tracing.Trace("rid-2")
+    tr.spans += [("search", 3.0), ("search", 1.5), ("generate", 20.0)]
+    assert tr.server_timing(30.25) == "search;dur=4.5, generate;dur=20.0, total;dur=30.2"
+
+def test_span_without_trace_is_harmless():
+    with tracing.span("orphan"):
+        pass
+    assert tracing.current() is None or all(n != "orphan" for n, _ in tracing.current().spans)
+
+def test_query_response_carries_server_timing(client):
+    r = client.post("/query/", json={"query": "¿Qué es una arepa?", "k": 3})
+    assert r.status_code == 200
+    timing = r.headers.get("server-timing", "")
+    assert "total;dur=" in timing